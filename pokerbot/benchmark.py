@@ -0,0 +1,588 @@
+import os
+import ast
+import sys
+import json
+import time
+import argparse
+import importlib
+import platform
+from glob import glob
+from itertools import combinations
+from contextlib import contextmanager
+import cv2
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SHOTS_DIR = os.path.join(BASE_DIR, 'shots')
+EXTRA_FRAMES = ['blitz.png', 'bth.png', 'sc1.png']
+MANIFEST_PATH = os.path.join(BASE_DIR, 'ground_truth.json')
+NOTEBOOK_PATH = os.path.join(BASE_DIR, 'bot.ipynb')
+OUT_PATH = os.path.join(BASE_DIR, 'benchmark.json')
+
+SLOTS = ['f1', 'f2', 'f3', 'f4', 'f5', 'h1-1', 'h1-2', 'h2-1', 'h2-2']
+STAGES = ('crop', 'match', 'evaluate')
+PERCENTILES = (50, 90, 99)
+# Przetwarzanie szablonów i wycinków dla notebook-batch / notebook-calibrated (--preprocess)
+PREPROCESS = None
+# Silnik wszystkich zestawów w notebook-batch / notebook-calibrated i --tune (--engine); None – layout.json
+ENGINE = None
+# Progi odrzucenia z layout.json w notebook-batch / notebook-calibrated (--no-reject: bez progów)
+REJECT = True
+# Strojenie progów (--tune): koszt przyjętej błędnej karty względem odrzuconej poprawnej
+MISREAD_COST = 3
+
+
+def frame_paths():
+    """Klatki benchmarku jako ścieżki względne (klucze manifestu)."""
+    paths = [os.path.relpath(p, BASE_DIR).replace(os.sep, '/')
+             for p in sorted(glob(os.path.join(SHOTS_DIR, '*.png')))]
+    return paths + [p for p in EXTRA_FRAMES if os.path.exists(os.path.join(BASE_DIR, p))]
+
+
+def load_manifest(path=MANIFEST_PATH):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['frames']
+
+
+def normalize(label):
+    """'Ah' / 'ah' / ('a', 'h') -> 'ah'; brak rozpoznania -> None."""
+    if not label:
+        return None
+    if isinstance(label, (tuple, list)):
+        if not all(label):
+            return None
+        label = ''.join(label)
+    return label.lower()
+
+
+class StageTimer:
+    """Czasy etapów sumowane w obrębie klatki: {etap: [ms na klatkę, ...]}."""
+
+    def __init__(self):
+        self.times = {stage: [] for stage in STAGES + ('total',)}
+        self._current = None
+
+    @contextmanager
+    def frame(self):
+        self._current = dict.fromkeys(STAGES, 0.0)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._current['total'] = (time.perf_counter() - t0) * 1000
+            for stage, ms in self._current.items():
+                self.times[stage].append(ms)
+            self._current = None
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self._current is not None:
+                self._current[name] += (time.perf_counter() - t0) * 1000
+
+    def summary(self):
+        out = {}
+        for stage, values in self.times.items():
+            if not values:
+                continue
+            arr = np.array(values)
+            out[stage] = {'mean': round(float(arr.mean()), 3)}
+            for p in PERCENTILES:
+                out[stage][f'p{p}'] = round(float(np.percentile(arr, p)), 3)
+        return out
+
+
+# --- Definicje z notatnika (bez uruchamiania pętli na żywo) ---
+
+def notebook_defs(names, path=NOTEBOOK_PATH, cell=0):
+    """Wybrane przypisania i funkcje z komórki notatnika, wykonane bez importów okienkowych."""
+    with open(path, encoding='utf-8') as f:
+        source = ''.join(json.load(f)['cells'][cell]['source'])
+    body = []
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.FunctionDef) and node.name in names:
+            body.append(node)
+        elif isinstance(node, ast.Assign) and any(getattr(t, 'id', None) in names for t in node.targets):
+            body.append(node)
+    namespace = {'cv2': cv2, 'os': os, 'np': np, 'combinations': combinations}
+    exec(compile(ast.Module(body=body, type_ignores=[]), path, 'exec'), namespace)
+    return namespace
+
+
+# --- Rozpoznawacze: setup() -> (recognize(img, timer) -> {slot: etykieta}, evaluate(etykiety)) ---
+
+def setup_bot3():
+    import bot3
+
+    def recognize(img, timer):
+        with timer.stage('crop'):
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        with timer.stage('match'):
+            return bot3.recognize_gray(gray, bgr=img)
+
+    return recognize, bot3.evaluate_choice
+
+
+def setup_read_card(module_name):
+    def setup():
+        from treys import Card, Evaluator
+        bot = importlib.import_module(module_name)
+        jobs = list(zip(SLOTS,
+                        bot.flop_rank + bot.hand1_rank + bot.hand2_rank,
+                        bot.flop_suit + bot.hand1_suit + bot.hand2_suit))
+        evaluator = Evaluator()
+
+        def recognize(img, timer):
+            with timer.stage('crop'):
+                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            labels = {}
+            with timer.stage('match'):
+                for slot, rr, sr in jobs:
+                    try:
+                        labels[slot] = bot.read_card(gray, rr, sr, rotated=slot.startswith('h'))
+                    except ValueError:
+                        labels[slot] = None
+            return labels
+
+        def evaluate(labels):
+            board = [Card.new(labels[s]) for s in SLOTS[:5]]
+            score1 = evaluator.evaluate(board, [Card.new(labels[s]) for s in SLOTS[5:7]])
+            score2 = evaluator.evaluate(board, [Card.new(labels[s]) for s in SLOTS[7:]])
+            return 'hand1' if score1 < score2 else 'hand2'
+
+        return recognize, evaluate
+    return setup
+
+
+def setup_pokerbot3():
+    from treys import Evaluator
+    import pokerbot3
+    pokerbot3.load_templates()
+    evaluator = Evaluator()
+    layout = [(pokerbot3.FLOP_REGION, SLOTS[:5]), (pokerbot3.HAND1_REGION, SLOTS[5:7]),
+              (pokerbot3.HAND2_REGION, SLOTS[7:])]
+
+    def recognize(img, timer):
+        labels = {}
+        for (x, y, w, h), slots in layout:
+            with timer.stage('crop'):
+                region = img[y:y+h, x:x+w]
+                card_width = w // len(slots)
+                cards = [region[:, i * card_width:(i + 1) * card_width] for i in range(len(slots))]
+            with timer.stage('match'):
+                for slot, card_img in zip(slots, cards):
+                    try:
+                        labels[slot] = pokerbot3.recognize_card(card_img)
+                    except ValueError:
+                        labels[slot] = None
+        return labels
+
+    def evaluate(labels):
+        board = pokerbot3.card_names_to_treys([labels[s] for s in SLOTS[:5]])
+        score1 = evaluator.evaluate(board, pokerbot3.card_names_to_treys([labels[s] for s in SLOTS[5:7]]))
+        score2 = evaluator.evaluate(board, pokerbot3.card_names_to_treys([labels[s] for s in SLOTS[7:]]))
+        return 'hand1' if score1 < score2 else 'hand2'
+
+    return recognize, evaluate
+
+
+def notebook_evaluate(defs):
+    def evaluate(labels):
+        # Etykiety notatnika to krotki (ranga, kolor) – jak w pętli na żywo
+        flop = [labels[s] for s in SLOTS[:5]]
+        s1 = defs['best_hand_7'](flop + [labels[s] for s in SLOTS[5:7]])
+        s2 = defs['best_hand_7'](flop + [labels[s] for s in SLOTS[7:]])
+        return 'hand1' if s1 > s2 else 'hand2' if s2 > s1 else 'tie'
+    return evaluate
+
+
+def setup_notebook_loop():
+    """Pętla match_best z komórki 0 – stara ścieżka notatnika, szablon po szablonie."""
+    from layout import get_layout
+    defs = notebook_defs({'RANK_MAP', 'evaluate_5cards', 'best_hand_7', 'load_templates', 'match_best'})
+    regions = get_layout().regions()
+    templates = {set_name: defs['load_templates'](os.path.join(BASE_DIR, set_name))
+                 for _, set_name in regions.values()}
+    jobs = [(lbl, rect, templates[set_name]) for lbl, (rect, set_name) in regions.items()]
+
+    def recognize(img, timer):
+        with timer.stage('crop'):
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            crops = [(lbl, gray[y:y+h, x:x+w], tpls) for lbl, (x, y, w, h), tpls in jobs]
+        parts = {}
+        with timer.stage('match'):
+            for lbl, crop, tpls in crops:
+                cid, kind = lbl.rsplit('-', 1)
+                parts.setdefault(cid, {})[kind] = defs['match_best'](crop, tpls)
+        return {cid: (p.get('rank'), p.get('suit')) for cid, p in parts.items()}
+
+    return recognize, notebook_evaluate(defs)
+
+
+def setup_notebook_batch(calibrate=False, engine=None):
+    """
+    Obecna ścieżka notatnika: classify_regions (wszystkie regiony jednym wsadem FFT).
+    calibrate=True: regiony przeliczane kotwicami layout.json w każdej klatce (jak w komórce 1).
+    engine: silnik dla wszystkich zestawów ('template' / 'nn'); None – grupa 'engines' z layout.json.
+    """
+    from classifier import classify_regions
+    from template_bank import get_bank
+    from hand_eval import get_evaluator
+    from layout import get_layout, Calibrator
+    from recognition import reject
+    bank = get_bank(PREPROCESS)
+    evaluator = get_evaluator()
+    layout = get_layout()
+    calibrator = Calibrator(layout, cache_path=None)
+    jobs = layout.regions()
+    engine = engine or ENGINE
+    engines = {name: engine for name in bank.keys()} if engine else None
+    thresholds = layout.thresholds(engines) if REJECT else {}
+
+    def recognize(img, timer):
+        nonlocal jobs
+        with timer.stage('crop'):
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            if calibrate:
+                try:
+                    transform, _ = calibrator.ensure(gray)
+                    jobs = layout.regions(transform)
+                except ValueError:
+                    pass
+        parts = {}
+        with timer.stage('match'):
+            matches = classify_regions(gray, jobs, bank, engines=engines, bgr=img)
+            reject(matches, thresholds)
+            for lbl, rec in matches.items():
+                cid, kind = lbl.rsplit('-', 1)
+                parts.setdefault(cid, {})[kind] = rec.label.lower() if rec.ok else None
+        return {cid: (p.get('rank'), p.get('suit')) for cid, p in parts.items()}
+
+    def evaluate(labels):
+        # Jak w pętli na żywo: ocena z tablic hand_eval zamiast best_hand_7; odrzucona karta = brak decyzji
+        flop = [labels[s] for s in SLOTS[:5]]
+        s1 = evaluator.evaluate(flop + [labels[s] for s in SLOTS[5:7]])
+        s2 = evaluator.evaluate(flop + [labels[s] for s in SLOTS[7:]])
+        return 'hand1' if s1 > s2 else 'hand2' if s2 > s1 else 'tie'
+
+    return recognize, evaluate
+
+
+RECOGNIZERS = {
+    'bot3': setup_bot3,
+    'bot1': setup_read_card('bot1'),
+    'bot2': setup_read_card('bot2'),
+    'pokerbot3': setup_pokerbot3,
+    'notebook-loop': setup_notebook_loop,
+    'notebook-batch': setup_notebook_batch,
+    'notebook-calibrated': lambda: setup_notebook_batch(calibrate=True),
+    'notebook-template': lambda: setup_notebook_batch(engine='template'),
+    'notebook-nn': lambda: setup_notebook_batch(engine='nn'),
+}
+
+
+def score(predictions, manifest):
+    """
+    Trafność względem manifestu – liczone tylko sloty z etykietą.
+    rejected: karta bez rozpoznania (odrzucona), misreads: przyjęta błędna etykieta,
+    phantom: etykieta w slocie, który w manifeście jest pusty / nieczytelny.
+    """
+    cards = correct = rank_ok = suit_ok = frames = exact = rejected = misreads = phantom = 0
+    mismatches = []
+    for path, labels in predictions.items():
+        truth = manifest.get(path)
+        if not truth:
+            continue
+        frames += 1
+        frame_ok = True
+        for slot, expected in truth.items():
+            got = labels.get(slot)
+            if expected is None:
+                phantom += got is not None
+                continue
+            cards += 1
+            if got == expected:
+                correct += 1
+            else:
+                rejected += got is None
+                misreads += got is not None
+                frame_ok = False
+                mismatches.append({'frame': path, 'slot': slot, 'expected': expected, 'got': got})
+            rank_ok += bool(got) and got[:-1] == expected[:-1]
+            suit_ok += bool(got) and got[-1] == expected[-1]
+        exact += frame_ok
+    ratio = (lambda n: round(n / cards, 4) if cards else None)
+    return {
+        'frames_labelled': frames,
+        'frames_exact': exact,
+        'cards': cards,
+        'correct': correct,
+        'accuracy': ratio(correct),
+        'rank_accuracy': ratio(rank_ok),
+        'suit_accuracy': ratio(suit_ok),
+        'rejected': rejected,
+        'misreads': misreads,
+        'phantom': phantom,
+        'mismatches': mismatches,
+    }
+
+
+def run_recognizer(name, frames, manifest, repeat=1):
+    t0 = time.perf_counter()
+    try:
+        recognize, evaluate = RECOGNIZERS[name]()
+    except (ImportError, OSError, FileNotFoundError) as e:
+        return {'skipped': f'{type(e).__name__}: {e}'}
+    setup_ms = (time.perf_counter() - t0) * 1000
+
+    timer = StageTimer()
+    predictions = {}
+    errors = {'recognize': 0, 'evaluate': 0}
+    # Rozgrzewka: plany FFT, cache wariantów itp. nie wchodzą do czasów klatek
+    try:
+        recognize(frames[0][1], StageTimer())
+    except Exception:
+        pass
+    for _ in range(repeat):
+        for path, img in frames:
+            labels = {}
+            with timer.frame():
+                try:
+                    labels = recognize(img, timer)
+                except Exception:
+                    errors['recognize'] += 1
+                with timer.stage('evaluate'):
+                    try:
+                        evaluate(labels)
+                    except Exception:
+                        errors['evaluate'] += 1
+            predictions[path] = {slot: normalize(label) for slot, label in labels.items()}
+
+    total_s = sum(timer.times['total']) / 1000
+    return {
+        'setup_ms': round(setup_ms, 1),
+        'frames': len(timer.times['total']),
+        'fps': round(len(timer.times['total']) / total_s, 2) if total_s else None,
+        'latency_ms': timer.summary(),
+        'errors': errors,
+        **score(predictions, manifest),
+    }
+
+
+def run_tables(frames, n, steps, max_per_step=None):
+    """
+    TableManager na n oknach z plików (tables.fake_windows) z układem regionów z layout.json.
+    stoły/s = stoły sprawdzone na krok x kroki / czas; na rdzeń – względem czasu CPU procesu.
+    """
+    from tables import TableManager, fake_windows, fake_source
+    from hand_eval import get_evaluator
+    from layout import get_layout
+    layout = get_layout().regions()
+    evaluator = get_evaluator()
+    errors = [0]
+
+    def decide(matches):
+        labels = {}
+        for lbl, (match, _, _) in matches.items():
+            cid, kind = lbl.rsplit('-', 1)
+            labels.setdefault(cid, {})[kind] = match.lower() if match else None
+        cards = {cid: (p.get('rank'), p.get('suit')) for cid, p in labels.items()}
+        try:
+            s1 = evaluator.evaluate([cards[s] for s in SLOTS[:7]])
+            s2 = evaluator.evaluate([cards[s] for s in SLOTS[:5] + SLOTS[7:]])
+        except (KeyError, ValueError):
+            errors[0] += 1
+            return None
+        return 'hand1' if s1 > s2 else 'hand2' if s2 > s1 else 'tie'
+
+    shape = frames[0][1].shape
+    imgs = [img for _, img in frames if img.shape == shape]
+    manager = TableManager(fake_windows(imgs, n), layout, decide, make_source=fake_source,
+                           max_tables_per_step=max_per_step)
+    manager.step()
+    t0, c0 = time.perf_counter(), time.process_time()
+    done = manager.run(steps=steps)
+    wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+    served = sum(t.served for t in manager.tables) - n
+    return {
+        'tables': n,
+        'steps': done,
+        'monitors': len(manager.sources),
+        'recognitions': served,
+        'tables_per_s': round(done * n / wall, 2),
+        'tables_per_s_per_core': round(done * n / cpu, 2) if cpu else None,
+        'recognitions_per_s': round(served / wall, 2),
+        'step_ms': round(wall / done * 1000, 3) if done else None,
+        'max_wait_steps': max(t.max_wait for t in manager.tables),
+        'errors': errors[0],
+    }
+
+
+def collect_samples(frames, manifest):
+    """
+    Wyniki regionów layout.json bez progów na klatkach z manifestu:
+    [(zestaw, wynik, margines, stan)], stan: 'correct' / 'wrong' / 'empty' (slot pusty w manifeście).
+    """
+    from classifier import classify_regions
+    from template_bank import get_bank
+    from layout import get_layout
+    bank = get_bank(PREPROCESS)
+    jobs = get_layout().regions()
+    engines = {name: ENGINE for name in bank.keys()} if ENGINE else None
+    samples = []
+    for path, img in frames:
+        truth = manifest.get(path)
+        if not truth:
+            continue
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        for lbl, rec in classify_regions(gray, jobs, bank, engines=engines, bgr=img).items():
+            cid, kind = lbl.rsplit('-', 1)
+            expected = truth.get(cid)
+            if expected is None:
+                state = 'empty'
+            else:
+                part = expected[:-1] if kind == 'rank' else expected[-1]
+                state = 'correct' if rec.label and rec.label.lower() == part else 'wrong'
+            samples.append((jobs[lbl][1], rec.score, rec.margin, state))
+    return samples
+
+
+def tune_thresholds(samples, misread_cost=MISREAD_COST):
+    """
+    Progi (min_score, min_margin) per zestaw minimalizujące
+    misread_cost x (przyjęte błędne + przyjęte puste) + odrzucone poprawne.
+    Kandydaci to środki między kolejnymi wartościami z próbek; przy remisie niższe progi.
+    """
+    def candidates(values):
+        v = np.unique(np.round(values, 4))
+        return np.concatenate(([-1.0], (v[:-1] + v[1:]) / 2))
+
+    out = {}
+    for set_name in sorted({s[0] for s in samples}):
+        rows = [s for s in samples if s[0] == set_name]
+        scores = np.array([r[1] for r in rows])
+        margins = np.array([r[2] for r in rows])
+        good = np.array([r[3] == 'correct' for r in rows])
+        best = None
+        for min_score in candidates(scores):
+            for min_margin in candidates(margins):
+                accepted = (scores >= min_score) & (margins >= min_margin)
+                bad = int(np.count_nonzero(accepted & ~good))
+                lost = int(np.count_nonzero(~accepted & good))
+                cost = misread_cost * bad + lost
+                if best is None or cost < best[0]:
+                    best = (cost, float(min_score), max(0.0, float(min_margin)), bad, lost)
+        _, min_score, min_margin, bad, lost = best
+        out[set_name] = {
+            'min_score': round(min_score, 3), 'min_margin': round(min_margin, 3),
+            'correct': int(good.sum()), 'rejected_correct': lost,
+            'bad': int((~good).sum()), 'accepted_bad': bad,
+        }
+    return out
+
+
+def compare(report, baseline):
+    """Regresje względem poprzedniego raportu: spadek trafności lub wzrost p50."""
+    regressions = []
+    for name, cur in report['recognizers'].items():
+        old = baseline.get('recognizers', {}).get(name)
+        if not old or 'skipped' in cur or 'skipped' in old:
+            continue
+        if (cur['accuracy'] or 0) < (old['accuracy'] or 0):
+            regressions.append(f"{name}: trafność {old['accuracy']} -> {cur['accuracy']}")
+        p50_old, p50_cur = old['latency_ms']['total']['p50'], cur['latency_ms']['total']['p50']
+        print(f"  {name:15s} p50 {p50_old:8.1f} -> {p50_cur:8.1f} ms, trafność {old['accuracy']} -> {cur['accuracy']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark rozpoznawania kart na zapisanych klatkach.')
+    parser.add_argument('recognizers', nargs='*', default=list(RECOGNIZERS),
+                        help=f'domyślnie wszystkie: {", ".join(RECOGNIZERS)}')
+    parser.add_argument('--repeat', type=int, default=1, help='ile razy odtworzyć zestaw klatek')
+    parser.add_argument('--out', default=OUT_PATH, help='plik wynikowy JSON')
+    parser.add_argument('--baseline', help='poprzedni raport JSON do porównania')
+    parser.add_argument('--tables', type=int, default=0,
+                        help='dodatkowo: N stołów z plików przez TableManager (stoły/s)')
+    parser.add_argument('--table-steps', type=int, default=100, help='liczba kroków testu stołów')
+    parser.add_argument('--preprocess', help="przetwarzanie dla notebook-batch/-calibrated, np. 'otsu', 'equalize,blur:5'")
+    parser.add_argument('--no-reject', action='store_true', help='notebook-batch/-calibrated bez progów odrzucenia')
+    parser.add_argument('--engine', choices=('template', 'nn'),
+                        help="silnik wszystkich zestawów dla notebook-batch/-calibrated i --tune (domyślnie z layout.json)")
+    parser.add_argument('--tune', action='store_true',
+                        help="propozycja progów odrzucenia per zestaw (grupa 'reject' w layout.json)")
+    args = parser.parse_args(argv)
+    global PREPROCESS, REJECT, ENGINE
+    PREPROCESS = args.preprocess
+    ENGINE = args.engine
+    REJECT = not args.no_reject
+
+    # Skrypty importują moduły obok siebie (bot3 -> classifier itd.)
+    sys.path.insert(0, BASE_DIR)
+    manifest = load_manifest()
+    frames = [(path, cv2.imread(os.path.join(BASE_DIR, path))) for path in frame_paths()]
+    frames = [(path, img) for path, img in frames if img is not None]
+
+    report = {
+        'meta': {
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'frames': len(frames),
+            'repeat': args.repeat,
+            'preprocess': args.preprocess,
+            'engine': args.engine,
+            'reject': REJECT,
+        },
+        'recognizers': {},
+    }
+    for name in args.recognizers:
+        res = report['recognizers'][name] = run_recognizer(name, frames, manifest, args.repeat)
+        if 'skipped' in res:
+            print(f"{name:15s} pominięty ({res['skipped']})")
+            continue
+        lat = res['latency_ms']
+        print(f"{name:15s} {res['fps']:7.2f} kl/s  p50 {lat['total']['p50']:8.1f} ms  "
+              f"p90 {lat['total']['p90']:8.1f} ms  "
+              f"(crop {lat['crop']['p50']:.1f} / match {lat['match']['p50']:.1f} / "
+              f"evaluate {lat['evaluate']['p50']:.1f})  "
+              f"trafność {res['correct']}/{res['cards']} = {res['accuracy']}  odrzucone {res['rejected']}  "
+              f"błędne {res['misreads']}  w pustych {res['phantom']}  błędy {res['errors']}")
+
+    if args.tune:
+        tuned = report['thresholds'] = tune_thresholds(collect_samples(frames, manifest))
+        print(f"Progi odrzucenia (koszt błędnej karty x{MISREAD_COST}):")
+        for set_name, t in tuned.items():
+            print(f"  {set_name:8s} min_score {t['min_score']:.3f}  min_margin {t['min_margin']:.3f}  "
+                  f"odrzucone poprawne {t['rejected_correct']}/{t['correct']}  "
+                  f"przyjęte błędne/puste {t['accepted_bad']}/{t['bad']}")
+        # Progi silnika innego niż template pod kluczem 'zestaw@silnik' (Layout.thresholds)
+        suffix = f'@{ENGINE}' if ENGINE and ENGINE != 'template' else ''
+        block = ', '.join(f'"{k}{suffix}": [{t["min_score"]}, {t["min_margin"]}]' for k, t in tuned.items())
+        print(f'  layout.json: "reject": {{{block}}}')
+
+    if args.tables:
+        res = report['tables'] = run_tables(frames, args.tables, args.table_steps)
+        print(f"stoły x{res['tables']:<3d}     {res['tables_per_s']:7.1f} stołów/s  "
+              f"{res['tables_per_s_per_core']:7.1f} stołów/s/rdzeń  krok {res['step_ms']:.1f} ms  "
+              f"rozpoznań {res['recognitions']}  max czekanie {res['max_wait_steps']}  błędy {res['errors']}")
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+    print(f"Zapisano: {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f))
+        for line in regressions:
+            print(f"REGRESJA {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+import time
+from itertools import combinations_with_replacement
+import cv2
+import numpy as np
+from numpy.lib.stride_tricks import as_strided, sliding_window_view
+
+from recognition import Recognition
+
+# Regiony trzech kart Blitz (współrzędne zrzutu okna po obcięciu 9 px z lewej) i ich zestawy szablonów
+CARD_REGIONS = {
+    'card1': (688, 612, 75, 94),
+    'card2': (728, 586, 75, 94),
+    'card3': (772, 586, 78, 94),
+}
+TEMPLATE_SETS = {
+    'card1': 'templates/card1',
+    'card2': 'templates/card2',
+    'card3': 'templates/card3',
+}
+# Bramka "nasza kolej": któryś z PIXEL_SPAN pikseli od PIXEL_COORDS w prawo ma dokładnie ten kolor
+PIXEL_COORDS = (684, 743)
+PIXEL_SPAN = 15
+EXPECTED_BGR = np.array([255, 254, 254], dtype=np.uint8)
+# Kolor sygnalizujący kolor (flush) – od razu Bet
+FLUSH_COORDS = (633, 465)
+FLUSH_EXPECT_BGR = np.array([15, 3, 69], dtype=np.uint8)
+# Progi odrzucenia karty: wynik i przewaga nad drugim szablonem (na bth.png 8 wygrywa o 0.015)
+MIN_SCORE = 0.65
+MIN_MARGIN = 0.01
+# Środki cyfr kart w wycinkach CARD_REGIONS (x, y), zmierzone na bth.png – karty Blitz leżą zawsze
+# w tych samych miejscach, więc szablony sprawdzane są tylko ±SEARCH_RADIUS px wokół środka
+GLYPH_CENTERS = {
+    'card1': (32, 38),
+    'card2': (31, 49),
+    'card3': (34, 47),
+}
+SEARCH_RADIUS = 2
+# Odstęp pętli: klatka (30 kl/s) zamiast dawnych 0.5 s
+POLL_INTERVAL = 1 / 30
+BET, FOLD = 'Bet', 'Fold'
+# Przyciski względem lewego górnego rogu okna Chrome
+CLICK_COORDS = {BET: (920, 740), FOLD: (726, 740)}
+
+
+def calculate_decision(card_numbers):
+    cards_sorted = sorted(card_numbers)
+    # 1. Przynajmniej jedna karta >= 13
+    if any(card >= 13 for card in cards_sorted):
+        return BET
+    # 2. Sekwens (np. 4,5,6)
+    if all(cards_sorted[i] + 1 == cards_sorted[i+1] for i in range(2)):
+        return BET
+    # 3. Specjalny przypadek: dokładnie (2,3,14) (po sortowaniu)
+    if tuple(cards_sorted) == (2, 3, 14):
+        return BET
+    # 4. Dwie takie same (para)
+    if cards_sorted[0] == cards_sorted[1] or cards_sorted[1] == cards_sorted[2] or cards_sorted[0] == cards_sorted[2]:
+        return BET
+    # 5. Trzy takie same (trójka)
+    if cards_sorted[0] == cards_sorted[1] == cards_sorted[2]:
+        return BET
+    return FOLD
+
+
+# Wszystkie 455 posortowanych trójek policzone raz – w pętli tylko odczyt ze słownika
+DECISIONS = {combo: calculate_decision(combo) for combo in combinations_with_replacement(range(2, 15), 3)}
+
+
+class SlotMatcher:
+    """
+    Szablony jednego slotu Blitz przygotowane raz: binaryzowane Otsu (bank 'otsu'), o średniej 0
+    i normie 1, wyśrodkowane we wspólnym polu – kolumny macierzy K. Okna pola we wszystkich
+    położeniach ±radius wokół środka cyfry to wiersze drugiej macierzy, więc liczniki
+    TM_CCOEFF_NORMED wszystkich szablonów to jedno mnożenie; sumy okien w obrębie szablonów
+    z obrazu całkowego (wycinek binarny 0/1: suma kwadratów = suma). Wynik jak matchTemplate
+    ograniczony do tych położeń.
+    """
+
+    def __init__(self, tset, center, shape, radius=SEARCH_RADIUS):
+        self.labels = list(tset.labels)
+        # Etykiety plików to liczby kart (10..14 = T..A) – zamiana raz, nie extract_number przy każdym odczycie
+        self.numbers = [int(label) for label in self.labels]
+        n = len(self.labels)
+        fh = max(tpl.shape[0] for tpl in tset.images)
+        fw = max(tpl.shape[1] for tpl in tset.images)
+        K = np.zeros((n, fh, fw), dtype=np.float32)
+        boxes = np.empty((n, 4), dtype=np.int64)
+        for i, tpl in enumerate(tset.images):
+            th, tw = tpl.shape
+            oy, ox = (fh - th) // 2, (fw - tw) // 2
+            zero_mean = tpl.astype(np.float32) - tpl.mean()
+            K[i, oy:oy + th, ox:ox + tw] = zero_mean / max(np.linalg.norm(zero_mean), 1e-6)
+            boxes[i] = oy, ox, th, tw
+        self.K = np.ascontiguousarray(K.reshape(n, -1).T)
+
+        # Pole szukania: pole szablonów przesuwane o ±radius wokół środka cyfry, w całości w wycinku
+        side = 2 * radius + 1
+        cx, cy = center
+        self.y0, self.x0 = cy - fh // 2 - radius, cx - fw // 2 - radius
+        self.area = (fh + 2 * radius, fw + 2 * radius)
+        h, w = shape
+        if self.y0 < 0 or self.x0 < 0 or self.y0 + self.area[0] > h or self.x0 + self.area[1] > w:
+            raise ValueError(f"Pole szukania {self.area[1]}x{self.area[0]} od ({self.x0}, {self.y0}) wychodzi "
+                             f"poza wycinek {w}x{h} – popraw środek cyfry {center}")
+        # Narożniki prostokąta każdego szablonu w obrazie całkowym pola, układ (dx, dy, szablon)
+        oy, ox, th, tw = boxes.T
+        dx = np.arange(side)[:, None, None]
+        dy = np.arange(side)[None, :, None]
+        stride = self.area[1] + 1
+        top = (dy + oy) * stride + dx + ox
+        bottom = top + th * stride
+        self.corners = [(bottom + tw).ravel(), bottom.ravel(), (top + tw).ravel(), top.ravel()]
+        self.counts = (th * tw).astype(np.float32)
+        # Pole przesunięte o dx jako osobne ciągłe bloki: okno (dx, dy) to ciągły fragment bloku dx
+        # od wiersza dy, więc macierz okien kopiuje się całymi wierszami
+        self.fw = fw
+        self.shifted = np.empty((side, self.area[0], fw), dtype=np.float32)
+        self.windows = np.empty((side, side, fh * fw), dtype=np.float32)
+        self.rows = as_strided(self.shifted, self.windows.shape, self.shifted.strides)
+        self.integral = np.empty((self.area[0] + 1, stride), dtype=np.int32)
+
+    def scores(self, binary):
+        """Najlepszy TM_CCOEFF_NORMED każdego szablonu w polu szukania binarnego (0/1) wycinka slotu."""
+        ah, aw = self.area
+        area = binary[self.y0:self.y0 + ah, self.x0:self.x0 + aw]
+        np.copyto(self.shifted, sliding_window_view(area, self.fw, axis=1).transpose(1, 0, 2))
+        np.copyto(self.windows, self.rows)
+        num = self.windows.reshape(-1, self.K.shape[0]) @ self.K
+        flat = cv2.integral(area, self.integral).ravel()
+        a, b, c, d = self.corners
+        sums = (flat.take(a) - flat.take(b) - flat.take(c) + flat.take(d)).reshape(num.shape).astype(np.float32)
+        # Płaskie okno daje 0 jak w matchTemplate; niezerowa suma kwadratów odchyleń okna 0/1 jest >= 0.5
+        spread = np.maximum(sums - sums * sums / self.counts, 0.5)
+        return (num / np.sqrt(spread)).max(axis=0)
+
+    def match(self, gray):
+        """Wycinek w skali szarości -> Recognition (etykieta jak nazwa pliku szablonu, np. '14')."""
+        t0 = time.perf_counter()
+        binary = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+        scores = self.scores(binary).tolist()
+        # Kolejność jak w zestawie – remis rozstrzyga pierwszy szablon, jak w classify_regions
+        return Recognition.from_scores({label: (score, 1.0, 0) for label, score in zip(self.labels, scores)}, t0)
+
+
+class BlitzEngine:
+    """
+    Jedna klatka Blitz -> decyzja: bramka koloru piksela, bramka koloru (flush), trzy karty
+    i tablica DECISIONS. Szablony wczytane i przygotowane raz w konstruktorze.
+    self.last: szczegóły ostatniej klatki (powód, rozpoznania, czas w ms) do wyświetlenia.
+    """
+
+    def __init__(self, bank=None, regions=CARD_REGIONS, template_sets=TEMPLATE_SETS, glyph_centers=GLYPH_CENTERS,
+                 min_score=MIN_SCORE, min_margin=MIN_MARGIN):
+        if bank is None:
+            from template_bank import get_bank
+            bank = get_bank('otsu')
+        self.regions = dict(regions)
+        self.slots = {card: SlotMatcher(bank[template_sets[card]], glyph_centers[card], (h, w))
+                      for card, (_, _, w, h) in self.regions.items()}
+        self.min_score = min_score
+        self.min_margin = min_margin
+        # Obszar obejmujący wszystkie karty – jedna konwersja do szarości zamiast całego zrzutu
+        xs = [x for x, _, _, _ in self.regions.values()]
+        ys = [y for _, y, _, _ in self.regions.values()]
+        x1 = max(x + w for x, _, w, _ in self.regions.values())
+        y1 = max(y + h for _, y, _, h in self.regions.values())
+        self.bbox = (min(xs), min(ys), x1, y1)
+        self.last = {}
+
+    @staticmethod
+    def check_pixel(img):
+        """Któryś z PIXEL_SPAN pikseli wiersza ma kolor EXPECTED_BGR – jedno porównanie wycinka wiersza."""
+        x, y = PIXEL_COORDS
+        if not 0 <= y < img.shape[0]:
+            return False
+        row = img[y, max(0, x):x + PIXEL_SPAN]
+        return bool((row == EXPECTED_BGR).all(axis=1).any())
+
+    @staticmethod
+    def check_flush(img):
+        x, y = FLUSH_COORDS
+        h, w = img.shape[:2]
+        return 0 <= x < w and 0 <= y < h and bool((img[y, x] == FLUSH_EXPECT_BGR).all())
+
+    def recognize(self, img):
+        """Zrzut BGR -> {karta: Recognition} z zaznaczonymi odrzuceniami (progi min_score / min_margin)."""
+        x0, y0, x1, y1 = self.bbox
+        gray = cv2.cvtColor(img[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        results = {}
+        for card, (x, y, w, h) in self.regions.items():
+            rec = self.slots[card].match(gray[y - y0:y - y0 + h, x - x0:x - x0 + w])
+            rec.check(self.min_score, self.min_margin)
+            results[card] = rec
+        return results
+
+    def numbers(self, results):
+        """Liczby kart (2..14) rozpoznanych kart; None, gdy którakolwiek odrzucona."""
+        if not all(rec.ok for rec in results.values()):
+            return None
+        return [self.slots[card].numbers[self.slots[card].labels.index(rec.label)]
+                for card, rec in results.items()]
+
+    def decide(self, img):
+        """
+        Zrzut okna BGR -> BET / FOLD albo None (nie nasza kolej, karta nieczytelna).
+        Powód w self.last['reason']: 'no pixel', 'flush', 'cards', 'unreadable'.
+        """
+        t0 = time.perf_counter()
+        results, decision = {}, None
+        if not self.check_pixel(img):
+            reason = 'no pixel'
+        elif self.check_flush(img):
+            reason, decision = 'flush', BET
+        else:
+            results = self.recognize(img)
+            numbers = self.numbers(results)
+            if numbers is None:
+                reason = 'unreadable'
+            else:
+                reason, decision = 'cards', DECISIONS[tuple(sorted(numbers))]
+        self.last = {'reason': reason, 'decision': decision, 'cards': results,
+                     'ms': (time.perf_counter() - t0) * 1000}
+        return decision
+
+
+if __name__ == '__main__':
+    # Zrzuty Blitz: zgodność z classify_regions (bank 'otsu', pełne przeszukiwanie) i czas decide().
+    # blitz.png to inny stół (w slotach brak cyfr kart) – tam wyniki poza polem szukania mogą się różnić,
+    # obie ścieżki odrzucają wszystkie trzy karty
+    import os
+    from classifier import classify_regions
+    from template_bank import get_bank
+
+    base = os.path.dirname(os.path.abspath(__file__))
+    bank = get_bank('otsu')
+    engine = BlitzEngine(bank)
+    jobs = {card: (rect, TEMPLATE_SETS[card]) for card, rect in CARD_REGIONS.items()}
+    assert all(DECISIONS[c] == calculate_decision(c) for c in DECISIONS)
+    for name in ('bth.png', 'blitz.png'):
+        img = cv2.imread(os.path.join(base, name))
+        reference = classify_regions(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), jobs, bank)
+        cards = engine.recognize(img)
+        for card, rec in cards.items():
+            ref = reference[card]
+            print(f"{name:10s} {card}: {rec.label:>3s} {rec.score:.4f} margines {rec.margin:.4f}"
+                  f"{' odrzucona' if rec.rejected else ''}  |  classify_regions {ref.label:>3s} {ref.score:.4f} "
+                  f"margines {ref.margin:.4f}")
+        # Bramka piksela jest fałszywa na blitz.png – czas samego rozpoznania i pełnej decyzji osobno
+        n = 500
+        t0 = time.perf_counter()
+        for _ in range(n):
+            engine.recognize(img)
+        t_rec = (time.perf_counter() - t0) / n * 1000
+        t0 = time.perf_counter()
+        for _ in range(n):
+            engine.decide(img)
+        t_dec = (time.perf_counter() - t0) / n * 1000
+        t0 = time.perf_counter()
+        for _ in range(50):
+            classify_regions(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), jobs, bank)
+        t_ref = (time.perf_counter() - t0) / 50 * 1000
+        print(f"{name:10s} decyzja {engine.last['decision']} ({engine.last['reason']}): decide {t_dec:.3f} ms, "
+              f"rozpoznanie 3 kart {t_rec:.3f} ms (cvtColor całego zrzutu + classify_regions {t_ref:.2f} ms)")
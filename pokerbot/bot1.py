@@ -1,12 +1,27 @@
 import os
+import time
 import cv2
 import numpy as np
-from PIL import ImageGrab
 from treys import Card, Evaluator
+from coarse_search import coarse_to_fine_match
+from transform_cache import TransformCache
+from recognition import Recognition
+from frame_source import MssFrameSource
+from equity import decide
+from layout import get_layout, Calibrator, calibrate_screen
 
 # Absolutna ścieżka do folderu z szablonami
 TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Tryb wyszukiwania: 'pyramid' (coarse-to-fine, coarse_search.py), 'cached' (pełna siatka
+# na szablonach przeskalowanych przy starcie, transform_cache.py) lub 'exhaustive'
+SEARCH_MODE = 'pyramid'
+ROTATION_ANGLES = range(-15, 16, 5)
+# Progi odrzucenia (min. wynik, min. przewaga nad drugim szablonem) – słabsze dopasowanie
+# read_card zgłasza jak nieczytelną kartę (ValueError) zamiast zgadywać
+REJECT_RANK = (0.5, 0.02)
+REJECT_SUIT = (0.5, 0.02)
+
 # 1. Wczytanie wszystkich szablonów (czarno-białe PNG w katalogu TEMPLATE_DIR)
 rank_templates = {}
 suit_templates = {}
@@ -50,33 +65,62 @@ def multi_scale_template_match(img, tpl, scale_range=(0.5, 1.5), steps=10):
     return best_val, best_scale, best_loc
 
 
-def match_template(img, templates):
-    """Zwraca (klucz, wartość dopasowania) najlepszego template’u przy dopasowaniu wieloskaliowym."""
-    best_val = -1
-    best_key = None
+def template_scores(img, templates, angle=0, scores=None):
+    """{klucz: (wynik, skala, kąt)} – najlepsza skala każdego template’u (do scores, jeśli lepsza)."""
+    scores = {} if scores is None else scores
     for key, tpl in templates.items():
         val, scale, loc = multi_scale_template_match(img, tpl)
-        if val > best_val:
-            best_val = val
-            best_key = key
-    return best_key, best_val
+        if val > scores.get(key, (-1,))[0]:
+            scores[key] = (val, scale, angle)
+    return scores
 
 
-def match_with_rotation(img, templates, angles=range(-15, 16, 5)):
-    """Próbuj rotować fragment i dopasowywać template’y, zwraca najlepszy przy dopasowaniu wieloskaliowym."""
-    best_val = -1
-    best_key = None
+def match_template(img, templates):
+    """Recognition najlepszego template’u (z wynikiem drugiego) przy dopasowaniu wieloskaliowym."""
+    t0 = time.perf_counter()
+    return Recognition.from_scores(template_scores(img, templates), t0)
+
+
+def match_with_rotation(img, templates, angles=ROTATION_ANGLES):
+    """Próbuj rotować fragment i dopasowywać template’y, zwraca Recognition najlepszego (z kątem i skalą)."""
+    t0 = time.perf_counter()
+    scores = {}
     for angle in angles:
         h_img, w_img = img.shape[:2]
         M = cv2.getRotationMatrix2D((w_img/2, h_img/2), angle, 1.0)
         rot = cv2.warpAffine(img, M, (w_img, h_img), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
-        key, val = match_template(rot, templates)
-        if val > best_val:
-            best_val, best_key = val, key
-    return best_key, best_val
+        template_scores(rot, templates, angle, scores)
+    return Recognition.from_scores(scores, t0)
+
+
+# Cache wariantów szablonów: (id słownika szablonów, rotated) -> TransformCache
+transform_caches = {}
+
 
+def get_transform_cache(templates, rotated):
+    """Warianty szablonów dla pełnej siatki – budowane raz na proces."""
+    key = (id(templates), rotated)
+    cache = transform_caches.get(key)
+    if cache is None:
+        angles = ROTATION_ANGLES if rotated else (0,)
+        cache = transform_caches[key] = TransformCache(templates, angles=angles, steps=10)
+    return cache
 
-def read_card(gray, rank_rect, suit_rect, rotated=False):
+
+def best_match(img, templates, rotated, search=None):
+    """Dopasowanie pełną siatką (kąt x skala x szablon) albo przeszukiwaniem coarse-to-fine."""
+    search = search or SEARCH_MODE
+    if search == 'pyramid':
+        angles = ROTATION_ANGLES if rotated else (0,)
+        return coarse_to_fine_match(img, templates, angles=angles, steps=10)
+    if search == 'cached':
+        return get_transform_cache(templates, rotated).match(img)
+    if rotated:
+        return match_with_rotation(img, templates)
+    return match_template(img, templates)
+
+
+def read_card(gray, rank_rect, suit_rect, rotated=False, search=None):
     x, y, w, h = rank_rect
     rank_img = gray[y:y+h, x:x+w]
     x2, y2, w2, h2 = suit_rect
@@ -87,66 +131,57 @@ def read_card(gray, rank_rect, suit_rect, rotated=False):
     h_suit, w_suit = suit_img.shape[:2]
     if h_suit == 0 or w_suit == 0:
         raise ValueError(f"Wycinek suit poza ekranem lub o zerowym rozmiarze: {h_suit}x{w_suit}")
-    if rotated:
-        rank, _ = match_with_rotation(rank_img, rank_templates)
-        suit, _ = match_with_rotation(suit_img, suit_templates)
-    else:
-        rank, _ = match_template(rank_img, rank_templates)
-        suit, _ = match_template(suit_img, suit_templates)
-    card_str = rank + suit
+    rank = best_match(rank_img, rank_templates, rotated, search=search)
+    suit = best_match(suit_img, suit_templates, rotated, search=search)
+    if not rank.check(*REJECT_RANK):
+        raise ValueError(f"Niepewny rank: {rank}")
+    if not suit.check(*REJECT_SUIT):
+        raise ValueError(f"Niepewny kolor: {suit}")
+    card_str = rank.label + suit.label
     if len(card_str) != 2:
         raise ValueError(f"Nieprawidłowy kod karty: '{card_str}'")
     return card_str
 
-# Definicje regionów (x, y, szer, wys)
-flop_rank = [
-    (641, 536, 59, 79),
-    (813, 536, 59, 79),
-    (990, 536, 59, 79),
-    (1165, 536, 59, 79),
-    (1340, 536, 59, 79),
-]
-flop_suit = [
-    (641, 620, 48, 68),
-    (813, 620, 48, 68),
-    (990, 620, 48, 68),
-    (1165, 620, 48, 68),
-    (1340, 620, 48, 68),
-]
-hand1_rank = [
-    (629, 817, 46, 95),
-    (727, 811, 62, 81),
-]
-hand1_suit = [
-    (649, 915, 51, 53),
-    (730, 909, 47, 51),
-]
-hand2_rank = [
-    (1249, 797, 62, 105),
-    (1340, 803, 58, 80),
-]
-hand2_suit = [
-    (1255, 910, 44, 54),
-    (1340, 909, 47, 51),
-]
+# Definicje regionów (x, y, szer, wys) – grupa search_regions z layout.json
+def region_lists(rects):
+    """(flop_rank, flop_suit, hand1_rank, hand1_suit, hand2_rank, hand2_suit) z {nazwa: prostokąt}."""
+    cards = (['f1', 'f2', 'f3', 'f4', 'f5'], ['h1-1', 'h1-2'], ['h2-1', 'h2-2'])
+    return [[rects[f'{c}-{kind}'] for c in group] for group in cards for kind in ('rank', 'suit')]
+
+flop_rank, flop_suit, hand1_rank, hand1_suit, hand2_rank, hand2_suit = region_lists(
+    get_layout().rects('search_regions'))
 
 def main():
-    screen = np.array(ImageGrab.grab())
-    gray = cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY)
+    if SEARCH_MODE == 'cached':
+        for name, templates, rotated in (('rank', rank_templates, True),
+                                         ('suit', suit_templates, False), ('suit-rot', suit_templates, True)):
+            print(get_transform_cache(templates, rotated).report(name))
+
+    # Kotwice z layout.json wyznaczają położenie i skalę okna gry na ekranie (zapamiętywane per rozmiar)
+    flop_rank, flop_suit, hand1_rank, hand1_suit, hand2_rank, hand2_suit = region_lists(
+        get_layout().rects('search_regions', calibrate_screen(Calibrator(get_layout()))))
+
+    # Jedno przechwycenie prostokąta obejmującego wszystkie regiony (mss, bez PIL)
+    rects = flop_rank + flop_suit + hand1_rank + hand1_suit + hand2_rank + hand2_suit
+    with MssFrameSource(dict(enumerate(rects))) as source:
+        source.grab()
+        gray = source.gray_frame()
+    local = source.local
 
     flop = []
     for idx, (rr, sr) in enumerate(zip(flop_rank, flop_suit), start=1):
         try:
-            card = read_card(gray, rr, sr, rotated=False)
+            card = read_card(gray, local(rr), local(sr), rotated=False)
         except ValueError as e:
+            # Brak karty stołu (np. jeszcze odwracana) – decyzja z equity na znanych kartach
             print(f"Błąd przy czytaniu flop karty #{idx}: {e}")
-            raise
+            continue
         flop.append(card)
     
     hand1 = []
     for idx, (rr, sr) in enumerate(zip(hand1_rank, hand1_suit), start=1):
         try:
-            card = read_card(gray, rr, sr, rotated=True)
+            card = read_card(gray, local(rr), local(sr), rotated=True)
         except ValueError as e:
             print(f"Błąd przy czytaniu hand1 karty #{idx}: {e}")
             raise
@@ -155,12 +190,20 @@ def main():
     hand2 = []
     for idx, (rr, sr) in enumerate(zip(hand2_rank, hand2_suit), start=1):
         try:
-            card = read_card(gray, rr, sr, rotated=True)
+            card = read_card(gray, local(rr), local(sr), rotated=True)
         except ValueError as e:
             print(f"Błąd przy czytaniu hand2 karty #{idx}: {e}")
             raise
         hand2.append(card)
 
+    if len(flop) < 5:
+        chosen, res = decide(flop, hand1, hand2)
+        print(f'Flop:  {", ".join(flop)} ({len(flop)}/5 kart)')
+        print(f'Hand1: {", ".join(hand1)} → equity={res.equity1:.3f}')
+        print(f'Hand2: {", ".join(hand2)} → equity={res.equity2:.3f}')
+        print(f'\nZalecam wybrać: {chosen}')
+        return
+
     evaluator = Evaluator()
     try:
         board = [Card.new(c) for c in flop]
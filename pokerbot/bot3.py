@@ -1,75 +1,90 @@
 import cv2
-import os
-from treys import Card, Evaluator
+from template_bank import get_bank
+from classifier import classify_regions
+from equity import equity
+from recognition_cache import get_cache
+from layout import get_layout, card_regions, Calibrator
+from metrics import get_metrics
 
-# --- Definicje regionów i katalogów szablonów ---
-REGIONS = {
-    'f1': {'r': (641, 536, 59, 79),  's': (641, 630, 56, 68),  'rank_dir': 'rank',    'suit_dir': 'suit'},
-    'f2': {'r': (813, 536, 59, 79),  's': (813, 630, 56, 68),  'rank_dir': 'rank',    'suit_dir': 'suit'},
-    'f3': {'r': (990, 536, 59, 79),  's': (990, 630, 56, 68),  'rank_dir': 'rank',    'suit_dir': 'suit'},
-    'f4': {'r': (1165, 536, 59, 79), 's': (1165, 630, 56, 68), 'rank_dir': 'rank',    'suit_dir': 'suit'},
-    'f5': {'r': (1340, 536, 59, 79), 's': (1340, 630, 56, 68), 'rank_dir': 'rank',    'suit_dir': 'suit'},
-    'h1-1': {'r': (635, 816, 66, 76), 's': (649, 915, 51, 53), 'rank_dir': 'rank-h1', 'suit_dir': 'suit-h1'},
-    'h1-2': {'r': (733, 808, 59, 79), 's': (729, 909, 47, 51), 'rank_dir': 'rank-h1', 'suit_dir': 'suit-h1'},
-    'h2-1': {'r': (1255, 803, 61, 95),'s': (1255, 910, 51, 53),'rank_dir': 'rank-h2', 'suit_dir': 'suit-h2'},
-    'h2-2': {'r': (1346, 808, 59, 79),'s': (1331, 900, 52, 59),'rank_dir': 'rank-h2', 'suit_dir': 'suit-h2'},
-}
+# --- Regiony i zestawy szablonów z layout.json (współrzędne klatki referencyjnej) ---
+REGIONS = card_regions(get_layout().regions())
+# Progi odrzucenia {'f1': {'r': (min_score, min_margin), 's': ...}} z grupy 'reject' layout.json
+THRESHOLDS = {}
+for name, limits in get_layout().thresholds().items():
+    cid, kind = name.rsplit('-', 1)
+    THRESHOLDS.setdefault(cid, {})[kind[0]] = limits
+# Czasy etapów rozpoznania (bot3.*) we wspólnym rejestrze – podgląd metrics.serve() / summary_line()
+metrics = get_metrics()
 
-def load_templates_from(dir_path):
-    templates = {}
-    for fname in os.listdir(dir_path):
-        if fname.endswith('.png'):
-            key = os.path.splitext(fname)[0]
-            img = cv2.imread(os.path.join(dir_path, fname), cv2.IMREAD_GRAYSCALE)
-            templates[key] = img
-    return templates
+@metrics.timed('bot3.recognize_cards')
+def recognize_cards(screen_path='blitz.png', cache=None, calibrator=None):
+    """
+    Rozpoznanie kart z pliku zrzutu. calibrator (layout.Calibrator): regiony przeliczane
+    kotwicami na kadr zrzutu – inne przesunięcie lub rozmiar okna niż w klatce referencyjnej.
+    """
+    with metrics.timer('bot3.imread'):
+        img = cv2.imread(screen_path)
+    with metrics.timer('bot3.gray'):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    regions = REGIONS
+    if calibrator is not None:
+        with metrics.timer('bot3.calibrate'):
+            transform, _ = calibrator.ensure(gray)
+            regions = card_regions(calibrator.layout.regions(transform))
+    return recognize_gray(gray, cache, regions, bgr=img)
 
-def match_template(patch, templates):
-    best_key, best_val = None, -1.0
-    for key, tpl in templates.items():
-        res = cv2.matchTemplate(patch, tpl, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, _ = cv2.minMaxLoc(res)
-        if max_val > best_val:
-            best_val = max_val
-            best_key = key
-    return best_key
+def recognize_gray(gray, cache=None, regions=REGIONS, thresholds=THRESHOLDS, bgr=None):
+    """
+    Rozpoznanie kart z klatki już w skali szarości: {region: 'rs'} (cache: RecognitionCache).
+    bgr: ta sama klatka w kolorze – kolory kart przez silnik 'colour' (suit_colour).
+    Karta z rangą lub kolorem poniżej progów: None zamiast zgadywania.
+    """
+    # Wszystkie 18 wycinków rozpoznawane jednym wsadem (szablony z banku wczytanego raz na proces)
+    jobs = {}
+    for name, cfg in regions.items():
+        jobs[(name, 'r')] = (cfg['r'], cfg['rank_dir'])
+        jobs[(name, 's')] = (cfg['s'], cfg['suit_dir'])
+    with metrics.timer('bot3.match'):
+        matches = classify_regions(gray, jobs, get_bank(), cache, bgr=bgr)
 
-def recognize_cards(screen_path='blitz.png'):
-    img = cv2.imread(screen_path)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    results = {}
-    for name, cfg in REGIONS.items():
-        x, y, w, h = cfg['r']
-        rank_patch = gray[y:y+h, x:x+w]
-        x2, y2, w2, h2 = cfg['s']
-        suit_patch = gray[y2:y2+h2, x2:x2+w2]
-
-        rank_tpls = load_templates_from(cfg['rank_dir'])
-        suit_tpls = load_templates_from(cfg['suit_dir'])
-
-        rank = match_template(rank_patch, rank_tpls)
-        suit = match_template(suit_patch, suit_tpls)
-
-        results[name] = rank + suit
+    with metrics.timer('bot3.check'):
+        results = {}
+        for name in regions:
+            rank, suit = matches[(name, 'r')], matches[(name, 's')]
+            limits = thresholds.get(name, {})
+            ok = rank.check(*limits.get('r', (-1.0, 0.0)))
+            ok = suit.check(*limits.get('s', (-1.0, 0.0))) and ok
+            results[name] = rank.label + suit.label if ok else None
     return results
 
 def evaluate_choice(rec):
-    evaluator = Evaluator()
-    board = [Card.new(rec[f]) for f in ['f1','f2','f3','f4','f5']]
-    h1 = [Card.new(rec['h1-1']), Card.new(rec['h1-2'])]
-    h2 = [Card.new(rec['h2-1']), Card.new(rec['h2-2'])]
-
-    score1 = evaluator.evaluate(board, h1)
-    score2 = evaluator.evaluate(board, h2)
-    choice = 'hand1' if score1 < score2 else 'hand2'
-    return score1, score2, choice
+    """
+    Szanse obu rąk przy znanych kartach stołu (brakujące / odrzucone są dokładane).
+    Zwraca (equity hand1, equity hand2, wybór) albo None, gdy nie ma pewnej karty którejś ręki
+    albo ta sama karta odczytała się dwa razy (błędny odczyt).
+    """
+    board = [rec[f] for f in ['f1','f2','f3','f4','f5'] if rec.get(f)]
+    h1 = [rec.get('h1-1'), rec.get('h1-2')]
+    h2 = [rec.get('h2-1'), rec.get('h2-2')]
+    if not all(h1 + h2):
+        return None
+    try:
+        res = equity(board, h1, h2)
+    except ValueError:
+        return None
+    choice = 'hand1' if res.equity1 > res.equity2 else 'hand2'
+    return res.equity1, res.equity2, choice
 
 if __name__ == '__main__':
-    rec = recognize_cards('D:\\Python\\hello\\pokerbot\\blitz.png')
+    rec = recognize_cards('D:\\Python\\hello\\pokerbot\\blitz.png', get_cache(), Calibrator(get_layout()))
     print("Rozpoznane karty:")
     print("Flop:", [rec[f] for f in ['f1','f2','f3','f4','f5']])
     print("Hand1:", rec['h1-1'], rec['h1-2'])
     print("Hand2:", rec['h2-1'], rec['h2-2'])
-    s1, s2, best = evaluate_choice(rec)
-    print(f"Ocena hand1: {s1}, hand2: {s2}")
-    print("Wybrano:", best)
+    choice = evaluate_choice(rec)
+    if choice is None:
+        print("Karty rąk nierozpoznane pewnie – brak decyzji")
+    else:
+        s1, s2, best = choice
+        print(f"Equity hand1: {s1:.3f}, hand2: {s2:.3f}")
+        print("Wybrano:", best)
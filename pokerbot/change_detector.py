@@ -0,0 +1,133 @@
+import cv2
+
+from classifier import classify_regions
+
+# Odcisk regionu: miniatura w skali szarości (INTER_AREA uśrednia szum renderowania)
+THUMB_SIZE = (16, 16)
+# Region uznajemy za zmieniony, gdy któryś piksel miniatury różni się o więcej niż tyle.
+# Na shots/ zmiana etykiety dawała zawsze >= 18, statyczna klatka ~0.
+MAX_DIFF = 10
+
+
+def fingerprint(img, size=THUMB_SIZE):
+    """Miniatura regionu (BGR/BGRA są najpierw zamieniane na szarość)."""
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY if img.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+
+class ChangeDetector:
+    """
+    Odciski regionów z chwili ostatniego rozpoznania.
+    Porównanie jest z odciskiem zapamiętanym przy ostatniej zmianie, a nie z poprzednią
+    klatką – powolna animacja (odwracanie karty) też w końcu przekroczy próg.
+    """
+
+    def __init__(self, size=THUMB_SIZE, max_diff=MAX_DIFF):
+        self.size = size
+        self.max_diff = max_diff
+        self.prints = {}
+
+    def distance(self, name, img):
+        """Największa różnica piksela miniatury względem zapamiętanego odcisku (None, gdy brak)."""
+        prev = self.prints.get(name)
+        if prev is None:
+            return None
+        return int(cv2.absdiff(fingerprint(img, self.size), prev).max())
+
+    def changed(self, name, img, update=True):
+        """True, gdy region się zmienił (lub jest nowy); update=True zapamiętuje nowy odcisk."""
+        thumb = fingerprint(img, self.size)
+        prev = self.prints.get(name)
+        if prev is not None and int(cv2.absdiff(thumb, prev).max()) <= self.max_diff:
+            return False
+        if update:
+            self.prints[name] = thumb
+        return True
+
+    def remember(self, name, img):
+        """Zapamiętuje odcisk bez porównania (np. stan stołu, z którego odczytano karty)."""
+        self.prints[name] = fingerprint(img, self.size)
+
+    def reset(self, names=None):
+        """Zapomina odciski (wszystkie lub wybrane) – następne sprawdzenie zwróci True."""
+        if names is None:
+            self.prints.clear()
+        else:
+            for name in names:
+                self.prints.pop(name, None)
+
+
+class GatedClassifier:
+    """
+    classify_regions tylko dla regionów, których odcisk się zmienił;
+    pozostałe dostają etykiety z poprzedniego rozpoznania.
+    cache / pool: przekazywane do classify_regions.
+    """
+
+    def __init__(self, jobs, bank=None, detector=None, cache=None, pool=None):
+        self.jobs = dict(jobs)
+        self.bank = bank
+        self.cache = cache
+        self.pool = pool
+        self.detector = detector or ChangeDetector()
+        self.results = {}
+        self.changed = []
+        self.runs = 0
+        self.skipped = 0
+
+    def classify(self, gray, bgr=None):
+        """
+        {nazwa: Recognition} dla całej klatki; self.changed = przeliczone regiony.
+        bgr: ta sama klatka w kolorze – dla zestawów z silnikiem 'colour'.
+        """
+        changed = {}
+        for name, job in self.jobs.items():
+            x, y, w, h = job[0]
+            if self.detector.changed(name, gray[y:y+h, x:x+w]):
+                changed[name] = job
+        self.changed = list(changed)
+        if changed:
+            self.results.update(classify_regions(gray, changed, self.bank, self.cache, self.pool, bgr=bgr))
+        self.runs += len(changed)
+        self.skipped += len(self.jobs) - len(changed)
+        return self.results
+
+    @property
+    def hit_rate(self):
+        total = self.runs + self.skipped
+        return self.skipped / total if total else 0.0
+
+
+if __name__ == '__main__':
+    # Odtworzenie shots/ z regionami bot3: każda klatka dwa razy (druga = stół bez zmian)
+    import time
+    from glob import glob
+    from frame_source import SHOTS_DIR
+    from bot3 import REGIONS
+
+    jobs = {}
+    for name, cfg in REGIONS.items():
+        jobs[name + '-rank'] = (cfg['r'], cfg['rank_dir'])
+        jobs[name + '-suit'] = (cfg['s'], cfg['suit_dir'])
+    gated = GatedClassifier(jobs)
+    frames = [cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in sorted(glob(SHOTS_DIR + '/*.png'))]
+    classify_regions(frames[0], jobs)
+
+    t_full = t_new = t_static = 0.0
+    diff = 0
+    for gray in frames:
+        t0 = time.perf_counter()
+        full = classify_regions(gray, jobs)
+        t1 = time.perf_counter()
+        got = gated.classify(gray)
+        t2 = time.perf_counter()
+        gated.classify(gray)
+        t3 = time.perf_counter()
+        t_full, t_new, t_static = t_full + t1 - t0, t_new + t2 - t1, t_static + t3 - t2
+        diff += sum(full[name].label != got[name].label for name in jobs)
+
+    n = len(frames)
+    print(f"Klatek: {n}, różnice etykiet względem pełnego rozpoznania: {diff}")
+    print(f"Pełne: {t_full / n * 1000:.2f} ms/klatkę, nowa klatka: {t_new / n * 1000:.2f} ms, "
+          f"stół bez zmian: {t_static / n * 1000:.3f} ms (pominięto {gated.hit_rate:.0%} regionów)")
@@ -0,0 +1,540 @@
+import time
+from itertools import combinations
+import cv2
+import numpy as np
+
+from template_bank import get_bank
+from recognition import Recognition
+
+# Kotwice ograniczenia z góry: przy co najmniej ANCHOR_MIN_TEMPLATES szablonach zestaw dzielony
+# na ANCHOR_GROUPS grup z własną kotwicą (ciaśniejsze ograniczenie, mniej pozycji liczonych dokładnie)
+ANCHOR_GROUPS = 3
+ANCHOR_MIN_TEMPLATES = 8
+
+
+class BatchClassifier:
+    """
+    Wektorowy odpowiednik pętli matchTemplate(TM_CCOEFF_NORMED) + minMaxLoc.
+    Licznik korelacji wszystkich szablonów zestawu z wycinkiem to kilka mnożeń macierzy DFT
+    (tylko poprawne pozycje), mianownik – obrazy całkowe; wycinki o tym samym rozmiarze
+    można podać razem jako tablicę (R, H, W).
+    """
+
+    def __init__(self, templates):
+        self.labels = [label for label, _ in templates.items()]
+        images = [tpl for _, tpl in templates.items()]
+        self.shapes = np.array([img.shape[:2] for img in images], dtype=np.int64).reshape(-1, 2)
+        self.areas = (self.shapes[:, 0] * self.shapes[:, 1]).astype(np.float64)
+        self.zero_mean = [img.astype(np.float64) - img.mean() for img in images]
+        self.norms = np.array([np.sqrt((t * t).sum()) for t in self.zero_mean])
+        self._plans = {}
+
+    def plan(self, shape):
+        """
+        Wszystko, co zależy tylko od rozmiaru wycinka: macierze DFT obcięte do poprawnych
+        pozycji (tych, które zwróciłby matchTemplate), widma szablonów i maski – liczone raz.
+        """
+        plan = self._plans.get(shape)
+        if plan is not None:
+            return plan
+        H, W = shape
+        valid = (self.shapes[:, 0] <= H) & (self.shapes[:, 1] <= W)
+        plan = self._plans[shape] = {'valid': valid}
+        if not valid.any():
+            return plan
+        # Szablony od największego – kolejne grupy mają wspólną kotwicę ograniczenia z góry
+        index = np.flatnonzero(valid)
+        index = index[np.argsort(-self.areas[index], kind='stable')]
+        hs, ws = self.shapes[index, 0], self.shapes[index, 1]
+        # Potrzebny jest tylko lewy górny fragment korelacji – pozycje najmniejszego szablonu
+        out_h, out_w = int(H - hs.min() + 1), int(W - ws.min() + 1)
+        K = W // 2 + 1
+
+        # DFT o rozmiarze wycinka, bez dopełnienia: korelacja cykliczna nie zawija się na poprawnych
+        # pozycjach; szablony podzielone przez normę – licznik jest od razu w jednostkach wyniku
+        padded = np.zeros((len(index), H, W))
+        for j, i in enumerate(index):
+            h, w = self.zero_mean[i].shape
+            padded[j, :h, :w] = self.zero_mean[i] / self.norms[i]
+        spectra = np.conj(np.fft.rfft2(padded)).transpose(1, 0, 2)
+        angle = -2 * np.pi * np.outer(np.arange(W), np.arange(K)) / W
+        dft_x = np.empty((W, 2 * K), dtype=np.float32)
+        dft_x[:, 0::2], dft_x[:, 1::2] = np.cos(angle), np.sin(angle)
+        # Odwrotna po x z widma połówkowego: część rzeczywista, prążki poza 0 i Nyquistem liczone podwójnie
+        weight = np.full(K, 2.0)
+        weight[0] = 1.0
+        if W % 2 == 0:
+            weight[-1] = 1.0
+        angle = 2 * np.pi * np.outer(np.arange(K), np.arange(out_w)) / W
+        idft_x = np.empty((2 * K, out_w), dtype=np.float32)
+        idft_x[0::2] = weight[:, None] * np.cos(angle) / W
+        idft_x[1::2] = -weight[:, None] * np.sin(angle) / W
+
+        ys, xs = np.arange(out_h), np.arange(out_w)
+        # Pozycje poprawne dla danego szablonu, układ (N, out_h, out_w)
+        inside = (ys[None, :, None] <= (H - hs)[:, None, None]) & (xs[None, None, :] <= (W - ws)[:, None, None])
+        plan.update({
+            'index': index,
+            'out': (out_h, out_w),
+            'spectra': np.ascontiguousarray(spectra, dtype=np.complex64),
+            'dft_x': dft_x,
+            'dft_y': np.exp(-2j * np.pi * np.outer(np.arange(H), np.arange(H)) / H).astype(np.complex64),
+            'idft_y': (np.exp(2j * np.pi * np.outer(ys, np.arange(H)) / H) / H).astype(np.complex64),
+            'idft_x': idft_x,
+            'mask': np.where(inside, 0.0, -np.inf).astype(np.float32),
+            'anchors': _anchors(hs, ws, ANCHOR_GROUPS if len(index) >= ANCHOR_MIN_TEMPLATES else 1),
+            'heights': hs,
+            'widths': ws,
+            'inv_areas': 1.0 / (hs * ws),
+        })
+        return plan
+
+    def scores(self, crops):
+        """
+        Maksymalny wynik TM_CCOEFF_NORMED każdego szablonu dla każdego wycinka: (R, N).
+        Dokładne są wyniki, które mogą być najlepszym albo drugim w wierszu (tylko te czyta
+        classify); pozostałe mogą być zaniżone – pozycje, na których szablon na pewno nie
+        przekroczy drugiego wyniku, nie są liczone.
+        """
+        return score_batches([(self, crops)])[0]
+
+    def classify(self, crops):
+        """Recognition dla każdego wycinka (czas wsadu rozłożony równo na wycinki)."""
+        return classify_batches([(self, crops)])[0]
+
+
+# Układy tablic roboczych dla zestawów wsadów (plany i liczby wycinków), najdawniej użyte usuwane
+MAX_LAYOUTS = 16
+_LAYOUTS = {}
+
+
+def _layout(plans, shapes, dtype):
+    """
+    Tablice robocze dla wsadów o planach plans i rozmiarach shapes [(R, H, W)], alokowane raz –
+    świeże tablice po kilka MB kosztowały więcej niż same obliczenia. Ograniczenia i wyniki
+    wszystkich wsadów leżą w jednej płaskiej tablicy (dla każdej pary wycinek x szablon blok
+    out_h x out_w), wycinki – jeden pod drugim w jednym obrazie całkowym. Układ liczy naraz
+    jeden wątek (grupy classify_regions mają różne plany).
+    """
+    key = tuple((id(plan), R) for plan, (R, _, _) in zip(plans, shapes)) + (np.dtype(dtype).str,)
+    layout = _LAYOUTS.pop(key, None)
+    if layout is None or any(a is not b for a, b in zip(layout['plans'], plans)):
+        layout = _new_layout(plans, shapes, dtype)
+    elif len(_LAYOUTS) >= MAX_LAYOUTS:
+        del _LAYOUTS[next(iter(_LAYOUTS))]
+    _LAYOUTS[key] = layout
+    return layout
+
+
+def _new_layout(plans, shapes, dtype):
+    width = max(W for _, _, W in shapes) + 1
+    most = max(len(plan['index']) for plan in plans)
+    groups, tables = [], {name: [] for name in ('pair_of', 'top_of', 'heights', 'widths', 'inv_areas',
+                                                 'ranked_at', 'second')}
+    row = start = pair = crop = 0
+    for plan, (R, H, W) in zip(plans, shapes):
+        _, N, K = plan['spectra'].shape
+        g = {
+            'shape': (R, H, W), 'row': row, 'crops': slice(crop, crop + R),
+            'order': np.empty((R, N), dtype=np.intp),
+            # Wiersze wycinków przeplecione (H, R, W) – DFT po y całego wsadu jednym mnożeniem
+            'buffers': {'image': ((H, R, W), np.float32), 'rows': ((H * R, 2 * K), np.float32),
+                        'spec': ((H, R, K), np.complex64), 'prod': ((H, N, K), np.complex64)},
+            'anchors': [],
+        }
+        groups.append(g)
+        # Każda grupa kotwicy ma własny blok licznika: pozycje poprawne dla jej najmniejszego szablonu
+        for j0, j1, ah, aw in plan['anchors']:
+            out_h, out_w = H - ah + 1, W - aw + 1
+            n = j1 - j0
+            size = R * n * out_h * out_w
+            r = np.arange(R)[:, None, None, None]
+            j = np.arange(n)[:, None, None]
+            ys, xs = np.arange(out_h)[:, None], np.arange(out_w)
+            dense = (R, n, out_h, out_w)
+            tables['pair_of'].append(np.broadcast_to(pair + r * n + j, dense).ravel())
+            tables['top_of'].append(np.broadcast_to((row + r * H + ys) * width + xs, dense).ravel())
+            tables['heights'].append(np.tile(plan['heights'][j0:j1] * width, R))
+            tables['widths'].append(np.tile(plan['widths'][j0:j1], R))
+            tables['inv_areas'].append(np.tile(plan['inv_areas'][j0:j1], R))
+            tables['ranked_at'].append(((crop + np.arange(R))[:, None] * most + np.arange(j0, j1)).ravel())
+            g['order'][:, j0:j1] = pair + np.arange(R * n).reshape(R, n)
+            g['anchors'].append({
+                'templates': (j0, j1), 'out': (out_h, out_w), 'window': (ah, aw),
+                'dense': slice(start, start + size), 'pairs': slice(pair, pair + R * n),
+                'idft_y': plan['idft_y'][:out_h],
+                'idft_x': plan['idft_x'][:, :out_w],
+                'mask': plan['mask'][j0:j1, :out_h, :out_w],
+                'scale': -1.0 / (ah * aw),
+                'buffers': {'cols': ((out_h, n * K), np.complex64),
+                            'box': ((2, R, out_h, out_w), np.float64), 'var': ((R, out_h, out_w), np.float64),
+                            'limit': ((R, 1, out_h, out_w), np.float32)},
+            })
+            start, pair = start + size, pair + R * n
+        tables['second'].append(np.full(R, most - 2 if N > 1 else most - 1))
+        row, crop = row + R * H, crop + R
+    layout = {name: np.concatenate(parts) for name, parts in tables.items()}
+    layout['pair_of'] = layout['pair_of'].astype(np.int32)
+    layout['top_of'] = layout['top_of'].astype(np.int32)
+    layout['pair_start'] = np.concatenate([np.arange(anchor['dense'].start, anchor['dense'].stop,
+                                                     anchor['out'][0] * anchor['out'][1])
+                                           for g in groups for anchor in g['anchors']])
+    layout.update({
+        'plans': list(plans),
+        'groups': groups,
+        'tall': np.zeros((row, width - 1), dtype=dtype),
+        # Obrazy całkowe sum i sum kwadratów jedną tablicą – jeden odczyt obu na narożnik okna
+        'integral': np.empty((2, row + 1, width)),
+        # Licznik w układzie par (grupa, kotwica, wycinek, szablon): dla każdej pary blok pozycji
+        # jej kotwicy, na niepoprawnych pozycjach -inf
+        'num': np.empty(start, dtype=np.float32),
+        'keep': np.empty(start, dtype=bool),
+        'peaks': np.empty(pair, dtype=np.intp),
+        'ranked': np.full((crop, most), -np.inf),
+        'crop_index': np.arange(crop),
+    })
+    # Tablice pośrednie grup i kotwic liczonych po kolei to widoki wspólnych buforów – mniej pamięci
+    # do przejścia w każdej klatce
+    owners = [owner for g in groups for owner in [g] + g['anchors']]
+    sizes = {}
+    for owner in owners:
+        for name, (shape, buffer_dtype) in owner['buffers'].items():
+            sizes[name] = max(sizes.get(name, (0,))[0], int(np.prod(shape))), buffer_dtype
+    pool = {name: np.empty(size, dtype=buffer_dtype) for name, (size, buffer_dtype) in sizes.items()}
+    for owner in owners:
+        for name, (shape, _) in owner.pop('buffers').items():
+            owner[name] = pool[name][:int(np.prod(shape))].reshape(shape)
+    integral = layout['integral']
+    for g in groups:
+        R, H, W = g['shape']
+        N, K = g['prod'].shape[1:]
+        per_crop = np.lib.stride_tricks.as_strided(integral[:, g['row']:], (2, R, H + 1, width),
+                                                   (integral.strides[0], H * integral.strides[1], integral.strides[1],
+                                                    integral.strides[2]))
+        for anchor in g['anchors']:
+            (j0, j1), (oh, ow), (ah, aw) = anchor['templates'], anchor['out'], anchor['window']
+            dense = (R, j1 - j0, oh, ow)
+            anchor.update({
+                'prod': g['prod'].reshape(H, N * K)[:, j0 * K:j1 * K],
+                'corners': (per_crop[:, :, ah:, aw:W + 1], per_crop[:, :, :oh, aw:W + 1],
+                            per_crop[:, :, ah:, :ow], per_crop[:, :, :oh, :ow]),
+                'num': layout['num'][anchor['dense']].reshape(dense),
+                'keep': layout['keep'][anchor['dense']].reshape(dense),
+            })
+    return layout
+
+
+def score_batches(batches):
+    """
+    BatchClassifier.scores dla kilku wsadów naraz: [(klasyfikator, wycinki (R, H, W))] -> [(R, N)].
+    Licznik liczony jest dla każdego wsadu osobno, dalsze etapy (ograniczenia, progi, dokładne
+    wyniki wybranych pozycji) – jednym przebiegiem dla wszystkich wsadów, więc liczba wywołań
+    numpy nie rośnie z liczbą grup regionów klatki.
+    """
+    batches = [(clf, np.asarray(crops)) for clf, crops in batches]
+    batches = [(clf, crops[None] if crops.ndim == 2 else crops) for clf, crops in batches]
+    outs = [np.full((len(crops), len(clf.labels)), -np.inf) for clf, crops in batches]
+    work = [(out, clf.plan(crops.shape[1:]), crops) for out, (clf, crops) in zip(outs, batches)]
+    work = [(out, plan, crops) for out, plan, crops in work if 'index' in plan]
+    if not work:
+        return outs
+    layout = _layout([plan for _, plan, _ in work], [crops.shape for _, _, crops in work],
+                     np.result_type(*[crops for _, _, crops in work]))
+    tall = layout['tall']
+
+    for g, (_, plan, crops) in zip(layout['groups'], work):
+        R, H, W = crops.shape
+        _, N, K = plan['spectra'].shape
+        # Licznik: korelacja z szablonami o zerowej średniej; DFT jako mnożenia macierzy daje od razu
+        # poprawne pozycje zamiast pełnej odwrotnej FFT każdej pary wycinek x szablon
+        image = g['image']
+        np.copyto(image, crops.transpose(1, 0, 2))
+        rows = np.matmul(image.reshape(H * R, W), plan['dft_x'], out=g['rows'])
+        np.matmul(plan['dft_y'], rows.view(np.complex64).reshape(H, R * K), out=g['spec'].reshape(H, R * K))
+        for r in range(R):
+            # Iloczyn widm po jednym wycinku – mieści się w cache do mnożenia przez odwrotną DFT
+            # (rozgłoszenie w samym mnożeniu omija wektorowaną pętlę numpy – kopia i mnożenie w miejscu szybsze)
+            np.copyto(g['prod'], g['spec'][:, r, None, :])
+            g['prod'] *= plan['spectra']
+            for anchor in g['anchors']:
+                cols = np.matmul(anchor['idft_y'], anchor['prod'], out=anchor['cols'])
+                # Wiersze ułożone po szablonach (widok bez kopii) – odwrotna DFT po x zapisuje licznik
+                # od razu w układzie par, bez osobnego przestawiania
+                by_template = cols.view(np.float32).reshape(len(cols), -1, 2 * K).transpose(1, 0, 2)
+                np.matmul(by_template, anchor['idft_x'], out=anchor['num'][r])
+        for anchor in g['anchors']:
+            anchor['num'] += anchor['mask']
+        tall[g['row']:g['row'] + R * H, :W] = crops.reshape(R * H, W)
+
+    # Obrazy całkowe sum i sum kwadratów (wycinki jeden pod drugim)
+    integral = layout['integral']
+    cv2.integral2(tall, integral[0], integral[1], sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+
+    # Dolne ograniczenie każdej pary: dokładny wynik w maksimum licznika. Najlepszy i drugi
+    # wynik nie są niższe od drugiego z nich, więc niższe pozycje można pominąć
+    peaks = layout['peaks']
+    for g in layout['groups']:
+        for anchor in g['anchors']:
+            num = anchor['num']
+            num.reshape(num.shape[0] * num.shape[1], -1).argmax(axis=1, out=peaks[anchor['pairs']])
+    best = _ncc_at(layout['pair_start'] + peaks, layout, integral)
+    ranked = layout['ranked']
+    ranked.reshape(-1)[layout['ranked_at']] = best
+    threshold = np.sort(ranked, axis=1)[layout['crop_index'], layout['second']]
+    # Zapas na zaokrąglenia licznika liczonego we float32
+    threshold -= 1e-5
+    # Dla ujemnych liczników ograniczenie nie działa – przy progu <= 0 zostają wszystkie poprawne pozycje
+    threshold[threshold <= 0] = -1e30
+
+    # Ograniczenie z góry: okno szablonu zawiera okno kotwicy jego grupy (najmniejsza wysokość
+    # i szerokość) w tej samej pozycji, więc suma kwadratów odchyleń okna szablonu nie jest mniejsza;
+    # zostają pozycje z licznikiem >= próg * odchylenie okna kotwicy. Płaskie okno kotwicy (odchylenie
+    # ~0) zostawia pozycje z dodatnim licznikiem – płaskie okno szablonu daje i tak wynik 0
+    for g in layout['groups']:
+        limits = threshold[g['crops'], None, None]
+        for anchor in g['anchors']:
+            bottom_right, top_right, bottom_left, top_left = anchor['corners']
+            box, var = anchor['box'], anchor['var']
+            np.subtract(bottom_right, top_right, out=box)
+            box -= bottom_left
+            box += top_left
+            np.multiply(box[0], box[0], out=var)
+            var *= anchor['scale']
+            var += box[1]
+            np.maximum(var, 1e-12, out=var)
+            np.multiply(np.sqrt(var, out=var), limits, out=anchor['limit'][:, 0])
+            np.greater_equal(anchor['num'], anchor['limit'], out=anchor['keep'])
+
+    points = np.flatnonzero(layout['keep'])
+    np.maximum.at(best, layout['pair_of'].take(points), _ncc_at(points, layout, integral))
+    for g, (out, plan, _) in zip(layout['groups'], work):
+        out[:, plan['index']] = best[g['order']]
+    return outs
+
+
+def classify_batches(batches):
+    """Recognition dla wycinków kilku wsadów naraz (score_batches); czas rozłożony równo na wycinki."""
+    t0 = time.perf_counter()
+    results = []
+    for (clf, _), scores in zip(batches, score_batches(batches)):
+        recs = []
+        # Dla kilkunastu etykiet wybór najlepszej i drugiej na listach jest tańszy niż kolejne operacje numpy
+        for row in scores.tolist():
+            best = max(row)
+            if best == -np.inf:
+                recs.append(Recognition(None, -1.0, -1.0))
+                continue
+            # index bierze pierwszy z równych wyników – tak jak pętla z porównaniem '>'
+            best_i = row.index(best)
+            row[best_i] = -np.inf
+            second = max(row) if len(row) > 1 else -np.inf
+            recs.append(Recognition(clf.labels[best_i], best, second if second > -np.inf else -1.0))
+        results.append(recs)
+    ms = (time.perf_counter() - t0) * 1000 / max(1, sum(len(recs) for recs in results))
+    for recs in results:
+        for rec in recs:
+            rec.ms = ms
+    return results
+
+
+def _anchors(hs, ws, groups):
+    """
+    Podział szablonów (posortowanych od największego) na kolejne grupy ze wspólną kotwicą:
+    [(j0, j1, wysokość, szerokość)]. Wybierany podział, w którym kotwice pokrywają średnio
+    największą część okien szablonów – ograniczenie z góry jest wtedy najciaśniejsze.
+    """
+    n = len(hs)
+    best, best_cover = None, -1.0
+    for cuts in combinations(range(1, n), min(groups, n) - 1):
+        edges = (0,) + cuts + (n,)
+        cover = sum((hs[j0:j1].min() * ws[j0:j1].min() / (hs[j0:j1] * ws[j0:j1])).sum()
+                    for j0, j1 in zip(edges, edges[1:]))
+        if cover > best_cover:
+            best_cover = cover
+            best = [(j0, j1, int(hs[j0:j1].min()), int(ws[j0:j1].min())) for j0, j1 in zip(edges, edges[1:])]
+    return best
+
+
+def _ncc_at(points, layout, integral):
+    """
+    TM_CCOEFF_NORMED w wybranych punktach płaskiej tablicy ograniczeń układu (para wycinek x
+    szablon i pozycja); integral – wspólne obrazy całkowe wycinków z score_batches.
+    """
+    pairs = layout['pair_of'].take(points)
+    value = layout['num'].take(points)
+    top = layout['top_of'].take(points)
+    bottom = layout['heights'].take(pairs)
+    bottom += top
+    w = layout['widths'].take(pairs)
+    flat = integral.reshape(2, -1)
+    box = flat.take(bottom + w, axis=1)
+    box -= flat.take(bottom, axis=1)
+    box -= flat.take(top + w, axis=1)
+    box += flat.take(top, axis=1)
+    # Suma kwadratów odchyleń jak w OpenCV (templmatch.cpp, common_matchTemplate); poniżej 0.5
+    # okno jest płaskie – wynik 0 zamiast szumu licznika dzielonego przez błąd zaokrąglenia
+    t = box[0] ** 2
+    t *= layout['inv_areas'].take(pairs)
+    np.subtract(box[1], t, out=t)
+    t[t < 0.5] = np.inf
+    res = np.divide(value, np.sqrt(t, out=t), out=t)
+    # |wynik| >= 1 tylko z zaokrągleń: do 1.125 znak, dalej 0 – jak w OpenCV
+    edge = np.abs(res) >= 1
+    if edge.any():
+        res[edge] = np.where(np.abs(res[edge]) < 1.125, np.sign(res[edge]), 0.0)
+    return res
+
+
+_CLASSIFIERS = {}
+# Silnik per zestaw szablonów: 'template' (BatchClassifier), 'nn' (nn_classifier.NNClassifier
+# z BatchClassifier jako fallback) albo 'colour' (suit_colour.ColourSuitClassifier – tylko zestawy
+# kolorów, potrzebuje klatki BGR, bez niej 'template' – jak jego fallback); domyślnie z grupy 'engines' w layout.json
+ENGINES = ('template', 'nn', 'colour')
+_DEFAULT_ENGINES = None
+
+
+def default_engines():
+    """{zestaw: silnik} z layout.json (wczytywane raz); zestawy spoza grupy – 'template'."""
+    global _DEFAULT_ENGINES
+    if _DEFAULT_ENGINES is None:
+        from layout import get_layout
+        _DEFAULT_ENGINES = get_layout().engines()
+    return _DEFAULT_ENGINES
+
+
+def get_classifier(set_name, bank=None, engine='template'):
+    """Klasyfikator dla zestawu z banku szablonów i silnika (tworzony raz na proces)."""
+    if engine not in ENGINES:
+        raise ValueError(f"Nieznany silnik rozpoznawania: {engine!r} (dostępne: {', '.join(ENGINES)})")
+    bank = bank or get_bank()
+    key = (id(bank), set_name, engine)
+    clf = _CLASSIFIERS.get(key)
+    if clf is None:
+        if engine == 'nn':
+            from nn_classifier import get_nn_classifier
+            clf = get_nn_classifier(set_name, bank, fallback=get_classifier(set_name, bank))
+        elif engine == 'colour':
+            from suit_colour import ColourSuitClassifier
+            clf = ColourSuitClassifier(bank[set_name], fallback=get_classifier(set_name, bank))
+        else:
+            clf = BatchClassifier(bank[set_name])
+        _CLASSIFIERS[key] = clf
+    return clf
+
+
+def classify_regions(gray, jobs, bank=None, cache=None, pool=None, engines=None, bgr=None):
+    """
+    Rozpoznaje wszystkie regiony klatki naraz.
+    jobs: {nazwa: ((x, y, w, h), zestaw)} -> {nazwa: Recognition}
+    (rozpakowuje się jak dawne (etykieta, wynik, margines)).
+    Regiony z tym samym zestawem i rozmiarem tworzą jeden wsad, wszystkie wsady silnika 'template'
+    idą jednym wywołaniem classify_batches.
+    cache: RecognitionCache – wycinki o znanym odcisku nie są w ogóle dopasowywane.
+    pool: Executor – grupy pozostałych silników liczone równolegle (numpy i OpenCV zwalniają GIL).
+    Przetwarzanie banku (bank.preprocess) idzie raz na wszystkie wycinki klatki.
+    engines: {zestaw: 'template' | 'nn' | 'colour'} (domyślnie default_engines()).
+    bgr: ta sama klatka w BGR(A) – dla silnika 'colour' (bez niej zestawy 'colour' idą przez 'template').
+    """
+    bank = bank or get_bank()
+    engines = default_engines() if engines is None else engines
+    if bgr is None and 'colour' in engines.values():
+        engines = {name: 'template' if engine == 'colour' else engine for name, engine in engines.items()}
+    results = {}
+    pending = []
+    for name, ((x, y, w, h), set_name) in jobs.items():
+        crop = gray[y:y+h, x:x+w]
+        key = None
+        if cache is not None:
+            # Odcisk z surowego wycinka; silnik i przetwarzanie banku w nazwie zestawu klucza – jeden
+            # cache dla banków 'otsu', 'equalize' itd. (odcisk banku w .npz to tylko pliki szablonów)
+            engine = engines.get(set_name, 'template')
+            tag = set_name if engine == 'template' else f'{set_name}@{engine}'
+            if bank.preprocess.spec:
+                tag = f'{tag}#{bank.preprocess.spec}'
+            key = cache.key(tag, crop)
+            hit = cache.get(key)
+            if hit is not None:
+                results[name] = hit
+                continue
+        pending.append((name, set_name, crop, key))
+
+    groups = {}
+    crops = bank.preprocess.apply_many([crop for _, _, crop, _ in pending])
+    for (name, set_name, _, key), crop in zip(pending, crops):
+        groups.setdefault((set_name, crop.shape), []).append((name, crop, key))
+
+    def run(group):
+        (set_name, _), items = group
+        engine = engines.get(set_name, 'template')
+        clf = get_classifier(set_name, bank, engine)
+        batch = np.stack([crop for _, crop, _ in items])
+        if engine == 'colour':
+            rects = [jobs[name][0] for name, _, _ in items]
+            return items, clf.classify(batch, [bgr[y:y+h, x:x+w] for x, y, w, h in rects])
+        return items, clf.classify(batch)
+
+    # Grupy silnika 'template' jednym wywołaniem – dalsze etapy dopasowania wspólne dla całej klatki
+    plain = [group for group in groups.items() if engines.get(group[0][0], 'template') == 'template']
+    batches = []
+    if plain:
+        recs = classify_batches([(get_classifier(set_name, bank), np.stack([crop for _, crop, _ in items]))
+                                 for (set_name, _), items in plain])
+        batches = [(items, batch) for (_, items), batch in zip(plain, recs)]
+    rest = [group for group in groups.items() if engines.get(group[0][0], 'template') != 'template']
+    batches += pool.map(run, rest) if pool is not None and len(rest) > 1 else map(run, rest)
+    for items, batch in batches:
+        for (name, _, key), res in zip(items, batch):
+            results[name] = res
+            if cache is not None:
+                cache.put(key, res)
+    return results
+
+
+if __name__ == '__main__':
+    # Porównanie z pętlą matchTemplate na archiwum shots/: etykiety i czas na klatkę
+    import os
+    import time
+    from glob import glob
+    from bot3 import REGIONS
+
+    TARGET_SPEEDUP = 5
+    # Najlepszy z REPEAT przebiegów, pętla i wsad na przemian – pojedynczy przebieg na współdzielonej
+    # maszynie waha się o kilkanaście procent
+    REPEAT = 5
+
+    def loop_match(crop, templates):
+        best_key, best_val = None, -1.0
+        for key, tpl in templates.items():
+            if tpl.shape[0] > crop.shape[0] or tpl.shape[1] > crop.shape[1]:
+                continue
+            _, max_val, _, _ = cv2.minMaxLoc(cv2.matchTemplate(crop, tpl, cv2.TM_CCOEFF_NORMED))
+            if max_val > best_val:
+                best_key, best_val = key, max_val
+        return best_key
+
+    bank = get_bank()
+    jobs = {}
+    for name, cfg in REGIONS.items():
+        jobs[name + '-rank'] = (cfg['r'], cfg['rank_dir'])
+        jobs[name + '-suit'] = (cfg['s'], cfg['suit_dir'])
+    base = os.path.dirname(os.path.abspath(__file__))
+    frames = [cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in sorted(glob(os.path.join(base, 'shots', '*.png')))]
+    classify_regions(frames[0], jobs, bank, engines={})
+
+    t_loop = t_batch = float('inf')
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        expected = [{name: loop_match(g[y:y+h, x:x+w], bank[s]) for name, ((x, y, w, h), s) in jobs.items()}
+                    for g in frames]
+        t_loop = min(t_loop, time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        got = [classify_regions(g, jobs, bank, engines={}) for g in frames]
+        t_batch = min(t_batch, time.perf_counter() - t0)
+
+    diff = sum(exp[name] != res[name].label for exp, res in zip(expected, got) for name in jobs)
+    n = len(frames)
+    print(f"Klatek: {n}, różnice etykiet: {diff}")
+    # Kryterium wsadu: co najmniej TARGET_SPEEDUP razy szybciej niż pętla
+    speedup = t_loop / t_batch
+    print(f"Pętla: {t_loop / n * 1000:.1f} ms/klatkę, wsad: {t_batch / n * 1000:.1f} ms/klatkę "
+          f"({speedup:.1f}x, cel {TARGET_SPEEDUP:g}x {'spełniony' if speedup >= TARGET_SPEEDUP else 'NIESPEŁNIONY'})")
@@ -0,0 +1,116 @@
+import time
+import cv2
+import numpy as np
+
+from recognition import Recognition
+
+# Parametry przeszukiwania zgrubnego (piramida 2x)
+COARSE_FACTOR = 0.5
+COARSE_SCALE_STEP = 0.1
+TOP_K = 3
+EARLY_EXIT_MARGIN = 0.2
+
+
+def rotate(img, angle):
+    """Obrót wycinka wokół środka – tak samo jak w match_with_rotation z bot1/bot2."""
+    h_img, w_img = img.shape[:2]
+    M = cv2.getRotationMatrix2D((w_img/2, h_img/2), angle, 1.0)
+    return cv2.warpAffine(img, M, (w_img, h_img), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+
+def score_scale(img, tpl, scale, factor=1.0, full_shape=None, stats=None):
+    """
+    Jedno wywołanie matchTemplate dla szablonu przeskalowanego o scale (oraz factor piramidy).
+    Odrzuca te same skale co multi_scale_template_match – liczone dla pełnej rozdzielczości.
+    """
+    h_full, w_full = full_shape if full_shape is not None else img.shape[:2]
+    h_tpl_orig, w_tpl_orig = tpl.shape[:2]
+    h_tpl = int(h_tpl_orig * scale)
+    w_tpl = int(w_tpl_orig * scale)
+    if h_tpl < 5 or w_tpl < 5 or h_tpl > h_full or w_tpl > w_full:
+        return -1
+    h_tpl = min(max(int(h_tpl_orig * scale * factor), 3), img.shape[0])
+    w_tpl = min(max(int(w_tpl_orig * scale * factor), 3), img.shape[1])
+    tpl_resized = cv2.resize(tpl, (w_tpl, h_tpl), interpolation=cv2.INTER_AREA)
+    res = cv2.matchTemplate(img, tpl_resized, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, _ = cv2.minMaxLoc(res)
+    if stats is not None:
+        stats['calls'] = stats.get('calls', 0) + 1
+    return max_val
+
+
+def coarse_to_fine_match(img, templates, angles=(0,), scale_range=(0.5, 1.5), steps=20,
+                         top_k=TOP_K, early_exit_margin=EARLY_EXIT_MARGIN, stats=None):
+    """
+    Zwraca Recognition (najlepszy szablon, skala, kąt, wynik drugiego szablonu) jak
+    match_with_rotation / match_template z bot1/bot2, ale zamiast pełnej siatki kąt x skala x szablon:
+      1. rzadka siatka (co drugi kąt, skale co ~0.1) na obrazie zmniejszonym 2x,
+      2. doprecyzowanie w pełnej rozdzielczości tylko wokół najlepszego punktu top_k szablonów,
+    z wcześniejszym wyjściem, gdy przewaga najlepszego szablonu przekracza early_exit_margin.
+    """
+    t0 = time.perf_counter()
+    angles = list(angles)
+    scales = np.linspace(scale_range[0], scale_range[1], steps)
+    # Odstęp skal w siatce zgrubnej ~COARSE_SCALE_STEP (dla 20 kroków: co druga skala)
+    step = (scale_range[1] - scale_range[0]) / max(1, steps - 1)
+    stride = max(1, int(round(COARSE_SCALE_STEP / step))) if step > 0 else 1
+    coarse_scale_idx = list(range(stride // 2, steps, stride))
+    # Co drugi kąt – sąsiedzi (±1) w etapie dokładnym pokrywają całą listę
+    coarse_angle_idx = list(range(1, len(angles), 2)) or [0]
+
+    full_shape = img.shape[:2]
+    rotated = {}
+
+    def rotated_img(ai):
+        if ai not in rotated:
+            rotated[ai] = img if angles[ai] == 0 else rotate(img, angles[ai])
+        return rotated[ai]
+
+    small_imgs = {}
+
+    def small_img(ai):
+        if ai not in small_imgs:
+            small_imgs[ai] = cv2.resize(rotated_img(ai), None, fx=COARSE_FACTOR, fy=COARSE_FACTOR,
+                                        interpolation=cv2.INTER_AREA)
+        return small_imgs[ai]
+
+    def coarse_score(key, ai, si):
+        val = score_scale(small_img(ai), templates[key], scales[si], COARSE_FACTOR, full_shape, stats)
+        if val > coarse.get(key, (-1,))[0]:
+            coarse[key] = (val, ai, si)
+
+    # 1. Etap zgrubny na obrazie zmniejszonym
+    coarse = {}
+    for ai in coarse_angle_idx:
+        for key in templates:
+            for si in coarse_scale_idx:
+                coarse_score(key, ai, si)
+    if not coarse:
+        return Recognition(ms=(time.perf_counter() - t0) * 1000)
+
+    ranked = sorted(coarse.items(), key=lambda kv: kv[1][0], reverse=True)
+    # Po wczesnym wyjściu drugi szablon ma tylko wynik zgrubny
+    scores = {}
+    if len(ranked) > 1 and ranked[0][1][0] - ranked[1][1][0] > early_exit_margin:
+        key, (val, ai, si) = ranked[1]
+        runner_up = {key: (val, float(scales[si]), angles[ai])}
+        ranked = ranked[:1]
+        if stats is not None:
+            stats['early_exit'] = stats.get('early_exit', 0) + 1
+    else:
+        runner_up = {}
+        ranked = ranked[:top_k]
+
+    # 2. Doprecyzowanie w pełnej rozdzielczości wokół najlepszego punktu siatki
+    half_a = 1 if len(angles) > 1 else 0
+    half_s = max(1, stride // 2)
+    for key, (_, ai0, si0) in ranked:
+        tpl = templates[key]
+        for ai in range(max(0, ai0 - half_a), min(len(angles), ai0 + half_a + 1)):
+            rot = rotated_img(ai)
+            for si in range(max(0, si0 - half_s), min(steps, si0 + half_s + 1)):
+                val = score_scale(rot, tpl, scales[si], stats=stats)
+                if val > scores.get(key, (-1,))[0]:
+                    scores[key] = (val, float(scales[si]), angles[ai])
+    scores.update(runner_up)
+    return Recognition.from_scores(scores, t0)
@@ -0,0 +1,155 @@
+import time
+
+from change_detector import ChangeDetector, MAX_DIFF
+
+WAITING, DEALING, STABLE, DECIDED, CLICKED = 'waiting', 'dealing', 'stable', 'decided', 'clicked'
+# Ile kolejnych klatek bez zmiany żadnego regionu oznacza, że karty już leżą
+STABLE_FRAMES = 1
+
+
+class DealStateMachine:
+    """
+    Stan stołu prowadzony tanim detektorem zmian (miniatury regionów) w każdej klatce:
+
+      waiting -> dealing   któryś region różni się od stołu z ostatniego odczytu
+      dealing -> stable    przez stable_frames klatek żaden region się nie zmienił
+      stable  -> decided   read(gray) -> rozdanie, decide(rozdanie) -> decyzja
+      decided -> clicked   act(decyzja), potem znowu waiting
+
+    Odczyt (drogie rozpoznanie) jest tylko w stanie stable, czyli w pierwszej klatce
+    po ostatniej zmianie. Stół nieczytelny (read -> None albo decide -> None, np. ta sama
+    karta odczytana dwa razy) i stół po kliknięciu stają się punktem odniesienia dla
+    waiting. Przed podwójnym kliknięciem chroni key(rozdanie): to samo rozdanie co
+    ostatnio kliknięte (np. podświetlenie wybranej ręki, dokładane karty stołu) nie jest
+    decydowane drugi raz.
+
+    regions: {nazwa: (x, y, w, h)} we współrzędnych klatki podawanej do feed.
+    """
+
+    def __init__(self, regions, read, decide, act=None, key=None,
+                 stable_frames=STABLE_FRAMES, max_diff=MAX_DIFF):
+        self.regions = dict(regions)
+        self.read = read
+        self.decide = decide
+        self.act = act
+        self.key = key or (lambda deal: deal)
+        self.stable_frames = stable_frames
+        # Ruch: odcisk z ostatniej zmiany; odniesienie: stół z ostatniego odczytu
+        self.motion = ChangeDetector(max_diff=max_diff)
+        self.baseline = ChangeDetector(max_diff=max_diff)
+        self.state = WAITING
+        self.quiet = 0
+        self.frames = 0
+        self.last_motion = None
+        self.last_key = None
+        self.decision = None
+        self.history = []
+        self.clicks = []
+        self.reads = 0
+        self.unreadable = 0
+        self.duplicates = 0
+
+    def _set(self, state, t):
+        self.state = state
+        self.history.append((self.frames, t, state))
+
+    def feed(self, gray, t=None):
+        """Jedna klatka; zwraca decyzję, jeśli w tej klatce była nowa (kliknięcie), inaczej None."""
+        t = time.perf_counter() if t is None else t
+        self.frames += 1
+        moved = new = False
+        for name, (x, y, w, h) in self.regions.items():
+            crop = gray[y:y+h, x:x+w]
+            moved |= self.motion.changed(name, crop)
+            if self.state == WAITING and not new:
+                new = self.baseline.changed(name, crop, update=False)
+        if moved:
+            self.quiet = 0
+            self.last_motion = (self.frames, t)
+        else:
+            self.quiet += 1
+
+        if self.state == WAITING and new:
+            self._set(DEALING, t)
+        if self.state != DEALING or self.quiet < self.stable_frames:
+            return None
+
+        self._set(STABLE, t)
+        for name, (x, y, w, h) in self.regions.items():
+            self.baseline.remember(name, gray[y:y+h, x:x+w])
+        self.reads += 1
+        deal = self.read(gray)
+        if deal is None:
+            self.unreadable += 1
+            self._set(WAITING, t)
+            return None
+        key = self.key(deal)
+        if key == self.last_key:
+            self.duplicates += 1
+            self._set(WAITING, t)
+            return None
+
+        decision = self.decide(deal)
+        if decision is None:
+            self.unreadable += 1
+            self._set(WAITING, t)
+            return None
+        self.decision = decision
+        self._set(DECIDED, t)
+        if self.act is not None:
+            self.act(self.decision)
+        self.last_key = key
+        self._set(CLICKED, t)
+        # Opóźnienie liczone od klatki z ostatnią zmianą regionów
+        self.clicks.append({'frame': self.frames, 't': t, 'deal': deal, 'decision': self.decision,
+                            'frames_after_motion': self.frames - self.last_motion[0],
+                            'latency_s': t - self.last_motion[1]})
+        self._set(WAITING, t)
+        return self.decision
+
+
+if __name__ == '__main__':
+    # Odtworzenie shots/ w czasie zrzutów przy różnej częstotliwości przechwytywania:
+    # kliknięcia względem rozdań z ground_truth.json, powtórzenia i opóźnienie
+    import json
+    from frame_source import TimedFileFrameSource
+    from layout import get_layout, card_regions, LAYOUT_PATH
+    from bot3 import recognize_gray, evaluate_choice
+    import os
+
+    SLOTS = ['f1', 'f2', 'f3', 'f4', 'f5', 'h1-1', 'h1-2', 'h2-1', 'h2-2']
+    HANDS = SLOTS[5:]
+    with open(os.path.join(os.path.dirname(LAYOUT_PATH), 'ground_truth.json'), encoding='utf-8') as f:
+        truth = json.load(f)['frames']
+    expected = []
+    for path, labels in truth.items():
+        if path.startswith('shots/') and labels and all(labels[s] for s in HANDS):
+            hands = tuple(labels[s] for s in HANDS)
+            if hands not in expected:
+                expected.append(hands)
+
+    regions = get_layout().regions()
+    for fps in (2, 5, 10, 30):
+        source = TimedFileFrameSource({name: rect for name, (rect, _) in regions.items()}, fps=fps)
+        local = {name: source.local(rect) for name, (rect, _) in regions.items()}
+        cards = card_regions({name: (local[name], set_name) for name, (_, set_name) in regions.items()})
+
+        def read(gray):
+            rec = recognize_gray(gray, regions=cards)
+            if not all(rec[s] for s in HANDS):
+                return None
+            return tuple(rec[s] and rec[s].lower() for s in SLOTS)
+
+        machine = DealStateMachine(local, read, lambda deal: evaluate_choice(dict(zip(SLOTS, deal))),
+                                   key=lambda deal: deal[5:])
+        t0 = time.perf_counter()
+        while source.grab():
+            machine.feed(source.gray_frame(), source.t)
+        dt = time.perf_counter() - t0
+        clicked = [c['deal'][5:] for c in machine.clicks]
+        hit = sum(hands in clicked for hands in expected)
+        after = sorted({c['frames_after_motion'] for c in machine.clicks})
+        print(f"{fps:3d} kl/s: klatek {machine.frames}, odczytów {machine.reads}, kliknięć {len(clicked)} "
+              f"(rozdania {hit}/{len(expected)}, powtórzenia zablokowane {machine.duplicates}, "
+              f"nieczytelne {machine.unreadable}), klatek po ostatniej zmianie {after}, "
+              f"{dt / machine.frames * 1000:.2f} ms/klatkę")
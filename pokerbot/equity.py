@@ -0,0 +1,136 @@
+import time
+from itertools import combinations
+from math import comb
+import numpy as np
+
+from hand_eval import card, get_evaluator
+
+# Pełne przeliczenie, gdy dokładań stołu jest nie więcej niż tyle (3 brakujące karty: 15 180)
+EXHAUSTIVE_MAX = 20000
+# Budżet czasu Monte Carlo – mieści się w jednej klatce pętli (~30 ms)
+BUDGET_MS = 20.0
+BATCH = 4096
+MIN_SAMPLES = 2000
+
+_RUNOUTS = {}
+
+
+class EquityResult:
+    """Szanse dwóch rąk: win1 + win2 + tie = 1; samples = liczba rozegranych dokładań."""
+
+    def __init__(self, wins1, wins2, ties, samples, exact, elapsed_ms):
+        self.samples = samples
+        self.win1 = wins1 / samples
+        self.win2 = wins2 / samples
+        self.tie = ties / samples
+        self.exact = exact
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def equity1(self):
+        return self.win1 + self.tie / 2
+
+    @property
+    def equity2(self):
+        return self.win2 + self.tie / 2
+
+    @property
+    def stderr(self):
+        """Błąd standardowy różnicy equity (0 dla pełnego przeliczenia)."""
+        if self.exact:
+            return 0.0
+        var = self.win1 + self.win2 - (self.win1 - self.win2) ** 2
+        return float(np.sqrt(max(var, 0.0) / self.samples))
+
+    def choice(self):
+        if self.equity1 > self.equity2:
+            return 'hand1'
+        if self.equity2 > self.equity1:
+            return 'hand2'
+        return 'tie'
+
+    def __repr__(self):
+        kind = 'dokładnie' if self.exact else f'MC ±{self.stderr:.3f}'
+        return (f"EquityResult(hand1={self.win1:.3f}, hand2={self.win2:.3f}, tie={self.tie:.3f}, "
+                f"{self.samples} dokładań, {kind}, {self.elapsed_ms:.1f} ms)")
+
+
+def runout_indices(deck_size, missing):
+    """Wszystkie dokładania (indeksy w talii) – liczone raz na rozmiar."""
+    key = (deck_size, missing)
+    idx = _RUNOUTS.get(key)
+    if idx is None:
+        combos = list(combinations(range(deck_size), missing))
+        idx = _RUNOUTS[key] = np.array(combos, dtype=np.int8).reshape(len(combos), missing)
+    return idx
+
+
+def sample_runouts(rng, deck_size, missing, n):
+    """n losowych dokładań bez powtórzeń: losowanie z odrzuceniem wierszy z duplikatami."""
+    out = np.empty((0, missing), dtype=np.int64)
+    while len(out) < n:
+        draw = rng.integers(0, deck_size, size=(n + n // 4, missing))
+        s = np.sort(draw, axis=1)
+        ok = (np.diff(s, axis=1) != 0).all(axis=1)
+        out = np.concatenate([out, draw[ok]])
+    return out[:n]
+
+
+def _score(evaluator, hand1, hand2, board, deck, runouts):
+    n = len(runouts)
+    full_board = np.empty((n, 5), dtype=np.int64)
+    full_board[:, :len(board)] = board
+    full_board[:, len(board):] = deck[runouts]
+    s1 = evaluator.evaluate_batch(np.hstack([np.broadcast_to(hand1, (n, 2)), full_board]))
+    s2 = evaluator.evaluate_batch(np.hstack([np.broadcast_to(hand2, (n, 2)), full_board]))
+    return int((s1 > s2).sum()), int((s2 > s1).sum()), int((s1 == s2).sum())
+
+
+def equity(board, hand1, hand2, budget_ms=BUDGET_MS, exhaustive_max=EXHAUSTIVE_MAX, rng=None):
+    """
+    Szanse hand1 i hand2 przy 0-5 znanych kartach stołu (etykiety 'ah' / ('a', 'h') lub 0..51).
+    Brakujące karty: pełne przeliczenie, gdy dokładań jest <= exhaustive_max,
+    w przeciwnym razie Monte Carlo w paczkach do wyczerpania budżetu czasu.
+    """
+    t0 = time.perf_counter()
+    evaluator = get_evaluator()
+    board = np.array([c if isinstance(c, (int, np.integer)) else card(c) for c in board], dtype=np.int64)
+    hand1 = np.array([c if isinstance(c, (int, np.integer)) else card(c) for c in hand1], dtype=np.int64)
+    hand2 = np.array([c if isinstance(c, (int, np.integer)) else card(c) for c in hand2], dtype=np.int64)
+    known = np.concatenate([board, hand1, hand2])
+    if len(board) > 5 or len(hand1) != 2 or len(hand2) != 2:
+        raise ValueError(f"Oczekiwano 0-5 kart stołu i po 2 karty w ręce: {len(board)}, {len(hand1)}, {len(hand2)}")
+    if len(set(known.tolist())) != len(known):
+        raise ValueError("Ta sama karta występuje dwa razy")
+
+    deck = np.setdiff1d(np.arange(52), known)
+    missing = 5 - len(board)
+    if comb(len(deck), missing) <= exhaustive_max:
+        runouts = runout_indices(len(deck), missing)
+        w1, w2, ties = _score(evaluator, hand1, hand2, board, deck, runouts)
+        return EquityResult(w1, w2, ties, len(runouts), True, (time.perf_counter() - t0) * 1000)
+
+    rng = rng or np.random.default_rng()
+    w1 = w2 = ties = n = 0
+    deadline = t0 + budget_ms / 1000
+    while n < MIN_SAMPLES or time.perf_counter() < deadline:
+        a, b, c = _score(evaluator, hand1, hand2, board, deck, sample_runouts(rng, len(deck), missing, BATCH))
+        w1, w2, ties, n = w1 + a, w2 + b, ties + c, n + BATCH
+    return EquityResult(w1, w2, ties, n, False, (time.perf_counter() - t0) * 1000)
+
+
+def decide(board, hand1, hand2, **kwargs):
+    """Wybór ręki z wyższym equity: ('hand1' | 'hand2' | 'tie', EquityResult)."""
+    res = equity(board, hand1, hand2, **kwargs)
+    return res.choice(), res
+
+
+if __name__ == '__main__':
+    # Czas i wynik dla 0..5 znanych kart stołu (blitz.png: stół Ks Kh 2h Kc Th, ręce 3h7h / Qh3c)
+    board = ['ks', 'kh', '2h', 'kc', 'th']
+    hand1, hand2 = ['3h', '7h'], ['qh', '3c']
+    get_evaluator()
+    for known in range(6):
+        equity(board[:known], hand1, hand2)
+        res = equity(board[:known], hand1, hand2)
+        print(f"{known} kart stołu: {res} -> {res.choice()}")
@@ -0,0 +1,376 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from glob import glob
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR = os.path.join(BASE_DIR, 'logs')
+LOG_NAME = 'events'
+# Plik bieżący przechodzi w events-<czas>.ndjson po przekroczeniu MAX_BYTES; starsze ponad MAX_FILES są usuwane
+MAX_BYTES = 16 * 1024 * 1024
+MAX_FILES = 50
+# Kolejka do wątku zapisu; pełna = rekord porzucony i policzony, pętla na żywo nigdy nie czeka
+QUEUE_SIZE = 10000
+# Zapis na dysk paczkami: co najwyżej co FLUSH_INTERVAL s albo po BATCH rekordach
+FLUSH_INTERVAL = 1.0
+BATCH = 512
+# Klucze pomijane przy porównaniu kolejnych stanów (zmieniają się w każdej klatce)
+VOLATILE = ('t', 'ms')
+
+_STOP = object()
+
+
+def regions_record(matches):
+    """{nazwa: Recognition} -> {nazwa: [etykieta albo None (odrzucona), wynik]} do pola 'r'."""
+    return {name: [rec.label if rec.ok else None, round(rec.score, 3)] for name, rec in matches.items()}
+
+
+def signature(rec):
+    """Stan rekordu bez czasu, opóźnień i wyników dopasowania – równe sygnatury to ten sam stan stołu."""
+    state = {k: v for k, v in rec.items() if k not in VOLATILE}
+    if 'r' in state:
+        state['r'] = {name: v[0] for name, v in state['r'].items()}
+    return json.dumps(state, sort_keys=True, default=str)
+
+
+class EventLog:
+    """
+    Dziennik zdarzeń NDJSON (jeden obiekt JSON w wierszu) zapisywany przez wątek w tle.
+
+    event(kind, ...) tylko wkłada słownik do kolejki (put_nowait) – serializacja, porównanie
+    z poprzednim stanem, zapis i rotacja są w wątku zapisu. Rekord:
+      t   – czas unix (s, do ms)         k  – rodzaj ('decision', 'unreadable', 'window', ...)
+      tab – stół / okno                  r  – {region: [etykieta, wynik]}
+      h   – ręce                         d  – decyzja
+      ms  – {etap: opóźnienie w ms}      pozostałe pola jak podane w event(..., **extra)
+    Kolejne rekordy o tej samej sygnaturze (bez t, ms i wyników) nie są zapisywane; przed
+    następnym innym rekordem idzie {"k": "repeat", "n": ile, "t": czas ostatniego, "ms": średnie}.
+    """
+
+    def __init__(self, path=None, max_bytes=MAX_BYTES, max_files=MAX_FILES, queue_size=QUEUE_SIZE,
+                 dedupe=True, flush_interval=FLUSH_INTERVAL):
+        self.path = path or os.path.join(LOG_DIR, LOG_NAME + '.ndjson')
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.dedupe = dedupe
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(queue_size)
+        self.logged = self.dropped = self.written = self.repeated = self.rotations = 0
+        self.error = None
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+        self._thread = threading.Thread(target=self._run, name='event-log', daemon=True)
+        self._thread.start()
+
+    def event(self, kind, table=None, regions=None, hands=None, decision=None, stages=None, **extra):
+        """Zdarzenie do zapisu; False, gdy kolejka pełna (rekord porzucony). Nie blokuje."""
+        rec = {'t': round(time.time(), 3), 'k': kind}
+        if table is not None:
+            rec['tab'] = table
+        if regions is not None:
+            rec['r'] = regions
+        if hands is not None:
+            rec['h'] = hands
+        if decision is not None:
+            rec['d'] = decision
+        if stages is not None:
+            rec['ms'] = {k: round(v, 3) for k, v in stages.items()}
+        rec.update(extra)
+        try:
+            self.queue.put_nowait(rec)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.logged += 1
+        return True
+
+    def close(self):
+        """Zapisuje zaległe rekordy i zamyka plik (czeka na wątek zapisu)."""
+        if self._thread.is_alive():
+            self.queue.put(_STOP)
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        return {'logged': self.logged, 'written': self.written, 'repeated': self.repeated,
+                'dropped': self.dropped, 'rotations': self.rotations, 'bytes': self._size}
+
+    def _rotate(self):
+        self._file.close()
+        root, ext = os.path.splitext(self.path)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        target = f'{root}-{stamp}{ext}'
+        n = 1
+        while os.path.exists(target):
+            target = f'{root}-{stamp}-{n}{ext}'
+            n += 1
+        os.replace(self.path, target)
+        old = rotated_files(self.path)
+        for path in old[:max(0, len(old) - self.max_files)]:
+            os.remove(path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = 0
+        self.rotations += 1
+
+    def _write(self, lines):
+        data = ''.join(lines)
+        if self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+        self.written += len(lines)
+
+    def _run(self):
+        last_sig, repeats, last_t = None, 0, None
+        stage_sums = {}
+        lines = []
+        deadline = time.monotonic() + self.flush_interval
+        stop = False
+        while not stop:
+            try:
+                rec = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                rec = None
+            stop = rec is _STOP
+            if rec is not None and not stop:
+                sig = signature(rec) if self.dedupe else None
+                if sig is not None and sig == last_sig:
+                    repeats += 1
+                    last_t = rec['t']
+                    for stage, ms in rec.get('ms', {}).items():
+                        stage_sums[stage] = stage_sums.get(stage, 0.0) + ms
+                    self.repeated += 1
+                    continue
+                if repeats:
+                    lines.append(_repeat(last_t, repeats, stage_sums))
+                last_sig, repeats, stage_sums = sig, 0, {}
+                lines.append(_dumps(rec))
+            if stop and repeats:
+                lines.append(_repeat(last_t, repeats, stage_sums))
+            if lines and (stop or len(lines) >= BATCH or time.monotonic() >= deadline):
+                try:
+                    self._write(lines)
+                except OSError as e:
+                    # Błąd dysku nie zatrzymuje bota – rekordy paczki są tracone
+                    self.error = e
+                    self.dropped += len(lines)
+                lines = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+        self._file.close()
+
+
+def _dumps(rec):
+    return json.dumps(rec, separators=(',', ':'), default=str) + '\n'
+
+
+def _repeat(t, n, stage_sums):
+    """Rekord powtórzeń: ile, czas ostatniego i średnie opóźnienia etapów pominiętych rekordów."""
+    rec = {'t': t, 'k': 'repeat', 'n': n}
+    if stage_sums:
+        rec['ms'] = {stage: round(total / n, 3) for stage, total in stage_sums.items()}
+    return _dumps(rec)
+
+
+def rotated_files(path):
+    """Pliki po rotacji dla ścieżki bieżącego pliku, od najstarszego (mtime = ostatni zapis do pliku)."""
+    root, ext = os.path.splitext(path)
+    return sorted(glob(f'{root}-*{ext}'), key=os.path.getmtime)
+
+
+def log_files(inputs):
+    """Pliki .ndjson z katalogów (od najstarszego zapisu – rotowane przed bieżącym) i ścieżki podane wprost."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths += sorted(glob(os.path.join(item, '*.ndjson')), key=os.path.getmtime)
+        else:
+            paths.append(item)
+    return paths
+
+
+def iter_records(paths, kinds=None, since=None, until=None):
+    """
+    Rekordy z plików NDJSON po kolei (strumieniowo, bez wczytywania całych plików).
+    kinds: wiersze innych rodzajów odrzucane po tekście, przed json.loads. Rekord 'repeat'
+    przechodzi tylko za rekordem, który przeszedł filtry (dotyczy tego samego stanu).
+    """
+    needles = [f'"k":"{k}"' for k in kinds] if kinds else None
+    keep = False
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                repeat = '"k":"repeat"' in line
+                if repeat and not keep:
+                    continue
+                if not repeat and needles and not any(n in line for n in needles):
+                    keep = False
+                    continue
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # Ucięty ostatni wiersz po awarii
+                    continue
+                t = rec.get('t', 0)
+                if (since is not None and t < since) or (until is not None and t > until):
+                    keep = False
+                    continue
+                keep = True
+                yield rec
+
+
+def weighted_percentiles(values, weights, percentiles=(50, 90, 99)):
+    """Percentyle wartości z wagami (rekord 'repeat' = n kopii średniej) bez rozwijania kopii."""
+    order = np.argsort(values)
+    values, cum = values[order], np.cumsum(weights[order])
+    return {f'p{p}': round(float(values[np.searchsorted(cum, p / 100 * cum[-1])]), 3) for p in percentiles}
+
+
+def summarize(records):
+    """
+    Statystyki strumienia rekordów: liczba zdarzeń per rodzaj, decyzje, odsetek odrzuceń
+    per region i percentyle opóźnień per etap. Rekord 'repeat' liczy się jak n kopii
+    poprzedniego rekordu z opóźnieniami równymi zapisanym średnim.
+    """
+    kinds, decisions, rejected, seen = {}, {}, {}, {}
+    stages = {}
+    first = last = None
+    prev = None
+    for rec in records:
+        t = rec.get('t')
+        first = t if first is None else first
+        last = t
+        if rec.get('k') == 'repeat':
+            if prev is None:
+                continue
+            n, state = rec['n'], prev
+        else:
+            n, state = 1, rec
+            prev = rec
+        k = state['k']
+        kinds[k] = kinds.get(k, 0) + n
+        if 'd' in state:
+            decisions[state['d']] = decisions.get(state['d'], 0) + n
+        for name, (label, _) in state.get('r', {}).items():
+            seen[name] = seen.get(name, 0) + n
+            if label is None:
+                rejected[name] = rejected.get(name, 0) + n
+        for stage, ms in rec.get('ms', {}).items():
+            values = stages.setdefault(stage, ([], []))
+            values[0].append(ms)
+            values[1].append(n)
+    latency = {}
+    for stage, (values, weights) in stages.items():
+        values, weights = np.asarray(values, dtype=np.float64), np.asarray(weights, dtype=np.float64)
+        latency[stage] = {'n': int(weights.sum()), 'mean': round(float(values @ weights / weights.sum()), 3),
+                          **weighted_percentiles(values, weights)}
+    return {
+        'from': first, 'to': last,
+        'kinds': kinds,
+        'decisions': decisions,
+        'rejected': {name: round(rejected.get(name, 0) / n, 4) for name, n in seen.items()},
+        'latency_ms': latency,
+    }
+
+
+def parse_time(value):
+    """'2025-06-26 12:00:00' / '2025-06-26' / czas unix -> czas unix."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return time.mktime(time.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise ValueError(f"Nieznany format czasu: {value}")
+
+
+def demo(n, path):
+    """n syntetycznych klatek jak z pętli notatnika: koszt event() w pętli, zapis w tle, odczyt."""
+    regions = [f'{c}-{k}' for c in ('f1', 'f2', 'f3', 'f4', 'f5', 'h1-1', 'h1-2', 'h2-1', 'h2-2')
+               for k in ('rank', 'suit')]
+    rng = np.random.default_rng(0)
+    ranks, suits = '23456789tjqka', 'cdhs'
+    for old in [path] + rotated_files(path):
+        if os.path.exists(old):
+            os.remove(old)
+    log = EventLog(path, max_bytes=MAX_BYTES, max_files=1000)
+    state = decision = None
+    t_event = 0.0
+    t0 = time.perf_counter()
+    for i in range(n):
+        # Nowe rozdanie co ~20 klatek; w międzyczasie ten sam stół (powtórzenia)
+        if state is None or rng.random() < 0.05:
+            state = {name: ranks[rng.integers(0, 13)] if name.endswith('rank') else suits[rng.integers(0, 4)]
+                     for name in regions}
+            if rng.random() < 0.1:
+                state[regions[rng.integers(0, len(regions))]] = None
+            decision = ('hand1', 'hand2', 'tie')[rng.integers(0, 3)]
+        r = {name: [label, round(0.8 + 0.2 * rng.random(), 3)] for name, label in state.items()}
+        unreadable = any(label is None for label in state.values())
+        t1 = time.perf_counter()
+        log.event('unreadable' if unreadable else 'decision', table='wsop', regions=r,
+                  decision=None if unreadable else decision,
+                  stages={'capture': 2 + rng.random(), 'match': 8 + rng.random(), 'evaluate': 0.05})
+        t_event += time.perf_counter() - t1
+    t_loop = time.perf_counter() - t0
+    log.close()
+    t_total = time.perf_counter() - t0
+    files = rotated_files(path) + [path]
+    size = sum(os.path.getsize(p) for p in files)
+    print(f"event(): {t_event / n * 1e6:.2f} µs na rekord w pętli ({n} rekordów, pętla {t_loop:.2f} s, "
+          f"z zapisem zaległych {t_total:.2f} s); {log.stats()}")
+    print(f"Pliki: {len(files)}, {size / 1024 / 1024:.1f} MiB, {size / n:.1f} B na klatkę")
+    t0 = time.perf_counter()
+    summary = summarize(iter_records(files))
+    dt = time.perf_counter() - t0
+    print(f"Odczyt i agregacja: {dt:.2f} s ({n / dt / 1000:.0f} tys. klatek/s); zdarzenia {summary['kinds']}, "
+          f"decyzje {summary['decisions']}")
+    t0 = time.perf_counter()
+    summary = summarize(iter_records(files, kinds=['unreadable']))
+    print(f"Tylko 'unreadable' (filtr tekstowy przed json.loads): {time.perf_counter() - t0:.2f} s, "
+          f"{summary['kinds']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Statystyki dziennika zdarzeń NDJSON (logs/).')
+    parser.add_argument('inputs', nargs='*', default=[LOG_DIR], help='katalogi lub pliki .ndjson (domyślnie logs/)')
+    parser.add_argument('--kind', action='append', help="tylko zdarzenia danego rodzaju (np. 'decision')")
+    parser.add_argument('--since', help="od czasu ('2025-06-26 12:00' lub unix)")
+    parser.add_argument('--until', help='do czasu')
+    parser.add_argument('--demo', type=int, metavar='N', help='N syntetycznych rekordów: koszt zapisu i odczytu')
+    args = parser.parse_args(argv)
+
+    if args.demo:
+        demo(args.demo, os.path.join(LOG_DIR, 'demo.ndjson'))
+        return 0
+    paths = log_files(args.inputs)
+    if not paths:
+        print("Brak plików dziennika")
+        return 1
+    summary = summarize(iter_records(paths, args.kind, parse_time(args.since), parse_time(args.until)))
+    for key in ('from', 'to'):
+        if summary[key] is not None:
+            summary[key] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(summary[key]))
+    print(json.dumps(summary, indent=1, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import os
+from bisect import bisect_right
+from glob import glob
+import cv2
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SHOTS_DIR = os.path.join(BASE_DIR, 'shots')
+
+
+def bounding_box(rects):
+    """Najmniejszy prostokąt (x, y, w, h) obejmujący wszystkie regiony."""
+    rects = list(rects)
+    x0 = min(x for x, y, w, h in rects)
+    y0 = min(y for x, y, w, h in rects)
+    x1 = max(x + w for x, y, w, h in rects)
+    y1 = max(y + h for x, y, w, h in rects)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+class FrameSource:
+    """
+    Jedno przechwycenie na klatkę: prostokąt obejmujący wszystkie regiony trafia
+    do jednego bufora BGRA, a regiony są widokami tego bufora tworzonymi raz.
+    Podklasy implementują tylko _fill(buffer) – zapis nowej klatki do bufora.
+
+    regions: {nazwa: (x, y, w, h)} we współrzędnych klatki (np. okna gry).
+    """
+
+    def __init__(self, regions):
+        self.regions = dict(regions)
+        self.bbox = bounding_box(self.regions.values())
+        bx, by, bw, bh = self.bbox
+        self.buffer = np.zeros((bh, bw, 4), dtype=np.uint8)
+        self.views = {name: self.buffer[y - by:y - by + h, x - bx:x - bx + w]
+                      for name, (x, y, w, h) in self.regions.items()}
+        self._gray = {}
+        self._bgr = {}
+        self._gray_frame = None
+        self.frames = 0
+
+    def local(self, rect):
+        """Prostokąt przeliczony na współrzędne bufora."""
+        x, y, w, h = rect
+        return x - self.bbox[0], y - self.bbox[1], w, h
+
+    def grab(self):
+        """Pobiera nową klatkę do bufora. Zwraca False, gdy źródło się skończyło."""
+        if not self._fill(self.buffer):
+            return False
+        self.frames += 1
+        return True
+
+    def _fill(self, buffer):
+        raise NotImplementedError
+
+    def crop(self, name):
+        """Widok BGRA regionu (bez kopii – nadpisywany przy następnym grab)."""
+        return self.views[name]
+
+    def gray(self, name):
+        """Region w skali szarości – konwersja tylko wycinka, do bufora wielokrotnego użytku."""
+        view = self.views[name]
+        dst = self._gray.get(name)
+        if dst is None:
+            dst = self._gray[name] = np.empty(view.shape[:2], dtype=np.uint8)
+        return cv2.cvtColor(view, cv2.COLOR_BGRA2GRAY, dst=dst)
+
+    def bgr(self, name):
+        """Region BGR (dla kodu oczekującego obrazu 3-kanałowego)."""
+        view = self.views[name]
+        dst = self._bgr.get(name)
+        if dst is None:
+            dst = self._bgr[name] = np.empty(view.shape[:2] + (3,), dtype=np.uint8)
+        return cv2.cvtColor(view, cv2.COLOR_BGRA2BGR, dst=dst)
+
+    def gray_frame(self):
+        """Cały prostokąt regionów w skali szarości (współrzędne jak w local)."""
+        if self._gray_frame is None:
+            self._gray_frame = np.empty(self.buffer.shape[:2], dtype=np.uint8)
+        return cv2.cvtColor(self.buffer, cv2.COLOR_BGRA2GRAY, dst=self._gray_frame)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MssFrameSource(FrameSource):
+    """Przechwytywanie ekranu przez mss – tylko prostokąt regionów, bez PIL."""
+
+    def __init__(self, regions, origin=(0, 0), sct=None):
+        super().__init__(regions)
+        self.sct = sct
+        self._own_sct = sct is None
+        self.move(origin)
+
+    def move(self, origin):
+        """Okno przesunięte (ten sam rozmiar): regiony bez zmian, przesuwa się tylko prostokąt przechwytywania."""
+        bx, by, bw, bh = self.bbox
+        # Nowy słownik zamiast zmiany pól – wątek przechwytujący widzi stary albo nowy, nigdy pół na pół
+        self.monitor = {"left": origin[0] + bx, "top": origin[1] + by, "width": bw, "height": bh}
+
+    def _fill(self, buffer):
+        if self.sct is None:
+            # Tworzony przy pierwszym grab, czyli w wątku przechwytującym (na Windows uchwyty mss są per wątek)
+            import mss
+            self.sct = mss.mss()
+        shot = self.sct.grab(self.monitor)
+        # shot.raw to już BGRA – jedna kopia do stałego bufora
+        np.copyto(buffer, np.frombuffer(shot.raw, dtype=np.uint8).reshape(buffer.shape))
+        return True
+
+    def close(self):
+        if self._own_sct and self.sct is not None:
+            self.sct.close()
+            self.sct = None
+
+
+class FileFrameSource(FrameSource):
+    """Odtwarzanie zapisanych zrzutów (domyślnie shots/*.png) – do testów bez ekranu."""
+
+    def __init__(self, regions, paths=None, loop=False, preload=False):
+        super().__init__(regions)
+        if paths is None:
+            paths = sorted(glob(os.path.join(SHOTS_DIR, '*.png')))
+        self.paths = list(paths)
+        self.loop = loop
+        self.index = 0
+        self.path = None
+        # preload: wszystkie klatki dekodowane od razu – grab mierzy wtedy tylko kopię, jak przy mss
+        self._decoded = {p: self._read(p) for p in self.paths} if preload else None
+
+    def _fill(self, buffer):
+        if self.index >= len(self.paths):
+            if not self.loop or not self.paths:
+                return False
+            self.index = 0
+        self.path = self.paths[self.index]
+        self.index += 1
+        part = self._decoded[self.path] if self._decoded is not None else self._read(self.path)
+        cv2.cvtColor(part, cv2.COLOR_BGR2BGRA, dst=buffer)
+        return True
+
+    def _read(self, path):
+        """Prostokąt regionów z pliku (BGR)."""
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None:
+            raise FileNotFoundError(f"Nie można wczytać klatki: {path}")
+        bx, by, bw, bh = self.bbox
+        part = img[by:by + bh, bx:bx + bw]
+        if part.shape[:2] != (bh, bw):
+            raise ValueError(f"Regiony wychodzą poza klatkę {img.shape[1]}x{img.shape[0]}: {path}")
+        return part
+
+
+def shot_time(path):
+    """Czas zrzutu w sekundach z nazwy shot_<setne sekundy>.png."""
+    digits = ''.join(ch for ch in os.path.basename(path) if ch.isdigit())
+    return int(digits) / 100
+
+
+class TimedFileFrameSource(FileFrameSource):
+    """
+    Zrzuty odtwarzane w ich własnym czasie (shot_time), przechwytywane co 1/fps s
+    zegara symulowanego (bez czekania) – jak pętla na żywo, która widzi tę samą klatkę
+    kilka razy, zanim stół się zmieni. self.t: czas bieżącego przechwycenia od pierwszego zrzutu.
+    tail: ile sekund ostatni zrzut jest jeszcze przechwytywany.
+    """
+
+    def __init__(self, regions, paths=None, fps=10, times=None, tail=1.0):
+        super().__init__(regions, paths, preload=True)
+        times = times if times is not None else [shot_time(p) for p in self.paths]
+        self.times = [t - times[0] for t in times]
+        self.fps = fps
+        self.tail = tail
+        self.t = -1 / fps
+
+    def _fill(self, buffer):
+        self.t += 1 / self.fps
+        if self.t > self.times[-1] + self.tail:
+            return False
+        i = bisect_right(self.times, self.t) - 1
+        # Ta sama klatka co poprzednio: bufor już ją zawiera
+        if self.paths[i] != self.path:
+            self.path = self.paths[i]
+            cv2.cvtColor(self._decoded[self.path], cv2.COLOR_BGR2BGRA, dst=buffer)
+        return True
+
+
+if __name__ == '__main__':
+    # Odtworzenie shots/ z regionami bot3 – liczba klatek i czas pobrania + konwersji
+    import time
+    from bot3 import REGIONS
+
+    regions = {}
+    for name, cfg in REGIONS.items():
+        regions[name + '-rank'] = cfg['r']
+        regions[name + '-suit'] = cfg['s']
+    source = FileFrameSource(regions)
+    print(f"Prostokąt regionów: {source.bbox}, bufor {source.buffer.nbytes / 1024:.0f} KiB")
+    t0 = time.perf_counter()
+    while source.grab():
+        crops = [source.gray(name) for name in regions]
+    dt = time.perf_counter() - t0
+    print(f"Klatek: {source.frames}, {dt / max(1, source.frames) * 1000:.1f} ms/klatkę")
@@ -0,0 +1,314 @@
+import os
+from itertools import combinations, combinations_with_replacement
+from math import comb
+import numpy as np
+
+# Karty jako liczby 0..51: ranga * 4 + kolor (ranga 0 = dwójka ... 12 = as)
+RANKS = '23456789tjqka'
+SUITS = 'cdhs'
+CATEGORIES = ['High Card', 'Pair', 'Two Pair', 'Three of a Kind', 'Straight',
+              'Flush', 'Full House', 'Four of a Kind', 'Straight Flush']
+# Liczba klas układów 5-kartowych (jak w treys: siła = 7463 - wynik treys)
+NUM_CLASSES = 7462
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(BASE_DIR, '.hand_eval_tables.npz')
+TABLES_VERSION = 1
+
+# Dwumiany do indeksu multizbioru rang: sum(C(r_i + i, i + 1)) po rangach rosnąco
+BINOM = np.array([[comb(n, k) for k in range(8)] for n in range(20)], dtype=np.int64)
+
+
+def card(label):
+    """'Ah' / 'ah' / ('a', 'h') / 'Th' -> 0..51."""
+    rank, suit = (label[0], label[1]) if isinstance(label, (tuple, list)) else (label[:-1], label[-1])
+    rank = rank.lower()
+    if rank == '10':
+        rank = 't'
+    return RANKS.index(rank) * 4 + SUITS.index(suit.lower())
+
+
+def card_label(c):
+    return RANKS[c // 4] + SUITS[c % 4]
+
+
+def from_treys(treys_card):
+    """Karta w kodowaniu treys (int) -> 0..51."""
+    rank = (treys_card >> 8) & 0xF
+    suit = {1: 's', 2: 'h', 4: 'd', 8: 'c'}[(treys_card >> 12) & 0xF]
+    return rank * 4 + SUITS.index(suit)
+
+
+def multiset_index(sorted_ranks):
+    """Doskonały hasz posortowanego multizbioru rang (0 <= indeks < C(12 + n, n))."""
+    return sum(comb(r + i, i + 1) for i, r in enumerate(sorted_ranks))
+
+
+def key5(ranks, flush):
+    """
+    Klucz porządkujący układ 5 kart – ta sama logika co evaluate_5cards z notatnika
+    (rangi 0..12 zamiast 2..14, więc kolejność kluczy jest identyczna).
+    """
+    ranks = sorted(ranks, reverse=True)
+    counts = {r: ranks.count(r) for r in set(ranks)}
+    sorted_counts = sorted(counts.items(), key=lambda x: (-x[1], -x[0]))
+    unique = sorted(set(ranks), reverse=True)
+    straight, high_st = False, None
+    if len(unique) == 5:
+        if unique[0] - unique[-1] == 4:
+            straight, high_st = True, unique[0]
+        if unique == [12, 3, 2, 1, 0]:
+            straight, high_st = True, 3
+    if straight and flush:
+        return (9, high_st)
+    if sorted_counts[0][1] == 4:
+        four = sorted_counts[0][0]
+        return (8, four, max(r for r in ranks if r != four))
+    if sorted_counts[0][1] == 3 and sorted_counts[1][1] == 2:
+        return (7, sorted_counts[0][0], sorted_counts[1][0])
+    if flush:
+        return (6, *ranks)
+    if straight:
+        return (5, high_st)
+    if sorted_counts[0][1] == 3:
+        trip = sorted_counts[0][0]
+        return (4, trip, *sorted(r for r in ranks if r != trip)[::-1])
+    if sorted_counts[0][1] == 2 and sorted_counts[1][1] == 2:
+        pair1, pair2 = sorted_counts[0][0], sorted_counts[1][0]
+        kicker = max(r for r in ranks if r not in (pair1, pair2))
+        return (3, max(pair1, pair2), min(pair1, pair2), kicker)
+    if sorted_counts[0][1] == 2:
+        pair = sorted_counts[0][0]
+        return (2, pair, *sorted(r for r in ranks if r != pair)[::-1])
+    return (1, *ranks)
+
+
+def rank_multisets(n):
+    """Wszystkie multizbiory n rang możliwe w talii (co najwyżej 4 karty jednej rangi)."""
+    for ms in combinations_with_replacement(range(13), n):
+        if all(ms.count(r) <= 4 for r in set(ms)):
+            yield ms
+
+
+def build_tables():
+    """
+    Tablice siły (1 = najsłabszy, 7462 = poker królewski):
+      nonflush[n][multiset_index(rangi)] – najlepsze 5 z n kart bez koloru,
+      flush[maska 13 bitów] – najlepszy kolor / poker z kart jednego koloru (>= 5).
+    """
+    keys_nf = {ms: key5(ms, False) for ms in rank_multisets(5)}
+    keys_fl = {rs: key5(rs, True) for rs in combinations(range(13), 5)}
+    ordered = sorted(set(keys_nf.values()) | set(keys_fl.values()))
+    assert len(ordered) == NUM_CLASSES
+    strength = {key: i + 1 for i, key in enumerate(ordered)}
+    nf5 = {ms: strength[key] for ms, key in keys_nf.items()}
+    fl5 = {rs: strength[key] for rs, key in keys_fl.items()}
+
+    nonflush = {}
+    for n in (5, 6, 7):
+        table = np.zeros(comb(12 + n, n), dtype=np.int16)
+        for ms in rank_multisets(n):
+            table[multiset_index(ms)] = max(nf5[sub] for sub in set(combinations(ms, 5)))
+        nonflush[n] = table
+
+    flush = np.zeros(1 << 13, dtype=np.int16)
+    for mask in range(1 << 13):
+        bits = [r for r in range(13) if mask >> r & 1]
+        if len(bits) >= 5:
+            flush[mask] = max(fl5[sub] for sub in combinations(bits, 5))
+
+    # Pierwsza siła każdej kategorii (do hand_class)
+    starts = np.array([strength[min(k for k in ordered if k[0] == c + 1)] for c in range(9)], dtype=np.int16)
+    return nonflush, flush, starts
+
+
+def load_tables(cache_path=CACHE_PATH):
+    """Tablice z pliku .npz (budowane przy pierwszym użyciu, ~kilka sekund)."""
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as npz:
+                if int(npz['version']) == TABLES_VERSION:
+                    return ({n: npz[f'nonflush{n}'] for n in (5, 6, 7)}, npz['flush'], npz['starts'])
+        except (OSError, KeyError, ValueError):
+            pass
+    nonflush, flush, starts = build_tables()
+    if cache_path:
+        tmp_path = cache_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, version=TABLES_VERSION, flush=flush, starts=starts,
+                         **{f'nonflush{n}': t for n, t in nonflush.items()})
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Nie udało się zapisać tablic układów: {e}")
+    return nonflush, flush, starts
+
+
+class HandEvaluator:
+    """
+    Ocena 5-7 kart kilkoma odczytami z tablic: indeks multizbioru rang
+    (bez koloru) i maska rang karty w kolorze, gdy jest >= 5 kart jednego koloru.
+    Wynik: siła 1..7462, większa = lepsza (kolejność jak best_hand_7 i treys).
+    """
+
+    def __init__(self, cache_path=CACHE_PATH):
+        self.nonflush, self.flush, self.starts = load_tables(cache_path)
+        self._nonflush_lists = {n: t.tolist() for n, t in self.nonflush.items()}
+        self._flush_list = self.flush.tolist()
+        self._binom = BINOM.tolist()
+
+    def evaluate(self, cards):
+        """Siła układu z 5-7 kart (0..51 lub etykiety 'ah' / ('a', 'h'))."""
+        cards = [c if isinstance(c, (int, np.integer)) else card(c) for c in cards]
+        binom = self._binom
+        ranks = sorted(c >> 2 for c in cards)
+        best = self._nonflush_lists[len(cards)][sum(binom[r + i][i + 1] for i, r in enumerate(ranks))]
+        masks = [0, 0, 0, 0]
+        counts = [0, 0, 0, 0]
+        for c in cards:
+            masks[c & 3] |= 1 << (c >> 2)
+            counts[c & 3] += 1
+        for s in range(4):
+            if counts[s] >= 5:
+                best = max(best, self._flush_list[masks[s]])
+        return best
+
+    def evaluate_batch(self, cards):
+        """Siły dla tablicy (N, n) kart 0..51, n = 5..7 – jedno wywołanie NumPy."""
+        cards = np.asarray(cards, dtype=np.int64)
+        n = cards.shape[1]
+        ranks = cards >> 2
+        suits = cards & 3
+        sorted_ranks = np.sort(ranks, axis=1)
+        idx = np.zeros(len(cards), dtype=np.int64)
+        for i in range(n):
+            idx += BINOM[sorted_ranks[:, i] + i, i + 1]
+        best = self.nonflush[n][idx]
+
+        counts = np.stack([(suits == s).sum(axis=1) for s in range(4)], axis=1)
+        flush_suit = counts.argmax(axis=1)
+        has_flush = counts.max(axis=1) >= 5
+        if has_flush.any():
+            sel = has_flush.nonzero()[0]
+            in_suit = suits[sel] == flush_suit[sel, None]
+            mask = np.where(in_suit, 1 << ranks[sel], 0).sum(axis=1)
+            best[sel] = np.maximum(best[sel], self.flush[mask])
+        return best
+
+    def hand_class(self, strength):
+        """Nazwa kategorii układu dla siły."""
+        return CATEGORIES[int(np.searchsorted(self.starts, strength, side='right')) - 1]
+
+    @staticmethod
+    def to_treys(strength):
+        """Siła -> wynik treys.Evaluator (1 = poker królewski, mniej = lepiej)."""
+        return NUM_CLASSES + 1 - strength
+
+
+_EVALUATOR = None
+
+
+def get_evaluator():
+    """Współdzielony evaluator – tablice wczytywane raz na proces."""
+    global _EVALUATOR
+    if _EVALUATOR is None:
+        _EVALUATOR = HandEvaluator()
+    return _EVALUATOR
+
+
+def evaluate7(cards):
+    return get_evaluator().evaluate(cards)
+
+
+def verify(exhaustive7=False):
+    """
+    Sprawdzenie zgodności:
+      1. wszystkie 2 598 960 układów 5-kartowych – siła == 7463 - treys (pełne),
+      2. 7 kart: losowe układy z treys, a z exhaustive7=True wszystkie 133 784 560
+         układów względem maksimum 21 ocen 5-kartowych (definicja best_hand_7).
+    """
+    import time
+    from treys import Card, Evaluator
+    ev = get_evaluator()
+    treys = Evaluator()
+    deck = [Card.new(RANKS[c // 4].upper() + SUITS[c % 4]) for c in range(52)]
+
+    t0 = time.perf_counter()
+    hands5 = np.array(list(combinations(range(52), 5)), dtype=np.int8)
+    ours = ev.evaluate_batch(hands5)
+    lookup = treys.hand_size_map[5]
+    theirs = np.fromiter((lookup([deck[c] for c in h]) for h in hands5.tolist()),
+                         dtype=np.int64, count=len(hands5))
+    bad5 = int((ev.to_treys(ours.astype(np.int64)) != theirs).sum())
+    print(f"5 kart: {len(hands5)} układów, różnice z treys: {bad5} ({time.perf_counter() - t0:.1f} s)")
+
+    rng = np.random.default_rng(0)
+    sample = np.argsort(rng.random((200_000, 52)), axis=1)[:, :7]
+    ours = ev.evaluate_batch(sample)
+    bad7 = sum(ev.to_treys(int(s)) != treys.evaluate([deck[c] for c in h[:2]], [deck[c] for c in h[2:]])
+               for s, h in zip(ours, sample.tolist()))
+    print(f"7 kart: {len(sample)} losowych układów, różnice z treys: {bad7}")
+
+    if exhaustive7:
+        # Siła 5 kart z tablicy dla każdej z 21 podgrup – porównanie z oceną 7-kartową
+        t0 = time.perf_counter()
+        subsets = np.array(list(combinations(range(7), 5)))
+        # Pięciokartowe podzbiory kart > j to sufiks leksykograficznej listy hands5
+        first = np.searchsorted(hands5[:, 0], np.arange(53))
+        total = diff = 0
+        for i, j in combinations(range(52), 2):
+            rest = hands5[first[j + 1]:]
+            if not len(rest):
+                continue
+            head = np.broadcast_to(np.array([i, j], dtype=np.int8), (len(rest), 2))
+            d, n = _check7(ev, np.hstack([head, rest]), subsets)
+            diff += d
+            total += n
+        print(f"7 kart (pełne): {total} układów, różnice z max(21 x 5 kart): {diff} "
+              f"({time.perf_counter() - t0:.0f} s)")
+        bad5 += diff
+    return bad5 + bad7 == 0
+
+
+def _check7(ev, hands, subsets):
+    seven = ev.evaluate_batch(hands)
+    best5 = np.zeros(len(hands), dtype=np.int16)
+    for sub in subsets:
+        np.maximum(best5, ev.evaluate_batch(hands[:, sub]), out=best5)
+    return int((seven != best5).sum()), len(hands)
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    from treys import Card, Evaluator
+
+    t0 = time.perf_counter()
+    ev = HandEvaluator()
+    print(f"Tablice: {(time.perf_counter() - t0) * 1000:.0f} ms, "
+          f"{sum(t.nbytes for t in ev.nonflush.values()) + ev.flush.nbytes} B")
+
+    hand = ['ks', 'kh', '2h', 'kc', 'th', '3h', '7h']
+    s = ev.evaluate(hand)
+    print(f"{hand}: siła {s} ({ev.hand_class(s)}), treys {ev.to_treys(s)}")
+
+    rng = np.random.default_rng(1)
+    batch = np.argsort(rng.random((100_000, 52)), axis=1)[:, :7]
+    t0 = time.perf_counter()
+    ev.evaluate_batch(batch)
+    dt = time.perf_counter() - t0
+    print(f"Wsad: {len(batch)} rąk w {dt * 1000:.0f} ms ({dt / len(batch) * 1e9:.0f} ns/rękę)")
+    treys = Evaluator()
+    t0 = time.perf_counter()
+    for h in batch[:2000].tolist():
+        ev.evaluate(h)
+    dt_ours = (time.perf_counter() - t0) / 2000
+    deck = [Card.new(RANKS[c // 4].upper() + SUITS[c % 4]) for c in range(52)]
+    t0 = time.perf_counter()
+    for h in batch[:2000].tolist():
+        treys.evaluate([deck[c] for c in h[:2]], [deck[c] for c in h[2:]])
+    dt_treys = (time.perf_counter() - t0) / 2000
+    print(f"Pojedynczo: {dt_ours * 1e6:.1f} us/rękę (treys {dt_treys * 1e6:.1f} us)")
+
+    ok = verify(exhaustive7='--exhaustive' in sys.argv)
+    print("Zgodność:", "OK" if ok else "BŁĘDY")
@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import time
+import argparse
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUT_PATH = os.path.join(BASE_DIR, 'labels.npz')
+EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+# Wycinki z mniejszą przewagą nad drugim szablonem (albo odrzucone progami layout.json) idą do przeglądu
+REVIEW_MARGIN = 0.05
+# Klatek na jedno zadanie procesu – mniej narzutu przesyłania niż po jednej
+CHUNK_SIZE = 16
+
+# Stan procesu roboczego: bank, układ i kalibracja tworzone raz (initializer puli)
+_WORKER = {}
+
+
+def list_images(inputs):
+    """Pliki obrazów z podanych katalogów (bez podkatalogów) i plików, posortowane."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths += [p for p in glob(os.path.join(item, '*')) if p.lower().endswith(EXTENSIONS)]
+        else:
+            paths.append(item)
+    return sorted(paths)
+
+
+def init_worker(preprocess, calibrate, review_margin, review_dir):
+    sys.path.insert(0, BASE_DIR)
+    from template_bank import get_bank
+    from layout import get_layout, Calibrator
+    layout = get_layout()
+    _WORKER.update(
+        bank=get_bank(preprocess),
+        layout=layout,
+        # Bez zapisu .calibration.json – kilka procesów pisałoby ten sam plik
+        calibrator=Calibrator(layout, cache_path=None) if calibrate else None,
+        thresholds=layout.thresholds(),
+        review_margin=review_margin,
+        review_dir=review_dir,
+    )
+
+
+def label_frame(path):
+    """Jedna klatka -> (wyniki regionów [(etykieta, wynik, margines, ms, odrzucone)], ms klatki, skala, błąd)."""
+    from classifier import classify_regions
+    from recognition import reject
+    from layout import transform_scale
+    w = _WORKER
+    t0 = time.perf_counter()
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return None, 0.0, 0.0, 'nie można wczytać'
+    transform, scale = None, 1.0
+    if w['calibrator'] is not None:
+        try:
+            transform, _ = w['calibrator'].ensure(gray)
+            scale = transform_scale(transform)
+        except ValueError:
+            return None, (time.perf_counter() - t0) * 1000, 0.0, 'brak kotwic'
+    jobs = w['layout'].regions(transform)
+    try:
+        matches = classify_regions(gray, jobs, w['bank'])
+    except ValueError as e:
+        return None, (time.perf_counter() - t0) * 1000, scale, str(e)
+    reject(matches, w['thresholds'])
+    rows = []
+    # Kolejność kolumn jak w layout.json (classify_regions zwraca regiony pogrupowane po zestawach)
+    for name in jobs:
+        rec = matches[name]
+        rows.append((rec.label or '', rec.score, rec.margin, rec.ms, rec.rejected))
+        if w['review_dir'] and (rec.rejected or rec.margin < w['review_margin']):
+            x, y, cw, ch = jobs[name][0]
+            stem = os.path.splitext(os.path.basename(path))[0]
+            cv2.imwrite(os.path.join(w['review_dir'], f"{stem}_{name}_{rec.label or 'none'}_{rec.margin:.3f}.png"),
+                        gray[max(0, y):y+ch, max(0, x):x+cw])
+    return rows, (time.perf_counter() - t0) * 1000, scale, ''
+
+
+def label_chunk(paths):
+    return [label_frame(p) for p in paths]
+
+
+def label_archive(paths, preprocess=None, calibrate=True, workers=None, review_margin=REVIEW_MARGIN,
+                  review_dir=None, chunk_size=CHUNK_SIZE):
+    """
+    Rozpoznanie wszystkich klatek regionami layout.json. Zwraca słownik kolumn (format pliku wynikowego):
+    etykiety / wyniki / marginesy / czasy jako tablice (klatki x regiony).
+    """
+    from layout import get_layout
+    from template_bank import get_bank
+    workers = workers or os.cpu_count() or 1
+    regions = get_layout().regions()
+    # Bank wczytany (i zapisany do cache .npz) przed startem procesów – procesy czytają gotowy cache
+    bank = get_bank(preprocess)
+    if review_dir:
+        os.makedirs(review_dir, exist_ok=True)
+    args = (preprocess, calibrate, review_margin, review_dir)
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    t0 = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=args) as pool:
+            results = [row for chunk in pool.map(label_chunk, chunks) for row in chunk]
+    else:
+        init_worker(*args)
+        results = [row for chunk in chunks for row in label_chunk(chunk)]
+    wall = time.perf_counter() - t0
+
+    n, m = len(paths), len(regions)
+    labels = np.full((n, m), '', dtype='<U8')
+    scores = np.full((n, m), -1.0, dtype=np.float32)
+    margins = np.zeros((n, m), dtype=np.float32)
+    ms = np.zeros((n, m), dtype=np.float32)
+    rejected = np.ones((n, m), dtype=bool)
+    frame_ms = np.zeros(n, dtype=np.float32)
+    scale = np.zeros(n, dtype=np.float32)
+    errors = np.full(n, '', dtype='<U32')
+    for i, (rows, frame_t, frame_scale, error) in enumerate(results):
+        frame_ms[i], scale[i], errors[i] = frame_t, frame_scale, error
+        if rows is None:
+            continue
+        labels[i] = [r[0] for r in rows]
+        scores[i], margins[i], ms[i], rejected[i] = zip(*[r[1:] for r in rows])
+    return {
+        'paths': np.array([os.path.relpath(p, BASE_DIR).replace(os.sep, '/') for p in paths], dtype=str),
+        'regions': np.array(list(regions), dtype=str),
+        'sets': np.array([s for _, s in regions.values()], dtype=str),
+        'labels': labels, 'scores': scores, 'margins': margins, 'ms': ms,
+        'rejected': rejected,
+        'review': rejected | (margins < review_margin),
+        'frame_ms': frame_ms, 'scale': scale, 'errors': errors,
+        'meta': np.array(json.dumps({
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'preprocess': bank.preprocess.spec,
+            'templates': bank.fingerprint(),
+            'calibrate': calibrate,
+            'review_margin': review_margin,
+            'workers': workers,
+            'wall_s': round(wall, 3),
+        })),
+    }
+
+
+def load(path=OUT_PATH):
+    """Plik wynikowy -> słownik kolumn (jak z label_archive)."""
+    with np.load(path) as npz:
+        return {key: npz[key] for key in npz.files}
+
+
+def changed_labels(old, new):
+    """Komórki (klatka, region) wspólne dla obu plików, w których etykieta się zmieniła."""
+    old_rows = {p: i for i, p in enumerate(old['paths'])}
+    old_cols = {r: j for j, r in enumerate(old['regions'])}
+    changes = []
+    for i, path in enumerate(new['paths']):
+        if path not in old_rows:
+            continue
+        for j, region in enumerate(new['regions']):
+            if region in old_cols:
+                before, after = old['labels'][old_rows[path], old_cols[region]], new['labels'][i, j]
+                if before != after:
+                    changes.append((str(path), str(region), str(before), str(after)))
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rozpoznanie archiwum zrzutów (sc/, shots/) regionami layout.json.')
+    parser.add_argument('inputs', nargs='*', default=[os.path.join(BASE_DIR, 'shots')],
+                        help='katalogi lub pliki obrazów (domyślnie shots/)')
+    parser.add_argument('--out', default=OUT_PATH, help='plik wynikowy .npz (kolumny per klatka x region)')
+    parser.add_argument('--workers', type=int, default=None, help='liczba procesów (domyślnie liczba rdzeni)')
+    parser.add_argument('--preprocess', help="przetwarzanie szablonów i wycinków, np. 'otsu'")
+    parser.add_argument('--no-calibrate', action='store_true', help='regiony bez kotwic (klatki w kadrze referencyjnym)')
+    parser.add_argument('--review-margin', type=float, default=REVIEW_MARGIN,
+                        help='wycinki z mniejszym marginesem oznaczane do przeglądu')
+    parser.add_argument('--review-dir', help='zapis oznaczonych wycinków jako PNG do przeglądu')
+    parser.add_argument('--compare', help='poprzedni plik wynikowy: ile etykiet się zmieniło')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BASE_DIR)
+    paths = list_images(args.inputs)
+    if not paths:
+        print("Brak obrazów")
+        return 1
+    res = label_archive(paths, args.preprocess, not args.no_calibrate, args.workers,
+                        args.review_margin, args.review_dir)
+    np.savez_compressed(args.out, **res)
+
+    meta = json.loads(str(res['meta']))
+    n = len(paths)
+    failed = int(np.count_nonzero(res['errors'] != ''))
+    print(f"Klatek: {n} ({failed} bez rozpoznania), {meta['workers']} proc., {meta['wall_s']:.2f} s "
+          f"= {n / meta['wall_s']:.1f} kl/s, mediana {np.median(res['frame_ms']):.1f} ms/klatkę na proces")
+    print(f"Do przeglądu: {int(res['review'].sum())} z {res['review'].size} wycinków "
+          f"(odrzucone progami {int(res['rejected'].sum())}), zapisano: {args.out} "
+          f"({os.path.getsize(args.out) / 1024:.1f} KiB)")
+    if args.compare:
+        changes = changed_labels(load(args.compare), res)
+        print(f"Zmienione etykiety względem {args.compare}: {len(changes)}")
+        for path, region, before, after in changes[:20]:
+            print(f"  {path} {region}: {before or '-'} -> {after or '-'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,301 @@
+import os
+import json
+import cv2
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LAYOUT_PATH = os.path.join(BASE_DIR, 'layout.json')
+CALIBRATION_PATH = os.path.join(BASE_DIR, '.calibration.json')
+
+# Szukanie kotwic: skale okna względem klatki referencyjnej i zmniejszenie obrazu w zgrubnym przebiegu
+SCALES = np.round(np.arange(0.5, 1.501, 0.05), 3)
+COARSE = 4
+# Sprawdzenie kalibracji: kotwica szukana tylko w pobliżu oczekiwanego miejsca (+- tyle px)
+VERIFY_MARGIN = 12
+
+def apply(transform, rect):
+    """Prostokąt z klatki referencyjnej po przekształceniu afinicznym (zaokrąglony do pikseli)."""
+    if transform is None:
+        return tuple(rect)
+    x, y, w, h = rect
+    pts = np.array([[x, y, 1.0], [x + w, y + h, 1.0]]) @ np.asarray(transform).T
+    (x0, y0), (x1, y1) = np.rint(pts).astype(int)
+    return int(x0), int(y0), int(x1 - x0), int(y1 - y0)
+
+
+def transform_scale(transform):
+    return float(np.hypot(transform[0][0], transform[1][0]))
+
+
+def card_regions(regions):
+    """{'f1-rank': (prostokąt, zestaw), ...} -> {'f1': {'r', 's', 'rank_dir', 'suit_dir'}} (format bot3.REGIONS)."""
+    cards = {}
+    for name, (rect, set_name) in regions.items():
+        cid, kind = name.rsplit('-', 1)
+        cfg = cards.setdefault(cid, {})
+        if kind == 'rank':
+            cfg['r'], cfg['rank_dir'] = rect, set_name
+        else:
+            cfg['s'], cfg['suit_dir'] = rect, set_name
+    return cards
+
+
+def grab_gray(rect):
+    """Jednorazowe przechwycenie prostokąta ekranu (x, y, w, h) w skali szarości – do kalibracji."""
+    import mss
+    x, y, w, h = rect
+    with mss.mss() as sct:
+        shot = sct.grab({"left": x, "top": y, "width": w, "height": h})
+    return cv2.cvtColor(np.asarray(shot), cv2.COLOR_BGRA2GRAY)
+
+
+class Anchor:
+    def __init__(self, name, rect, template, min_score):
+        self.name = name
+        self.rect = tuple(rect)
+        self.template = template
+        self.min_score = min_score
+        self._scaled = {}
+
+    def scaled(self, scale, coarse=1):
+        """Szablon przeskalowany raz na (skala, zmniejszenie)."""
+        key = (float(scale), coarse)
+        tpl = self._scaled.get(key)
+        if tpl is None:
+            h, w = self.template.shape
+            size = (max(1, int(round(w * scale / coarse))), max(1, int(round(h * scale / coarse))))
+            tpl = self._scaled[key] = cv2.resize(self.template, size, interpolation=cv2.INTER_AREA)
+        return tpl
+
+
+class Layout:
+    """
+    Układ stołu z layout.json: kotwice i grupy regionów we współrzędnych klatki referencyjnej.
+    'regions': {nazwa: {'rect', 'set'}}, pozostałe grupy: {nazwa: [x, y, w, h]}.
+    """
+
+    def __init__(self, data, base_dir=BASE_DIR):
+        self.data = data
+        self.reference = data['reference']
+        self.anchors = {}
+        for name, cfg in data['anchors'].items():
+            path = os.path.join(base_dir, cfg['template'])
+            tpl = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if tpl is None:
+                raise FileNotFoundError(f"Brak szablonu kotwicy: {path}")
+            self.anchors[name] = Anchor(name, cfg['rect'], tpl, cfg.get('min_score', 0.8))
+
+    @classmethod
+    def load(cls, path=LAYOUT_PATH):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), os.path.dirname(os.path.abspath(path)))
+
+    def regions(self, transform=None):
+        """{nazwa: ((x, y, w, h), zestaw)} – format jobs dla classify_regions."""
+        return {name: (apply(transform, cfg['rect']), cfg['set'])
+                for name, cfg in self.data['regions'].items()}
+
+    def thresholds(self, engines=None):
+        """
+        {nazwa regionu: (min_score, min_margin)} – progi odrzucenia z grupy 'reject' (per zestaw
+        szablonów), nadpisywane przez 'min_score' / 'min_margin' w definicji regionu.
+        Wyniki silników innych niż 'template' mają inną skalę: dla nich klucz 'zestaw@silnik'
+        (benchmark.py --tune --engine nn), bez niego – progi zestawu.
+        engines: {zestaw: silnik}, domyślnie grupa 'engines'.
+        """
+        reject = self.data.get('reject', {})
+        engines = self.engines() if engines is None else engines
+        out = {}
+        for name, cfg in self.data['regions'].items():
+            set_name = cfg['set']
+            limits = reject.get(set_name, reject.get('default', (-1.0, 0.0)))
+            engine = engines.get(set_name, 'template')
+            min_score, min_margin = reject.get(f'{set_name}@{engine}', limits) if engine != 'template' else limits
+            out[name] = (cfg.get('min_score', min_score), cfg.get('min_margin', min_margin))
+        return out
+
+    def engines(self):
+        """{zestaw szablonów: silnik rozpoznawania} z grupy 'engines' (brak zestawu – 'template')."""
+        return dict(self.data.get('engines', {}))
+
+    def rects(self, group, transform=None):
+        """{nazwa: (x, y, w, h)} dla grupy prostokątów (np. 'search_regions')."""
+        return {name: apply(transform, rect) for name, rect in self.data[group].items()}
+
+
+class Calibrator:
+    """
+    Przekształcenie klatka referencyjna -> bieżąca klatka okna, z kotwic.
+    Pełne szukanie (zgrubnie w 1/COARSE rozdzielczości po SCALES, potem dokładnie
+    w małym otoczeniu) tylko przy kalibracji; w każdej klatce wystarczy verify,
+    które dopasowuje kotwice w oknach +-VERIFY_MARGIN px.
+    Wynik zapamiętywany per rozmiar klatki w .calibration.json.
+    """
+
+    def __init__(self, layout, cache_path=CALIBRATION_PATH):
+        self.layout = layout
+        self.cache_path = cache_path
+        self.transform = None
+        self.scores = {}
+        self.calibrations = 0
+        self._cache = self._load_cache()
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, 'w', encoding='utf-8') as f:
+                json.dump(self._cache, f, indent=1)
+        except OSError as e:
+            print(f"Nie udało się zapisać kalibracji: {e}")
+
+    def locate(self, gray, anchor):
+        """Najlepsze położenie kotwicy: (wynik, x, y, skala) w pikselach klatki."""
+        small = cv2.resize(gray, None, fx=1 / COARSE, fy=1 / COARSE, interpolation=cv2.INTER_AREA)
+        best = (-1.0, 0, 0, 1.0)
+        for scale in SCALES:
+            tpl = anchor.scaled(scale, COARSE)
+            if tpl.shape[0] > small.shape[0] or tpl.shape[1] > small.shape[1] or min(tpl.shape) < 4:
+                continue
+            _, val, _, loc = cv2.minMaxLoc(cv2.matchTemplate(small, tpl, cv2.TM_CCOEFF_NORMED))
+            if val > best[0]:
+                best = (val, loc[0] * COARSE, loc[1] * COARSE, float(scale))
+        # Dokładnie: sąsiednie skale w otoczeniu zgrubnego wyniku
+        _, cx, cy, cs = best
+        best = (-1.0, cx, cy, cs)
+        for scale in (cs - 0.025, cs, cs + 0.025):
+            res = self._match_near(gray, anchor, scale, cx, cy, COARSE * 2)
+            if res is not None and res[0] > best[0]:
+                best = res
+        return best
+
+    def _match_near(self, gray, anchor, scale, x, y, margin):
+        tpl = anchor.scaled(round(scale, 4))
+        th, tw = tpl.shape
+        x0, y0 = max(0, x - margin), max(0, y - margin)
+        roi = gray[y0:y + th + margin, x0:x + tw + margin]
+        if roi.shape[0] < th or roi.shape[1] < tw:
+            return None
+        _, val, _, loc = cv2.minMaxLoc(cv2.matchTemplate(roi, tpl, cv2.TM_CCOEFF_NORMED))
+        return val, x0 + loc[0], y0 + loc[1], scale
+
+    def calibrate(self, gray):
+        """Pełne szukanie kotwic; ValueError, gdy żadna nie przekracza min_score."""
+        found = []
+        self.scores = {}
+        for anchor in self.layout.anchors.values():
+            val, x, y, scale = self.locate(gray, anchor)
+            self.scores[anchor.name] = round(float(val), 3)
+            if val >= anchor.min_score:
+                found.append((anchor, x, y, scale))
+        if not found:
+            raise ValueError(f"Nie znaleziono kotwic układu: {self.scores}")
+
+        if len(found) == 1:
+            anchor, x, y, s = found[0]
+            ax, ay = anchor.rect[:2]
+            transform = np.array([[s, 0.0, x - s * ax], [0.0, s, y - s * ay]])
+        else:
+            src = np.array([[a.rect[0], a.rect[1]] for a, _, _, _ in found], dtype=np.float32)
+            dst = np.array([[x, y] for _, x, y, _ in found], dtype=np.float32)
+            transform, _ = cv2.estimateAffinePartial2D(src, dst)
+            if transform is None:
+                raise ValueError("Nie udało się wyznaczyć przekształcenia z kotwic")
+        self.transform = transform
+        self.calibrations += 1
+        self._cache[f'{gray.shape[1]}x{gray.shape[0]}'] = np.round(transform, 6).tolist()
+        self._save_cache()
+        return transform
+
+    def cached(self, shape):
+        """Zapamiętane przekształcenie dla klatki o tym rozmiarze (h, w) albo None."""
+        transform = self._cache.get(f'{shape[1]}x{shape[0]}')
+        return None if transform is None else np.array(transform)
+
+    def verify(self, gray, transform=None):
+        """Czy kotwice są tam, gdzie wskazuje przekształcenie (szukanie tylko w otoczeniu)."""
+        transform = self.transform if transform is None else transform
+        if transform is None:
+            return False
+        scale = transform_scale(transform)
+        ok = False
+        for anchor in self.layout.anchors.values():
+            x, y, _, _ = apply(transform, anchor.rect)
+            res = self._match_near(gray, anchor, scale, x, y, VERIFY_MARGIN)
+            score = None if res is None else round(float(res[0]), 3)
+            self.scores[anchor.name] = score
+            # Wystarczy jedna kotwica: druga może być chwilowo zasłonięta (np. okno dialogowe)
+            if score is not None and score >= anchor.min_score:
+                ok = True
+        return ok
+
+    def ensure(self, gray):
+        """
+        Przekształcenie dla bieżącej klatki: obecne lub zapamiętane dla tego rozmiaru,
+        jeśli kotwice się zgadzają – w przeciwnym razie pełna kalibracja.
+        Zwraca (przekształcenie, czy była kalibracja).
+        """
+        if self.transform is not None and self.verify(gray):
+            return self.transform, False
+        cached = self.cached(gray.shape)
+        if cached is not None and self.verify(gray, cached):
+            self.transform = cached
+            return cached, False
+        return self.calibrate(gray), True
+
+
+def calibrate_screen(calibrator, monitor=1):
+    """Kalibracja na całym monitorze mss – przekształcenie prosto do współrzędnych ekranu."""
+    import mss
+    with mss.mss() as sct:
+        mon = sct.monitors[monitor]
+    gray = grab_gray((mon['left'], mon['top'], mon['width'], mon['height']))
+    transform, _ = calibrator.ensure(gray)
+    transform = np.array(transform, dtype=np.float64)
+    transform[:, 2] += (mon['left'], mon['top'])
+    return transform
+
+
+_LAYOUT = None
+
+
+def get_layout():
+    """Układ z layout.json wczytywany raz na proces."""
+    global _LAYOUT
+    if _LAYOUT is None:
+        _LAYOUT = Layout.load()
+    return _LAYOUT
+
+
+if __name__ == '__main__':
+    # Kalibracja na shots/ i klatkach z innym kadrem (blitz.png, sc1.png): przesunięcie, skala, czas
+    import time
+    from glob import glob
+
+    layout = get_layout()
+    paths = sorted(glob(os.path.join(BASE_DIR, 'shots', '*.png')))
+    paths += [os.path.join(BASE_DIR, p) for p in ('blitz.png', 'sc1.png', '20250713_225206_121251.png')]
+    calib = Calibrator(layout, cache_path=None)
+    for path in paths:
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        t0 = time.perf_counter()
+        try:
+            full = calib.calibrate(gray)
+        except ValueError as e:
+            print(f"{os.path.basename(path):30s} {e}")
+            continue
+        t1 = time.perf_counter()
+        ok = calib.verify(gray)
+        t2 = time.perf_counter()
+        print(f"{os.path.basename(path):30s} przesunięcie ({full[0][2]:+.1f}, {full[1][2]:+.1f}) "
+              f"skala {transform_scale(full):.3f}  kalibracja {(t1 - t0) * 1000:.1f} ms, "
+              f"sprawdzenie {(t2 - t1) * 1000:.2f} ms ({'ok' if ok else 'BŁĄD'})  {calib.scores}")
@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+from functools import wraps
+
+# POKERBOT_METRICS=0 wyłącza pomiary: timer() zwraca pusty kontekst, timed() zostawia funkcję bez zmian
+ENABLED = os.environ.get('POKERBOT_METRICS', '1') != '0'
+# Górne granice kubełków w ms: geometrycznie co 2^(1/4) od 1 µs do ~70 s, alokowane raz
+EDGES_MS = [0.001 * 2 ** (i / 4) for i in range(105)]
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 8765
+# Co ile sekund linia podsumowania (z pomiarów od poprzedniej linii)
+SUMMARY_INTERVAL = 10.0
+
+_NULL = nullcontext()
+
+
+class Histogram:
+    """Czasy jednego etapu w stałych kubełkach EDGES_MS (ostatni kubełek: powyżej zakresu)."""
+
+    __slots__ = ('name', 'counts', 'n', 'total', 'max')
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = [0] * (len(EDGES_MS) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        # Bez blokady: przy równoległych wątkach pojedynczy pomiar może zginąć, to tylko statystyka
+        self.counts[bisect_left(EDGES_MS, ms)] += 1
+        self.n += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def copy(self):
+        h = Histogram(self.name)
+        h.counts, h.n, h.total, h.max = list(self.counts), self.n, self.total, self.max
+        return h
+
+    def since(self, prev):
+        """Pomiary od kopii prev; max to górna granica najwyższego niepustego kubełka."""
+        h = Histogram(self.name)
+        h.counts = [a - b for a, b in zip(self.counts, prev.counts)]
+        h.n, h.total = self.n - prev.n, self.total - prev.total
+        top = max((i for i, c in enumerate(h.counts) if c), default=None)
+        h.max = 0.0 if top is None else min(self.max, EDGES_MS[min(top, len(EDGES_MS) - 1)])
+        return h
+
+    def percentile(self, q):
+        """Górna granica kubełka, w którym wypada q-ty percentyl (nie więcej niż max)."""
+        if not self.n:
+            return 0.0
+        rank, seen = q / 100 * self.n, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if c and seen >= rank:
+                return min(self.max, EDGES_MS[i]) if i < len(EDGES_MS) else self.max
+        return self.max
+
+    def stats(self):
+        return {'n': self.n, 'mean_ms': round(self.total / self.n, 4) if self.n else 0.0,
+                'p50_ms': round(self.percentile(50), 4), 'p90_ms': round(self.percentile(90), 4),
+                'p99_ms': round(self.percentile(99), 4), 'max_ms': round(self.max, 4),
+                'total_s': round(self.total / 1000, 3)}
+
+
+class _Timer:
+    __slots__ = ('hist', 't0')
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe((time.perf_counter() - self.t0) * 1000)
+
+
+class Metrics:
+    """
+    Czasy etapów pętli: with metrics.timer('capture'): ... albo @metrics.timed('decide').
+    Histogramy tworzone przy pierwszym użyciu nazwy, później tylko zliczanie kubełka.
+    Podgląd: summary_line(), serve() (tekst / JSON po HTTP) i start_reporter() (linia co interval s).
+    """
+
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self.hists = {}
+        self.t_start = time.time()
+        self._lock = threading.Lock()
+        self._last = {}
+        self._server = None
+        self._reporter = None
+
+    def histogram(self, name):
+        hist = self.hists.get(name)
+        if hist is None:
+            with self._lock:
+                hist = self.hists.setdefault(name, Histogram(name))
+        return hist
+
+    def timer(self, name):
+        if not self.enabled:
+            return _NULL
+        return _Timer(self.histogram(name))
+
+    def timed(self, name=None):
+        """Dekorator: czas każdego wywołania pod nazwą name (domyślnie moduł.funkcja)."""
+        def wrap(fn):
+            if not self.enabled:
+                return fn
+            hist = self.histogram(name or f"{fn.__module__}.{fn.__name__}")
+
+            @wraps(fn)
+            def timed_fn(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    hist.observe((time.perf_counter() - t0) * 1000)
+            return timed_fn
+        return wrap
+
+    def observe(self, name, ms):
+        if self.enabled:
+            self.histogram(name).observe(ms)
+
+    def snapshot(self):
+        return {name: hist.stats() for name, hist in list(self.hists.items())}
+
+    def summary_line(self, interval=True):
+        """Jedna linia: etap n× średnia / p90 / max ms; interval=True – od poprzedniej linii."""
+        parts = []
+        for name, hist in list(self.hists.items()):
+            if interval:
+                prev = self._last.get(name)
+                self._last[name] = hist.copy()
+                hist = hist.since(prev) if prev is not None else hist
+            if hist.n:
+                parts.append(f"{name} {hist.n}× {hist.total / hist.n:.2f}/{hist.percentile(90):.2f}/"
+                             f"{hist.max:.2f} ms")
+        return ' | '.join(parts) if parts else 'brak pomiarów'
+
+    def text(self):
+        """Histogramy w formacie tekstowym Prometheusa (kubełki skumulowane, granice w ms)."""
+        lines = ['# TYPE pokerbot_stage_ms histogram']
+        for name, hist in list(self.hists.items()):
+            seen = 0
+            for edge, c in zip(EDGES_MS, hist.counts):
+                seen += c
+                if c:
+                    lines.append(f'pokerbot_stage_ms_bucket{{stage="{name}",le="{edge:.6g}"}} {seen}')
+            lines.append(f'pokerbot_stage_ms_bucket{{stage="{name}",le="+Inf"}} {hist.n}')
+            lines.append(f'pokerbot_stage_ms_sum{{stage="{name}"}} {hist.total:.6f}')
+            lines.append(f'pokerbot_stage_ms_count{{stage="{name}"}} {hist.n}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port=METRICS_PORT, host=METRICS_HOST):
+        """
+        Lokalny serwer HTTP w wątku: /metrics (tekst), /json (statystyki etapów), /summary.
+        Zwraca adres albo None, gdy port zajęty (np. drugi bot na tej samej maszynie).
+        """
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path in ('/', '/metrics'):
+                    body, kind = metrics.text(), 'text/plain; version=0.0.4'
+                elif path == '/json':
+                    body, kind = json.dumps({'since': metrics.t_start, 'stages': metrics.snapshot()}), 'application/json'
+                elif path == '/summary':
+                    body, kind = metrics.summary_line(interval=False) + '\n', 'text/plain'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', kind + '; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        if self._server is None:
+            try:
+                self._server = ThreadingHTTPServer((host, port), Handler)
+            except OSError:
+                return None
+            threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start_reporter(self, interval=SUMMARY_INTERVAL, out=print):
+        """Linia podsumowania co interval s (out: print albo np. log.info) w wątku w tle."""
+        if self._reporter is not None or not self.enabled:
+            return
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                out(f"[metryki {interval:.0f} s] {self.summary_line()}")
+        self._reporter = stop
+        threading.Thread(target=run, name='metrics-summary', daemon=True).start()
+
+    def close(self):
+        if self._reporter is not None:
+            self._reporter.set()
+            self._reporter = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+_METRICS = None
+
+
+def get_metrics():
+    """Wspólny rejestr pomiarów procesu (włączony zgodnie z POKERBOT_METRICS)."""
+    global _METRICS
+    if _METRICS is None:
+        _METRICS = Metrics()
+    return _METRICS
+
+
+if __name__ == '__main__':
+    # Koszt pomiaru (timer włączony / wyłączony) i narzut na klatce bot3.recognize_gray z shots/
+    # (5 pomiarów na klatkę), potem podgląd przez lokalny serwer HTTP
+    from glob import glob
+    from urllib.request import urlopen
+    import cv2
+    from frame_source import SHOTS_DIR
+    import bot3
+
+    metrics = get_metrics()
+    n = 200000
+    for enabled in (False, True):
+        metrics.enabled = enabled
+        t0 = time.perf_counter()
+        for _ in range(n):
+            with metrics.timer('demo.empty'):
+                pass
+        per_timer = (time.perf_counter() - t0) / n * 1e6
+        print(f"timer {'włączony' if enabled else 'wyłączony'}: {per_timer:.2f} µs na pomiar")
+
+    frames = [cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in sorted(glob(SHOTS_DIR + '/*.png'))]
+    bot3.recognize_gray(frames[0])
+    per_frame = {}
+    for rnd in range(3):
+        for enabled in (False, True):
+            metrics.enabled = enabled
+            t0 = time.perf_counter()
+            for gray in frames:
+                with metrics.timer('demo.frame'):
+                    bot3.recognize_gray(gray)
+            dt = (time.perf_counter() - t0) / len(frames) * 1000
+            per_frame[enabled] = min(per_frame.get(enabled, dt), dt)
+    overhead = per_frame[True] - per_frame[False]
+    print(f"recognize_gray: {per_frame[False]:.2f} ms/klatkę bez pomiarów, {per_frame[True]:.2f} ms z pomiarami "
+          f"(różnica {overhead * 1000:+.1f} µs = {overhead / per_frame[False] * 100:+.2f}%, "
+          f"z kosztu timera: 3 × {per_timer:.2f} µs = {3 * per_timer / 1000 / per_frame[False] * 100:.3f}%)")
+
+    url = metrics.serve()
+    print(f"Serwer: {url}")
+    print(urlopen(url.replace('/metrics', '/summary')).read().decode().strip())
+    body = urlopen(url).read().decode()
+    print(f"/metrics: {len(body.splitlines())} linii, np. {body.splitlines()[-1]}")
+    print(f"[linia okresowa] {metrics.summary_line()}")
+    metrics.close()
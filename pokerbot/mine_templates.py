@@ -0,0 +1,390 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUT_DIR = os.path.join(BASE_DIR, 'mined')
+MANIFEST_PATH = os.path.join(BASE_DIR, 'ground_truth.json')
+# Cechy wycinka: znak przeskalowany do FEATURE_SIZE x FEATURE_SIZE, średnia 0, norma 1 (iloczyn = korelacja)
+FEATURE_SIZE = 24
+# Korelacja z centrum, od której wycinek dołącza do skupienia
+SIM_THRESHOLD = 0.9
+# Wycinki porównywane z centrami jednym mnożeniem macierzy po BLOCK naraz
+BLOCK = 4096
+# Przejścia k-średnich po wstępnym podziale (przypisanie do najbliższego centrum, nowe centra)
+REFINE_PASSES = 3
+# Składowe znaku: mniejsze to szum, dotykające brzegu to krawędź karty / sąsiednia karta
+MIN_AREA = 30
+# Region pusty: odchylenie jasności poniżej MIN_STD albo największa składowa niższa niż MIN_HEIGHT regionu
+MIN_STD = 12
+MIN_HEIGHT = 0.3
+# Składowe dołączane do największej (druga cyfra '10'); małe – indeks koloru w rogu karty, pomijane
+PART_RATIO = 0.3
+# Skupienie bez etykiet w manifeście dostaje etykietę istniejącego szablonu od tego wyniku TM_CCOEFF_NORMED
+BANK_MIN_SCORE = 0.7
+# Margines wokół znaku w zapisanym szablonie (px)
+PAD = 2
+CHUNK_SIZE = 16
+
+_WORKER = {}
+
+
+def glyph_box(crop):
+    """Ramka znaku w wycinku (x, y, w, h) albo None – patrz glyph_ink."""
+    found = glyph_ink(crop)
+    if found is None:
+        return None
+    x0, y0, x1, y1 = found[0]
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def glyph_ink(crop):
+    """
+    (ramka znaku (x0, y0, x1, y1), maska Otsu całego wycinka, kontur największej składowej) albo None.
+    Otsu odwrócone (ciemny znak na jasnej karcie), największa składowa nie dotykająca brzegu plus
+    składowe obok niej w tym samym wierszu ('10'). Składowe z zewnętrznych konturów (RETR_CCOMP) –
+    ok. 2x szybciej niż connectedComponentsWithStats na wycinku regionu.
+    None – pusty region (tło stołu, rewers, krawędź karty): mały kontrast albo brak dość wysokiej składowej.
+    """
+    if crop.size == 0:
+        return None
+    _, std = cv2.meanStdDev(crop)
+    if std[0, 0] < MIN_STD:
+        return None
+    binary = cv2.threshold(crop, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    contours, hierarchy = cv2.findContours(binary, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    if hierarchy is None:
+        return None
+    h, w = crop.shape
+    parts = []
+    for contour, (_, _, _, parent) in zip(contours, hierarchy[0]):
+        if parent != -1:
+            continue
+        x, y, cw, ch = cv2.boundingRect(contour)
+        if cw * ch >= MIN_AREA and x > 0 and y > 0 and x + cw < w and y + ch < h:
+            # Pole konturu + połowa obwodu ~ liczba pikseli składowej
+            parts.append((x, y, cw, ch, cv2.contourArea(contour) + cv2.arcLength(contour, True) / 2 + 1, contour))
+    if not parts:
+        return None
+    x0, y0, cw, ch, area, main = max(parts, key=lambda p: p[4])
+    if ch < MIN_HEIGHT * h:
+        return None
+    x1, y1 = x0 + cw, y0 + ch
+    for x, y, pw, ph, a, _ in parts:
+        # Druga cyfra: porównywalna wielkość i zachodzi w pionie na główną składową
+        if a >= area * PART_RATIO and y < y1 and y + ph > y0:
+            x0, y0, x1, y1 = min(x0, x), min(y0, y), max(x1, x + pw), max(y1, y + ph)
+    return (max(0, x0 - PAD), max(0, y0 - PAD), min(w, x1 + PAD), min(h, y1 + PAD)), binary, main
+
+
+def features(glyphs, size=FEATURE_SIZE):
+    """Lista znaków (różne rozmiary) -> macierz (n, size*size) float32, wiersze o średniej 0 i normie 1."""
+    X = np.empty((len(glyphs), size * size), dtype=np.float32)
+    for i, g in enumerate(glyphs):
+        X[i] = cv2.resize(g, (size, size), interpolation=cv2.INTER_AREA).ravel()
+    X -= X.mean(axis=1, keepdims=True)
+    X /= np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-6)
+    return X
+
+
+def dedupe(X):
+    """
+    Powtórzone wycinki (ten sam znak w kolejnych klatkach) liczone raz: odcisk 8x8 bitów
+    (znak cechy w miniaturze). Zwraca (indeksy reprezentantów, odwzorowanie wycinek -> reprezentant, liczności).
+    """
+    side = FEATURE_SIZE // 8
+    small = X.reshape(-1, 8, side, 8, side).mean(axis=(2, 4)).reshape(len(X), 64)
+    bits = np.packbits(small > 0, axis=1)
+    _, first, inverse, counts = np.unique(bits, axis=0, return_index=True, return_inverse=True,
+                                          return_counts=True)
+    return first, inverse.ravel(), counts
+
+
+def _normalized(C):
+    return C / np.maximum(np.linalg.norm(C, axis=1, keepdims=True), 1e-6)
+
+
+def cluster(X, weights=None, threshold=SIM_THRESHOLD, block=BLOCK, passes=REFINE_PASSES):
+    """
+    Skupienia wierszy X (cechy z features): podział liderami, potem k-średnie.
+    Każdy blok wycinków porównywany ze wszystkimi centrami jednym X @ C.T; pętla w Pythonie
+    tylko po nowych skupieniach (kilkanaście–kilkadziesiąt na zestaw), nie po wycinkach.
+    weights: liczności wierszy po dedupe (średnie centrów ważone). Zwraca (przypisania, centra).
+    """
+    weights = np.ones(len(X), dtype=np.float32) if weights is None else np.asarray(weights, np.float32)
+    centers = np.empty((0, X.shape[1]), dtype=np.float32)
+    for start in range(0, len(X), block):
+        chunk = X[start:start + block]
+        best = (chunk @ centers.T).max(axis=1) if len(centers) else np.full(len(chunk), -1.0)
+        left = np.flatnonzero(best < threshold)
+        new = []
+        while len(left):
+            # Pierwszy wycinek bez centrum zostaje liderem; jeden iloczyn odhacza wszystkie do niego podobne
+            lead = chunk[left[0]]
+            new.append(lead)
+            left = left[chunk[left] @ lead < threshold]
+        if new:
+            centers = np.vstack([centers] + new)
+    for _ in range(passes):
+        assign = np.empty(len(X), dtype=np.int32)
+        for start in range(0, len(X), block):
+            assign[start:start + block] = (X[start:start + block] @ centers.T).argmax(axis=1)
+        # Ważone sumy skupień: wycinki posortowane po skupieniu, suma ciągłych wierszy (wektorowo
+        # w obrębie skupienia); np.add.at i reduceat po osi 0 mierzyły się kilkadziesiąt razy wolniej
+        order = np.argsort(assign, kind='stable')
+        used, starts = np.unique(assign[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        centers = np.stack([weights[order[a:b]] @ X[order[a:b]] for a, b in zip(starts, ends)])
+        centers = _normalized(centers)
+        assign = np.searchsorted(used, assign).astype(np.int32)
+    return assign, centers
+
+
+def init_worker(calibrate):
+    sys.path.insert(0, BASE_DIR)
+    from layout import get_layout, Calibrator
+    layout = get_layout()
+    _WORKER.update(layout=layout, calibrator=Calibrator(layout, cache_path=None) if calibrate else None)
+
+
+def crop_frame(path):
+    """Klatka -> [(region, zestaw, znak uint8 albo None)]; klatka bez kotwic (plansza, inny stół) -> []."""
+    w = _WORKER
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return []
+    transform = None
+    if w['calibrator'] is not None:
+        try:
+            transform, _ = w['calibrator'].ensure(gray)
+        except ValueError:
+            return []
+    out = []
+    for name, ((x, y, cw, ch), set_name) in w['layout'].regions(transform).items():
+        crop = gray[max(0, y):y+ch, max(0, x):x+cw]
+        box = glyph_box(crop)
+        if box is None:
+            out.append((name, set_name, None))
+        else:
+            gx, gy, gw, gh = box
+            out.append((name, set_name, crop[gy:gy+gh, gx:gx+gw].copy()))
+    return out
+
+
+def crop_chunk(paths):
+    return [crop_frame(p) for p in paths]
+
+
+def crop_archive(paths, calibrate=True, workers=None, chunk_size=CHUNK_SIZE):
+    """Znaki wszystkich regionów layout.json: [(ścieżka, region, zestaw, znak albo None)]."""
+    workers = workers or os.cpu_count() or 1
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(calibrate,)) as pool:
+            frames = [f for chunk in pool.map(crop_chunk, chunks) for f in chunk]
+    else:
+        init_worker(calibrate)
+        frames = [f for chunk in chunks for f in crop_chunk(chunk)]
+    return [(path, *item) for path, items in zip(paths, frames) for item in items]
+
+
+def manifest_label(manifest, path, region):
+    """Etykieta części karty z ground_truth.json ('f1-rank' + '6d' -> '6'), None gdy nieznana."""
+    card = (manifest.get(path) or {}).get(region.rsplit('-', 1)[0])
+    if not card:
+        return None
+    return card[:-1] if region.endswith('-rank') else card[-1]
+
+
+def match_label(glyph, tset):
+    """Etykieta najlepiej pasującego szablonu istniejącego zestawu (znak i szablon w tym samym rozmiarze)."""
+    h, w = glyph.shape
+    best, best_score = None, -1.0
+    for label, tpl in tset.items():
+        score = cv2.matchTemplate(glyph, cv2.resize(tpl, (w, h), interpolation=cv2.INTER_AREA),
+                                  cv2.TM_CCOEFF_NORMED)[0, 0]
+        if score > best_score:
+            best, best_score = label, score
+    return best, float(best_score)
+
+
+def mine(samples, manifest=None, bank=None, threshold=SIM_THRESHOLD):
+    """
+    samples: [(ścieżka, region, zestaw, znak albo None)] -> {zestaw: [skupienie]}, skupienie:
+    {'label', 'source', 'votes', 'size', 'members', 'template'} – template to medoid (znak w natywnym rozmiarze).
+    Etykieta: większość z manifestu, bez niej – najlepszy szablon istniejącego zestawu (source 'bank',
+    gdy wynik >= BANK_MIN_SCORE). Kolejność: najpierw skupienia z etykietą z manifestu, potem wg liczności.
+    """
+    manifest = manifest or {}
+    by_set = {}
+    for i, (_, _, set_name, glyph) in enumerate(samples):
+        if glyph is not None:
+            by_set.setdefault(set_name, []).append(i)
+    mined = {}
+    for set_name, idx in sorted(by_set.items()):
+        X = features([samples[i][3] for i in idx])
+        first, inverse, counts = dedupe(X)
+        assign_u, centers = cluster(X[first], counts, threshold)
+        assign = assign_u[inverse]
+        sims = np.einsum('ij,ij->i', X, centers[assign])
+        clusters = []
+        for c in range(len(centers)):
+            members = np.flatnonzero(assign == c)
+            medoid = members[sims[members].argmax()]
+            votes = {}
+            for m in members:
+                path, region = samples[idx[m]][:2]
+                lbl = manifest_label(manifest, path, region)
+                if lbl:
+                    votes[lbl] = votes.get(lbl, 0) + 1
+            template = samples[idx[medoid]][3]
+            if votes:
+                label, source = max(votes, key=votes.get), 'manifest'
+            elif bank is not None and set_name in bank:
+                label, score = match_label(template, bank[set_name])
+                # Słabe dopasowanie – to raczej tło albo rewers niż znak karty
+                label, source = (label, 'bank') if score >= BANK_MIN_SCORE else (None, None)
+            else:
+                label, source = None, None
+            clusters.append({
+                'label': label.lower() if label else None,
+                'source': source,
+                'votes': votes,
+                'size': len(members),
+                'members': [idx[m] for m in members],
+                'template': template,
+            })
+        clusters.sort(key=lambda c: (c['source'] != 'manifest', -c['size']))
+        mined[set_name] = clusters
+    return mined
+
+
+def fill_missing(mined, bank):
+    """
+    Etykiety zestawu banku, których nie ma w archiwum (np. rzadkie karty w ręce h2), dopisywane
+    jako skupienia bez wycinków tego samego zestawu z ręcznie wyciętym szablonem (source 'hand', etykieta małymi literami).
+    """
+    for set_name, clusters in mined.items():
+        if set_name not in bank:
+            continue
+        have = {c['label'] for c in clusters}
+        for label, tpl in bank[set_name].items():
+            if label.lower() not in have:
+                clusters.append({'label': label.lower(), 'source': 'hand', 'votes': {}, 'size': 0,
+                                 'members': [], 'template': tpl})
+    return mined
+
+
+def save(mined, samples, out_dir=OUT_DIR):
+    """
+    <out_dir>/<zestaw>/<etykieta>.png – medoid pierwszego skupienia etykiety (katalog jak dla
+    TemplateBank(base_dir=out_dir)); kolejne skupienia tej samej etykiety w <zestaw>/variants/.
+    clusters.json: skupienia z etykietami i przypisanie każdego wycinku (klatka, region) do skupienia.
+    """
+    index = {}
+    assignments = []
+    for set_name, clusters in mined.items():
+        set_dir = os.path.join(out_dir, set_name)
+        os.makedirs(os.path.join(set_dir, 'variants'), exist_ok=True)
+        seen = {}
+        entries = []
+        for c in clusters:
+            label = c['label'] or 'unlabelled'
+            n = seen[label] = seen.get(label, 0) + 1
+            fname = f"{label}.png" if n == 1 and c['label'] else f"variants/{label}-{n}.png"
+            cv2.imwrite(os.path.join(set_dir, fname), c['template'])
+            cid = len(entries)
+            entries.append({'file': f"{set_name}/{fname}", 'label': c['label'], 'source': c['source'],
+                            'size': c['size'], 'votes': c['votes'],
+                            'shape': list(c['template'].shape)})
+            for m in c['members']:
+                path, region = samples[m][:2]
+                assignments.append([path, region, set_name, cid])
+        index[set_name] = entries
+    empty = [[path, region, set_name, None] for path, region, set_name, glyph in samples if glyph is None]
+    with open(os.path.join(out_dir, 'clusters.json'), 'w', encoding='utf-8') as f:
+        json.dump({'feature_size': FEATURE_SIZE, 'sets': index,
+                   'assignments': sorted(assignments + empty, key=lambda a: (a[0], a[1]))}, f, indent=1)
+
+
+def evaluate(bank, frames, manifest, jobs):
+    """Trafność regionów (bez progów odrzucenia) na klatkach z manifestu i czas classify_regions na klatkę (po rozgrzewce)."""
+    from classifier import classify_regions
+    correct = total = 0
+    t = 0.0
+    if frames:
+        # Rozgrzewka: plany FFT klasyfikatorów banku budowane przy pierwszym wywołaniu, poza pomiarem
+        classify_regions(frames[0][1], jobs, bank)
+    for path, gray in frames:
+        t0 = time.perf_counter()
+        matches = classify_regions(gray, jobs, bank)
+        t += time.perf_counter() - t0
+        for region, rec in matches.items():
+            expected = manifest_label(manifest, path, region)
+            if expected:
+                total += 1
+                correct += bool(rec.label) and rec.label.lower() == expected
+    return correct, total, t / max(1, len(frames)) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Szablony wyznaczone skupieniami wycinków regionów layout.json.')
+    parser.add_argument('inputs', nargs='*', default=[os.path.join(BASE_DIR, 'shots')],
+                        help='katalogi lub pliki obrazów (domyślnie shots/)')
+    parser.add_argument('--out', default=OUT_DIR, help='katalog wynikowy (zestawy + clusters.json)')
+    parser.add_argument('--threshold', type=float, default=SIM_THRESHOLD, help='korelacja dołączenia do skupienia')
+    parser.add_argument('--workers', type=int, default=None, help='liczba procesów (domyślnie liczba rdzeni)')
+    parser.add_argument('--no-calibrate', action='store_true', help='regiony bez kotwic (klatki w kadrze referencyjnym)')
+    parser.add_argument('--fill', action='store_true',
+                        help='etykiety nieobecne w archiwum uzupełnione ręcznie wyciętymi szablonami')
+    parser.add_argument('--no-eval', action='store_true', help='bez porównania z ręcznie wyciętymi szablonami')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BASE_DIR)
+    from label_archive import list_images
+    from template_bank import TemplateBank, get_bank
+    from layout import get_layout
+    paths = [os.path.abspath(p) for p in list_images(args.inputs)]
+    if not paths:
+        print("Brak obrazów")
+        return 1
+    with open(MANIFEST_PATH, encoding='utf-8') as f:
+        manifest = {os.path.join(BASE_DIR, p): v for p, v in json.load(f)['frames'].items()}
+
+    t0 = time.perf_counter()
+    samples = crop_archive(paths, not args.no_calibrate, args.workers)
+    t_crop = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    mined = mine(samples, manifest, get_bank(), args.threshold)
+    t_mine = time.perf_counter() - t0
+    if args.fill:
+        fill_missing(mined, get_bank())
+    rel = [(os.path.relpath(p, BASE_DIR).replace(os.sep, '/'), *rest) for p, *rest in samples]
+    save(mined, rel, args.out)
+
+    empty = sum(s[3] is None for s in samples)
+    print(f"Klatek {len(paths)}, wycinków {len(samples)} (pustych {empty}); wycinanie {t_crop:.2f} s, "
+          f"skupienia {t_mine * 1000:.1f} ms")
+    for set_name, clusters in mined.items():
+        labels = ' '.join(f"{c['label'] or '?'}:{c['size']}" for c in clusters)
+        print(f"  {set_name:8s} {len(clusters):3d} skupień  {labels}")
+    print(f"Zapisano: {args.out}")
+
+    if not args.no_eval:
+        # Na tych samych klatkach, z których wyznaczono szablony – porównanie w próbie, nie ocena uogólnienia
+        jobs = get_layout().regions()
+        frames = [(p, cv2.imread(p, cv2.IMREAD_GRAYSCALE)) for p in paths if manifest.get(p)]
+        for name, bank in (('ręczne', get_bank()), ('wyznaczone', TemplateBank(base_dir=args.out, cache_path=None))):
+            correct, total, ms = evaluate(bank, frames, manifest, jobs)
+            sizes = sum(len(bank[s]) for s in bank.keys())
+            print(f"  {name:10s} {correct}/{total} regionów poprawnie, {sizes} szablonów, {ms:.2f} ms/klatkę")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
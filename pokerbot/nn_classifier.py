@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import cv2
+import numpy as np
+
+from recognition import Recognition
+from mine_templates import FEATURE_SIZE, glyph_ink, features
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.path.join(BASE_DIR, '.nn_index.npz')
+MANIFEST_PATH = os.path.join(BASE_DIR, 'ground_truth.json')
+# Odpowiedź z indeksu tylko od tej korelacji z najbliższym wzorcem i przewagi nad inną etykietą;
+# poniżej (oraz gdy znaku nie da się wydzielić) wycinek idzie do dopasowania szablonów
+MIN_SCORE = 0.8
+MIN_MARGIN = 0.02
+# Wzorce z archiwum prawie identyczne z już dodanym wzorcem tej samej etykiety są pomijane
+DUPLICATE_SCORE = 0.995
+
+
+def glyph(crop):
+    """Znak w wycinku (widok) albo None – patrz mine_templates.glyph_ink."""
+    found = glyph_ink(crop)
+    if found is None:
+        return None
+    x0, y0, x1, y1 = found[0]
+    return crop[y0:y1, x0:x1]
+
+
+def template_glyph(tpl):
+    """Znak szablonu: szablony są wycięte ciasno, więc szukany z ramką powieloną; bez znaku – cały szablon."""
+    padded = cv2.copyMakeBorder(tpl, 4, 4, 4, 4, cv2.BORDER_REPLICATE)
+    found = glyph(padded)
+    return tpl if found is None else found
+
+
+def feature(img, size=FEATURE_SIZE):
+    """Jeden znak -> wektor (size*size,)."""
+    return features([img], size)[0]
+
+
+class NNClassifier:
+    """
+    Najbliższy sąsiad na wektorach cech znaku: wzorce z szablonów zestawu i z opisanych klatek
+    archiwum (ground_truth.json). Interfejs jak BatchClassifier.classify.
+    Wynik etykiety = najwyższa korelacja z jej wzorcami; wycinki bez znaku albo z odpowiedzią
+    poniżej min_score / min_margin liczy fallback (BatchClassifier zestawu) jednym wsadem.
+    """
+
+    def __init__(self, labels, vectors, exemplar_labels, fallback=None,
+                 min_score=MIN_SCORE, min_margin=MIN_MARGIN):
+        self.labels = list(labels)
+        # Wzorce posortowane po etykiecie: maksimum per etykieta jednym reduceat
+        order = np.argsort([self.labels.index(lbl) for lbl in exemplar_labels], kind='stable')
+        index = np.array([self.labels.index(exemplar_labels[i]) for i in order], dtype=np.intp)
+        self.vectors = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32)[order])
+        self.present = np.unique(index)
+        self.starts = np.searchsorted(index, self.present)
+        self.complete = len(self.present) == len(self.labels)
+        self.fallback = fallback
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.fallbacks = 0
+        self.answered = 0
+
+    def scores(self, features):
+        """(R, d) -> (R, N) najwyższa korelacja z wzorcami każdej etykiety (-1: etykieta bez wzorców)."""
+        best = np.maximum.reduceat(features @ self.vectors.T, self.starts, axis=1)
+        if self.complete:
+            return best
+        out = np.full((len(features), len(self.labels)), -1.0, dtype=np.float32)
+        out[:, self.present] = best
+        return out
+
+    def classify(self, crops):
+        t0 = time.perf_counter()
+        glyphs = [glyph(crop) for crop in crops]
+        found = [i for i, g in enumerate(glyphs) if g is not None]
+        results = [None] * len(glyphs)
+        if found:
+            # Dla kilkunastu etykiet wybór najlepszej i drugiej na listach jest tańszy niż kolejne operacje numpy
+            for i, row in zip(found, self.scores(features([glyphs[i] for i in found])).tolist()):
+                best = row.index(max(row))
+                score = row[best]
+                row[best] = -1.0
+                other = max(row)
+                if self.fallback is None or (score >= self.min_score and score - other >= self.min_margin):
+                    results[i] = Recognition(self.labels[best], score, other)
+        pending = [i for i, rec in enumerate(results) if rec is None]
+        self.answered += len(results) - len(pending)
+        if pending and self.fallback is not None:
+            self.fallbacks += len(pending)
+            for i, rec in zip(pending, self.fallback.classify(np.stack([crops[i] for i in pending]))):
+                results[i] = rec
+        results = [rec if rec is not None else Recognition() for rec in results]
+        ms = (time.perf_counter() - t0) * 1000 / max(1, len(results))
+        for rec in results:
+            rec.ms = ms
+        return results
+
+
+def archive_samples(bank, manifest_path=MANIFEST_PATH, calibrate=True):
+    """
+    Znaki opisanych regionów z klatek manifestu: [(klatka, zestaw, etykieta szablonu, wektor)].
+    Etykiety manifestu ('6d') dopasowane do nazw szablonów zestawu bez rozróżniania wielkości liter.
+    """
+    from layout import get_layout, Calibrator
+    layout = get_layout()
+    calibrator = Calibrator(layout, cache_path=None) if calibrate else None
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)['frames']
+    out = []
+    for path, truth in manifest.items():
+        gray = cv2.imread(os.path.join(BASE_DIR, path), cv2.IMREAD_GRAYSCALE)
+        if gray is None or not truth:
+            continue
+        transform = None
+        if calibrator is not None:
+            try:
+                transform, _ = calibrator.ensure(gray)
+            except ValueError:
+                pass
+        for name, ((x, y, w, h), set_name) in layout.regions(transform).items():
+            cid, kind = name.rsplit('-', 1)
+            card = truth.get(cid)
+            if not card or set_name not in bank:
+                continue
+            part = card[:-1] if kind == 'rank' else card[-1]
+            label = next((lbl for lbl in bank[set_name].labels if lbl.lower() == part.lower()), None)
+            crop = gray[max(0, y):y+h, max(0, x):x+w]
+            g = glyph(bank.preprocess.apply(crop)) if label is not None and crop.size else None
+            if g is not None:
+                out.append((path, set_name, label, feature(g)))
+    return out
+
+
+def build_index(bank, samples=None):
+    """
+    {zestaw: (wektory (n, d), etykiety wzorców)}: znaki szablonów, potem znaki archiwum
+    (samples z archive_samples, domyślnie całe ground_truth.json) bez prawie-duplikatów.
+    """
+    samples = archive_samples(bank) if samples is None else samples
+    index = {}
+    for set_name in bank.keys():
+        tset = bank[set_name]
+        labels = list(tset.labels)
+        vectors = [feature(template_glyph(img)) for img in tset.images]
+        for _, name, label, v in samples:
+            if name != set_name:
+                continue
+            same = [u for u, lbl in zip(vectors, labels) if lbl == label]
+            if same and max(float(u @ v) for u in same) >= DUPLICATE_SCORE:
+                continue
+            vectors.append(v)
+            labels.append(label)
+        index[set_name] = (np.array(vectors, dtype=np.float32).reshape(-1, FEATURE_SIZE * FEATURE_SIZE), labels)
+    return index
+
+
+def fingerprint(bank, manifest_path=MANIFEST_PATH):
+    st = os.stat(manifest_path) if os.path.exists(manifest_path) else None
+    return json.dumps({'bank': bank.fingerprint(), 'feature': FEATURE_SIZE,
+                       'manifest': [st.st_mtime_ns, st.st_size] if st else None}, sort_keys=True)
+
+
+def load_index(bank, cache_path=INDEX_PATH):
+    """Indeks z cache .npz (unieważniany przez szablony i manifest), inaczej budowany i zapisywany."""
+    if bank.preprocess and cache_path:
+        root, ext = os.path.splitext(cache_path)
+        cache_path = f'{root}-{bank.preprocess.spec.replace(",", "+").replace(":", "_")}{ext}'
+    key = fingerprint(bank)
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=False) as npz:
+                if str(npz['fingerprint']) == key:
+                    return {name: (npz[f'{name}/vectors'], [str(lbl) for lbl in npz[f'{name}/labels']])
+                            for name in bank.keys()}
+        except (OSError, KeyError, ValueError):
+            pass
+    index = build_index(bank)
+    if cache_path:
+        arrays = {'fingerprint': np.array(key)}
+        for name, (vectors, labels) in index.items():
+            arrays[f'{name}/vectors'] = vectors
+            arrays[f'{name}/labels'] = np.array(labels, dtype=str)
+        try:
+            with open(cache_path + '.tmp', 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(cache_path + '.tmp', cache_path)
+        except OSError as e:
+            print(f"Nie udało się zapisać indeksu NN: {e}")
+    return index
+
+
+_INDEXES = {}
+
+
+def get_nn_classifier(set_name, bank, fallback=None):
+    """NNClassifier zestawu (indeks wczytywany raz na bank); fallback – np. BatchClassifier zestawu."""
+    index = _INDEXES.get(id(bank))
+    if index is None:
+        index = _INDEXES[id(bank)] = load_index(bank)
+    vectors, exemplar_labels = index[set_name]
+    return NNClassifier(bank[set_name].labels, vectors, exemplar_labels, fallback)
+
+
+if __name__ == '__main__':
+    # Trafność na opisanych regionach ground_truth.json z wyłączeniem rozdania (indeks bez klatek
+    # tego samego rozdania, jak dla nowych kart) oraz czas na wycinek: sam indeks NN, NN z
+    # fallbackiem do szablonów i same szablony (BatchClassifier)
+    from layout import get_layout, Calibrator
+    from template_bank import get_bank
+    from classifier import BatchClassifier
+
+    bank = get_bank()
+    layout = get_layout()
+    calibrator = Calibrator(layout, cache_path=None)
+    with open(MANIFEST_PATH, encoding='utf-8') as f:
+        manifest = json.load(f)['frames']
+    crops = []
+    for path, truth in manifest.items():
+        gray = cv2.imread(os.path.join(BASE_DIR, path), cv2.IMREAD_GRAYSCALE)
+        if gray is None or not truth:
+            continue
+        try:
+            transform, _ = calibrator.ensure(gray)
+        except ValueError:
+            transform = None
+        deal = tuple(truth.get(cid) for cid in ('h1-1', 'h1-2', 'h2-1', 'h2-2'))
+        for name, ((x, y, w, h), set_name) in layout.regions(transform).items():
+            cid, kind = name.rsplit('-', 1)
+            if truth.get(cid):
+                part = truth[cid][:-1] if kind == 'rank' else truth[cid][-1]
+                crops.append((deal, set_name, part, gray[max(0, y):y+h, max(0, x):x+w]))
+    crops = [c for c in crops if c[3].size]
+    t0 = time.perf_counter()
+    samples = archive_samples(bank)
+    print(f"Wycinków: {len(crops)}, rozdań: {len({c[0] for c in crops})}, znaków archiwum "
+          f"{len(samples)} ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+    templates = {name: BatchClassifier(bank[name]) for name in bank.keys()}
+    paths = {path: tuple((manifest[path] or {}).get(cid) for cid in ('h1-1', 'h1-2', 'h2-1', 'h2-2')) for path in manifest}
+    correct = {'nn': 0, 'nn+szablony': 0, 'szablony': 0}
+    times = {key: [] for key in correct}
+    fallbacks = 0
+    for deal in sorted({c[0] for c in crops}, key=str):
+        index = build_index(bank, [s for s in samples if paths[s[0]] != deal])
+        for _, set_name, part, crop in (c for c in crops if c[0] == deal):
+            vectors, exemplar_labels = index[set_name]
+            batch = crop[None]
+            for key, clf in (('nn', NNClassifier(bank[set_name].labels, vectors, exemplar_labels)),
+                             ('nn+szablony', NNClassifier(bank[set_name].labels, vectors, exemplar_labels,
+                                                          templates[set_name])),
+                             ('szablony', templates[set_name])):
+                t0 = time.perf_counter()
+                rec = clf.classify(batch)[0]
+                times[key].append(time.perf_counter() - t0)
+                correct[key] += rec.label is not None and rec.label.lower() == part.lower()
+                fallbacks += key == 'nn+szablony' and clf.fallbacks
+    n = len(crops)
+    for key in correct:
+        t = np.array(times[key]) * 1e6
+        print(f"{key:12s} trafne {correct[key]}/{n} = {correct[key] / n:.3f}, "
+              f"mediana {np.median(t):.0f} µs/wycinek, średnio {t.mean():.0f} µs")
+    print(f"Fallback do szablonów: {fallbacks}/{n} = {fallbacks / n:.1%}")
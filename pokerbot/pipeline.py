@@ -0,0 +1,280 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from change_detector import GatedClassifier
+from metrics import get_metrics
+
+RING_SIZE = 4
+# Przerwa między przechwyceniami – jak cv2.waitKey(30) w pętli notatnika
+CAPTURE_INTERVAL = 0.03
+# Wątki dopasowania: grupy regionów (zestaw, rozmiar) liczone równolegle, FFT i OpenCV zwalniają GIL
+WORKERS = min(4, os.cpu_count() or 1)
+# Percentyle opóźnienia w stats() z ostatnich LATENCY_WINDOW decyzji – potok działa godzinami
+LATENCY_WINDOW = 4096
+
+
+class FrameRing:
+    """
+    Bufor cykliczny klatek w skali szarości – sloty alokowane raz.
+    Czytelnik bierze zawsze najnowszą klatkę (starsze przepadają) i blokuje jej slot
+    do release; zapis pomija zablokowane sloty, więc nie nadpisze klatki w użyciu.
+    """
+
+    def __init__(self, shape, capacity=RING_SIZE):
+        if capacity < 2:
+            raise ValueError("Bufor potrzebuje co najmniej 2 slotów")
+        self.slots = np.empty((capacity,) + tuple(shape), dtype=np.uint8)
+        self.seqs = [-1] * capacity
+        self.times = [0.0] * capacity
+        self.busy = set()
+        self.seq = -1
+        self.written = 0
+        self.read = 0
+        self.cond = threading.Condition()
+        self._next = 0
+
+    def write(self, frame, t_capture):
+        with self.cond:
+            i = self._next
+            while i in self.busy:
+                i = (i + 1) % len(self.slots)
+            self._next = (i + 1) % len(self.slots)
+            self.seqs[i] = -1
+        np.copyto(self.slots[i], frame)
+        with self.cond:
+            self.seq += 1
+            self.seqs[i] = self.seq
+            self.times[i] = t_capture
+            self.written += 1
+            self.cond.notify_all()
+
+    def acquire(self, after=-1, timeout=None):
+        """Najnowsza klatka nowsza niż after: (seq, czas przechwycenia, obraz, slot) lub None."""
+        with self.cond:
+            # Najnowszy slot może być właśnie nadpisywany (wszystkie inne zajęte) – wtedy czekamy na zapis
+            if not self.cond.wait_for(lambda: self.seq > after and self.seq in self.seqs, timeout):
+                return None
+            i = self.seqs.index(self.seq)
+            self.busy.add(i)
+            self.read += 1
+            return self.seq, self.times[i], self.slots[i], i
+
+    def release(self, slot):
+        with self.cond:
+            self.busy.discard(slot)
+
+    @property
+    def dropped(self):
+        return self.written - self.read
+
+
+class Latest:
+    """Skrzynka na jedną wartość: put nadpisuje, get czeka na nowszą niż after (nieodebrane = pominięte)."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.seq = -1
+        self.value = None
+        self.taken = True
+        self.dropped = 0
+
+    def put(self, seq, value):
+        with self.cond:
+            if not self.taken:
+                self.dropped += 1
+            self.seq, self.value, self.taken = seq, value, False
+            self.cond.notify_all()
+
+    def get(self, after=-1, timeout=None):
+        """(seq, wartość) nowsza niż after albo None po timeout (timeout=0: bez czekania)."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.seq > after, timeout):
+                return None
+            self.taken = True
+            return self.seq, self.value
+
+
+class Pipeline:
+    """
+    Przechwycenie -> rozpoznanie -> decyzja na osobnych wątkach.
+
+    source: FrameSource; jobs: {nazwa: ((x, y, w, h), zestaw)} we współrzędnych source.gray_frame().
+    decide(matches) -> decyzja; wynik w self.decisions (Latest) jako (decyzja, czas przechwycenia).
+    Rozpoznanie bierze tylko najnowszą klatkę i liczy tylko zmienione regiony (GatedClassifier),
+    dopasowanie grup regionów rozchodzi się na pulę wątków.
+    Czasy etapów (capture, gray, recognize, decide, latency) idą do metrics (domyślnie get_metrics()).
+    stats(): liczniki klatek i decyzji, percentyle opóźnienia z ostatnich LATENCY_WINDOW decyzji.
+    """
+
+    def __init__(self, source, jobs, decide, bank=None, cache=None, workers=WORKERS,
+                 ring_size=RING_SIZE, interval=CAPTURE_INTERVAL, metrics=None):
+        self.source = source
+        self.metrics = metrics if metrics is not None else get_metrics()
+        self.decide = decide
+        self.interval = interval
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix='match') if workers > 1 else None
+        self.gated = GatedClassifier(jobs, bank, cache=cache, pool=self.pool)
+        self.ring = FrameRing(source.buffer.shape[:2], ring_size)
+        self.recognized = Latest()
+        self.decisions = Latest()
+        self.latency_ms = deque(maxlen=LATENCY_WINDOW)
+        self.decided = 0
+        self.error = None
+        self._stop = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._threads = []
+
+    def start(self):
+        for target in (self._capture, self._recognize, self._decide):
+            t = threading.Thread(target=self._guard, args=(target,), name=target.__name__[1:], daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def pause(self):
+        """Wstrzymuje przechwytywanie (np. okno gry niewidoczne)."""
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def stop(self):
+        self._stop.set()
+        self._running.set()
+        for t in self._threads:
+            t.join()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def wait(self, timeout=None):
+        """Czeka na koniec źródła klatek (lub błąd etapu); True, gdy potok się zatrzymał."""
+        return self._stop.wait(timeout)
+
+    def check(self):
+        """Przekazuje wyjątek z któregoś etapu do wątku wywołującego."""
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _guard(self, target):
+        try:
+            target()
+        except Exception as e:
+            self.error = e
+            self._stop.set()
+
+    def _capture(self):
+        while not self._stop.is_set():
+            self._running.wait()
+            t0 = time.perf_counter()
+            with self.metrics.timer('capture'):
+                if not self.source.grab():
+                    break
+            with self.metrics.timer('gray'):
+                self.ring.write(self.source.gray_frame(), t0)
+            rest = self.interval - (time.perf_counter() - t0)
+            if rest > 0:
+                self._stop.wait(rest)
+        self._stop.set()
+
+    def _recognize(self):
+        seq = -1
+        while not self._stop.is_set() or self.ring.seq > seq:
+            frame = self.ring.acquire(seq, timeout=0.1)
+            if frame is None:
+                continue
+            seq, t_capture, gray, slot = frame
+            try:
+                with self.metrics.timer('recognize'):
+                    matches = self.gated.classify(gray)
+            finally:
+                self.ring.release(slot)
+            if self.gated.changed:
+                self.recognized.put(seq, (dict(matches), t_capture))
+
+    def _decide(self):
+        seq = -1
+        while not self._stop.is_set() or self.recognized.seq > seq:
+            item = self.recognized.get(seq, timeout=0.1)
+            if item is None:
+                continue
+            seq, (matches, t_capture) = item
+            with self.metrics.timer('decide'):
+                decision = self.decide(matches)
+            latency = (time.perf_counter() - t_capture) * 1000
+            self.latency_ms.append(latency)
+            self.decided += 1
+            self.metrics.observe('latency', latency)
+            self.decisions.put(seq, (decision, t_capture))
+
+    def stats(self):
+        lat = np.array(self.latency_ms) if self.latency_ms else np.zeros(1)
+        return {
+            'frames': self.ring.written,
+            'recognized': self.ring.read,
+            'dropped_frames': self.ring.dropped,
+            'dropped_results': self.recognized.dropped,
+            'decisions': self.decided,
+            'latency_p50_ms': round(float(np.percentile(lat, 50)), 2),
+            'latency_p90_ms': round(float(np.percentile(lat, 90)), 2),
+        }
+
+
+if __name__ == '__main__':
+    # shots/ z regionami bot3: pętla szeregowa vs potok (każda klatka odtwarzana 3 razy jak stół bez zmian)
+    from frame_source import FileFrameSource, SHOTS_DIR
+    from classifier import classify_regions
+    from hand_eval import get_evaluator
+    from glob import glob
+    from bot3 import REGIONS
+
+    regions, sets = {}, {}
+    for name, cfg in REGIONS.items():
+        regions[name + '-rank'], sets[name + '-rank'] = cfg['r'], cfg['rank_dir']
+        regions[name + '-suit'], sets[name + '-suit'] = cfg['s'], cfg['suit_dir']
+    paths = [p for p in sorted(glob(SHOTS_DIR + '/*.png')) for _ in range(3)]
+    evaluator = get_evaluator()
+
+    def decide(matches):
+        cards = {}
+        for lbl, (label, _, _) in matches.items():
+            cid, kind = lbl.rsplit('-', 1)
+            cards.setdefault(cid, {})[kind] = label
+        labels = {cid: (c['rank'], c['suit']) for cid, c in cards.items()}
+        flop = [labels[f] for f in ['f1', 'f2', 'f3', 'f4', 'f5']]
+        try:
+            s1 = evaluator.evaluate(flop + [labels['h1-1'], labels['h1-2']])
+            s2 = evaluator.evaluate(flop + [labels['h2-1'], labels['h2-2']])
+        except (KeyError, ValueError):
+            return None
+        return 'hand1' if s1 > s2 else 'hand2' if s2 > s1 else 'tie'
+
+    # Klatki dekodowane z góry; tempo przechwytywania jak w pętli na żywo (co 30 ms)
+    source = FileFrameSource(regions, paths, preload=True)
+    jobs = {name: (source.local(rect), sets[name]) for name, rect in regions.items()}
+    latency = []
+    while True:
+        t0 = time.perf_counter()
+        if not source.grab():
+            break
+        decide(classify_regions(source.gray_frame(), jobs))
+        latency.append((time.perf_counter() - t0) * 1000)
+        time.sleep(max(0.0, CAPTURE_INTERVAL - (time.perf_counter() - t0)))
+    print(f"Szeregowo: przechwycenie -> decyzja p50 {np.percentile(latency, 50):.2f} ms, "
+          f"p90 {np.percentile(latency, 90):.2f} ms, {len(latency)} decyzji")
+
+    source = FileFrameSource(regions, paths, preload=True)
+    with Pipeline(source, jobs, decide) as pipeline:
+        pipeline.wait()
+    pipeline.check()
+    print(f"Potok ({WORKERS} wątk., {os.cpu_count()} rdzeni): {pipeline.stats()}")
@@ -3,16 +3,40 @@ import cv2
 import numpy as np
 import pyautogui
 from treys import Card, Evaluator
+from recognition import Recognition
+from frame_source import MssFrameSource
+from deal_state import DealStateMachine
 
 # Region definitions (x, y, width, height)
 FLOP_REGION = (414, 505, 806, 210)
 HAND1_REGION = (403, 758, 255, 218)
 HAND2_REGION = (973, 758, 255, 218)
+REGIONS = {'flop': FLOP_REGION, 'hand1': HAND1_REGION, 'hand2': HAND2_REGION}
+# Live loop: frame interval for the change detector and the longest wait for a new deal (s)
+POLL_INTERVAL = 0.03
+DEAL_TIMEOUT = 10
 
 # Card template settings
 SUITS = ['h', 'd', 'c', 's']
 RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', 'T', 'J', 'Q', 'K', 'A']
+RED_SUITS = ('h', 'd')
 TEMPLATES = {}
+# Best template must beat the runner-up by this much (e.g. Kh vs Kd share the rank corner)
+MIN_MARGIN = 0.02
+# A pixel counts as red when R exceeds max(G, B) by this much
+RED_DELTA = 60
+# Suit stage: the better suit mean must win by this much, otherwise both suits of the colour stay in
+SUIT_MARGIN = 0.04
+
+# Built by index_templates(): grayscale templates in one (52, h, w) array, suit-major
+# (each suit's ranks are a contiguous slice), per-suit mean images and the red/black split
+TEMPLATE_NAMES = []
+GRAY_TEMPLATES = None
+SUIT_SLICES = {}
+SUIT_MEANS = {}
+RED_THRESHOLD = None
+RED_BAND = 0.0
+
 
 def load_templates(path='templates/'):
     """
@@ -25,30 +49,92 @@ def load_templates(path='templates/'):
             if img is None:
                 raise FileNotFoundError(f'Template {path}{name}.png not found')
             TEMPLATES[name] = img
+    index_templates()
+
+
+def red_pixels(img):
+    """Number of strongly red pixels in a BGR(A) image (a count, so a card slice wider than the template compares directly)."""
+    img = img[:, :, :3].astype(np.int16)
+    return int(np.count_nonzero(img[:, :, 2] - np.maximum(img[:, :, 0], img[:, :, 1]) > RED_DELTA))
 
 
-def recognize_card(card_img, threshold=0.8):
+def index_templates():
+    """
+    Convert TEMPLATES once for the hierarchical search in recognize_card: colour from the red
+    pixel count, then suit against the per-suit mean of its templates, then rank among one suit.
+    All templates must share one size (whole cards cut from the same table).
+    """
+    global TEMPLATE_NAMES, GRAY_TEMPLATES, SUIT_SLICES, SUIT_MEANS, RED_THRESHOLD, RED_BAND
+    names = [r + s for s in SUITS for r in RANKS if r + s in TEMPLATES]
+    shapes = {TEMPLATES[n].shape[:2] for n in names}
+    if len(shapes) > 1:
+        raise ValueError(f'Card templates differ in size: {sorted(shapes)}')
+    TEMPLATE_NAMES = names
+    GRAY_TEMPLATES = np.stack([cv2.cvtColor(TEMPLATES[n][:, :, :3], cv2.COLOR_BGR2GRAY) for n in names])
+    SUIT_SLICES, SUIT_MEANS = {}, {}
+    for s in SUITS:
+        idx = [i for i, n in enumerate(names) if n[-1] == s]
+        if idx:
+            SUIT_SLICES[s] = slice(idx[0], idx[-1] + 1)
+            SUIT_MEANS[s] = GRAY_TEMPLATES[SUIT_SLICES[s]].mean(axis=0).round().astype(np.uint8)
+    # Red/black threshold halfway between the colours; a card inside the middle half of the gap
+    # (or templates whose colours overlap) keeps all four suits
+    red = [red_pixels(TEMPLATES[n]) for n in names if n[-1] in RED_SUITS]
+    black = [red_pixels(TEMPLATES[n]) for n in names if n[-1] not in RED_SUITS]
+    RED_THRESHOLD, RED_BAND = None, 0.0
+    if red and black and min(red) > max(black):
+        RED_THRESHOLD = (min(red) + max(black)) / 2
+        RED_BAND = (min(red) - max(black)) / 4
+
+
+def candidate_suits(card_img, gray):
+    """Suits left after the colour and suit-mean stages."""
+    suits = [s for s in SUITS if s in SUIT_SLICES]
+    if RED_THRESHOLD is not None:
+        f = red_pixels(card_img)
+        if abs(f - RED_THRESHOLD) >= RED_BAND:
+            suits = [s for s in suits if (s in RED_SUITS) == (f > RED_THRESHOLD)]
+    if len(suits) == 2:
+        scores = [cv2.minMaxLoc(cv2.matchTemplate(gray, SUIT_MEANS[s], cv2.TM_CCOEFF_NORMED))[1] for s in suits]
+        if abs(scores[0] - scores[1]) >= SUIT_MARGIN:
+            suits = [suits[0] if scores[0] > scores[1] else suits[1]]
+    return suits
+
+
+def recognize_card(card_img, threshold=0.8, min_margin=MIN_MARGIN):
     """
     Identify a single card by template matching. Returns the card name like 'Ah' or raises if not found.
+    Hierarchical: red/black and the suit come first from cheap statistics, then the best template
+    among the remaining candidates (13 ranks of one suit when both stages are decisive) wins;
+    it must reach threshold and beat the runner-up by min_margin.
     """
+    t0 = time.perf_counter()
+    if GRAY_TEMPLATES is None or len(TEMPLATE_NAMES) != len(TEMPLATES):
+        index_templates()
     gray = cv2.cvtColor(card_img, cv2.COLOR_BGR2GRAY)
-    for name, tpl in TEMPLATES.items():
-        tpl_gray = cv2.cvtColor(tpl, cv2.COLOR_BGR2GRAY)
-        res = cv2.matchTemplate(gray, tpl_gray, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, _ = cv2.minMaxLoc(res)
-        if max_val >= threshold:
-            return name
-    raise ValueError('Card not recognized')
-
-
-def get_cards(region, num_cards):
+    scores = {}
+    for s in candidate_suits(card_img, gray):
+        sl = SUIT_SLICES[s]
+        for name, tpl in zip(TEMPLATE_NAMES[sl], GRAY_TEMPLATES[sl]):
+            res = cv2.matchTemplate(gray, tpl, cv2.TM_CCOEFF_NORMED)
+            _, max_val, _, _ = cv2.minMaxLoc(res)
+            scores[name] = (max_val, 1.0, 0)
+    rec = Recognition.from_scores(scores, t0)
+    if not rec.check(threshold, min_margin):
+        raise ValueError(f'Card not recognized: {rec}')
+    return rec.label
+
+
+def get_cards(region, num_cards, img=None):
     """
     Capture a region and split it into `num_cards` slices to recognize each card.
+    img: BGR capture of the region (e.g. FrameSource.bgr); grabbed here if omitted.
     Returns list of card names or raises if any unknown.
     """
     x, y, w, h = region
-    shot = pyautogui.screenshot(region=(x, y, w, h))
-    img = cv2.cvtColor(np.array(shot), cv2.COLOR_RGB2BGR)
+    if img is None:
+        shot = pyautogui.screenshot(region=(x, y, w, h))
+        img = cv2.cvtColor(np.array(shot), cv2.COLOR_RGB2BGR)
     card_width = w // num_cards
     cards = []
     for i in range(num_cards):
@@ -59,19 +145,6 @@ def get_cards(region, num_cards):
     return cards
 
 
-def wait_for_cards(region, num_cards, timeout=10, poll=0.5):
-    """
-    Wait until `num_cards` are recognized in the given region or timeout.
-    """
-    start = time.time()
-    while time.time() - start < timeout:
-        try:
-            return get_cards(region, num_cards)
-        except ValueError:
-            time.sleep(poll)
-    raise TimeoutError(f'Failed to detect {num_cards} cards in region {region} within {timeout}s')
-
-
 def card_names_to_treys(names):
     """
     Convert a list of names like ['Ah', 'Td'] to Treys Card objects.
@@ -83,29 +156,47 @@ def main():
     load_templates()
     evaluator = Evaluator()
     time.sleep(2)  # switch to game window
+    source = MssFrameSource(REGIONS)
+    regions = {name: source.local(rect) for name, rect in REGIONS.items()}
 
-    for round_idx in range(11):
-        # Wait for flop and hands to appear
-        flop = wait_for_cards(FLOP_REGION, 5)
-        hand1 = wait_for_cards(HAND1_REGION, 2)
-        hand2 = wait_for_cards(HAND2_REGION, 2)
+    def read(gray):
+        # Flop and both hands read from the same frame, once the table has stopped changing
+        try:
+            return (get_cards(FLOP_REGION, 5, source.bgr('flop')),
+                    get_cards(HAND1_REGION, 2, source.bgr('hand1')),
+                    get_cards(HAND2_REGION, 2, source.bgr('hand2')))
+        except ValueError:
+            return None
 
-        # Evaluate hands
+    def decide(deal):
+        flop, hand1, hand2 = deal
         board = card_names_to_treys(flop)
-        h1 = card_names_to_treys(hand1)
-        h2 = card_names_to_treys(hand2)
-        score1 = evaluator.evaluate(board, h1)
-        score2 = evaluator.evaluate(board, h2)
-
+        score1 = evaluator.evaluate(board, card_names_to_treys(hand1))
+        score2 = evaluator.evaluate(board, card_names_to_treys(hand2))
         # Choose better hand (lower score is stronger)
-        if score1 < score2:
-            click_x, click_y = HAND1_REGION[0] + HAND1_REGION[2] // 2, HAND1_REGION[1] + HAND1_REGION[3] // 2
-        else:
-            click_x, click_y = HAND2_REGION[0] + HAND2_REGION[2] // 2, HAND2_REGION[1] + HAND2_REGION[3] // 2
-
-        pyautogui.click(click_x, click_y)
-        print(f"Round {round_idx+1}: Flop={flop}, Hand1={hand1} (score {score1}), Hand2={hand2} (score {score2}), clicked at ({click_x}, {click_y})")
-
+        region = HAND1_REGION if score1 < score2 else HAND2_REGION
+        return (region[0] + region[2] // 2, region[1] + region[3] // 2), score1, score2
+
+    def click(decision):
+        pyautogui.click(*decision[0])
+
+    machine = DealStateMachine(regions, read, decide, click)
+    rounds = 0
+    last = time.perf_counter()
+    while rounds < 11:
+        t0 = time.perf_counter()
+        if t0 - last > DEAL_TIMEOUT:
+            raise TimeoutError(f'No new deal detected within {DEAL_TIMEOUT}s')
+        source.grab()
+        if machine.feed(source.gray_frame(), t0) is not None:
+            rounds += 1
+            last = t0
+            flop, hand1, hand2 = machine.clicks[-1]['deal']
+            (click_x, click_y), score1, score2 = machine.decision
+            print(f"Round {rounds}: Flop={flop}, Hand1={hand1} (score {score1}), Hand2={hand2} (score {score2}), clicked at ({click_x}, {click_y})")
+        time.sleep(max(0.0, POLL_INTERVAL - (time.perf_counter() - t0)))
+
+    source.close()
     print("Finished 11 rounds.")
 
 if __name__ == '__main__':
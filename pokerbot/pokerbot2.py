@@ -2,6 +2,8 @@ import cv2
 import os
 from glob import glob
 
+from preprocess import Preprocess
+
 def preprocess_templates(input_dir, output_dir,
                          convert_gray=True,
                          equalize_hist=True,
@@ -17,7 +19,19 @@ def preprocess_templates(input_dir, output_dir,
     """
     os.makedirs(output_dir, exist_ok=True)
     patterns = ['*.png', '*.jpg', '*.jpeg', '*.bmp', '*.tiff']
-    
+
+    # 2-5. Te same operacje co przy wczytaniu banku szablonów / wycinkach klatki (preprocess.py)
+    ops = []
+    if equalize_hist:
+        ops.append('equalize')
+    if gaussian_blur:
+        ops.append(f'blur:{blur_kernel[0]}:{blur_kernel[1]}')
+    if adaptive_thresh:
+        ops.append('adaptive_gauss:11:2')
+    if canny_edges:
+        ops.append(f'canny:{canny_thresholds[0]}:{canny_thresholds[1]}')
+    pipeline = Preprocess(ops)
+
     for pattern in patterns:
         for path in glob(os.path.join(input_dir, pattern)):
             img = cv2.imread(path)
@@ -26,24 +40,7 @@ def preprocess_templates(input_dir, output_dir,
             # 1. Konwersja na skalę szarości
             if convert_gray:
                 proc = cv2.cvtColor(proc, cv2.COLOR_BGR2GRAY)
-            
-            # 2. Wyrównanie histogramu
-            if equalize_hist:
-                proc = cv2.equalizeHist(proc)
-
-            # 3. Rozmycie Gaussa
-            if gaussian_blur:
-                proc = cv2.GaussianBlur(proc, blur_kernel, 0)
-
-            # 4. Progowanie adaptacyjne
-            if adaptive_thresh:
-                proc = cv2.adaptiveThreshold(proc, 255,
-                                             cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                             cv2.THRESH_BINARY, 11, 2)
-
-            # 5. Detekcja krawędzi Canny'ego
-            if canny_edges:
-                proc = cv2.Canny(proc, *canny_thresholds)
+            proc = pipeline.apply(proc)
 
             # 6. Zmiana rozmiaru
             if resize_to is not None:
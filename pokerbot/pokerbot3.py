@@ -2,23 +2,36 @@ import time
 import cv2
 import numpy as np
 import pyautogui
-from treys import Card, Evaluator
+from treys import Card
 import os
+from classifier import BatchClassifier
+from frame_source import MssFrameSource
+from deal_state import DealStateMachine
+from equity import decide
+from event_log import EventLog
+from metrics import get_metrics
 
 # Region definitions (x, y, width, height)
 FLOP_REGION = (414, 505, 806, 210)
 HAND1_REGION = (403, 758, 255, 218)
 HAND2_REGION = (973, 758, 255, 218)
+REGIONS = {'flop': FLOP_REGION, 'hand1': HAND1_REGION, 'hand2': HAND2_REGION}
 
 # Template settings
 RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', 'T', 'J', 'Q', 'K', 'A']
 SUITS = ['h', 'd', 'c', 's']
 RANK_TEMPLATES = {}
 SUIT_TEMPLATES = {}
+CLASSIFIERS = {}
 
 # Relative ROI for rank and suit within a card image (x, y, w, h) as fractions
 RANK_ROI = (0.02, 0.02, 0.2, 0.2)
 SUIT_ROI = (0.02, 0.6, 0.2, 0.3)
+# Best template must beat the runner-up by this much, otherwise the ROI counts as unrecognized
+MIN_MARGIN = 0.02
+# Live loop: frame interval for the change detector and the longest wait for a new deal (s)
+POLL_INTERVAL = 0.03
+DEAL_TIMEOUT = 10
 
 absolute_path = os.path.dirname(os.path.abspath(__file__))
 
@@ -38,19 +51,20 @@ def load_templates(path = absolute_path + '\\templates\\'):
         if img is None:
             raise FileNotFoundError(f'Suit template {path}suits\\{s}.png not found')
         SUIT_TEMPLATES[s] = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    CLASSIFIERS['rank'] = BatchClassifier(RANK_TEMPLATES)
+    CLASSIFIERS['suit'] = BatchClassifier(SUIT_TEMPLATES)
 
-Is this weel random? :-)
-def match_template(gray_roi, templates, threshold=0.7):
+
+def match_template(gray_roi, classifier, threshold=0.7, min_margin=MIN_MARGIN):
     """
-    Return key of best matching template above threshold.
+    Return key of best matching template, or None when its score is below threshold
+    or it does not beat the runner-up by min_margin.
+    All templates are scored against the ROI in one batched call.
     """
-    best, best_val = None, threshold
-    for name, tpl in templates.items():
-        res = cv2.matchTemplate(gray_roi, tpl, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, _ = cv2.minMaxLoc(res)
-        if max_val > best_val:
-            best, best_val = name, max_val
-    return best
+    rec = classifier.classify(gray_roi)[0]
+    if not rec.check(threshold, min_margin):
+        return None
+    return rec.label
 
 
 def recognize_card(card_img):
@@ -69,23 +83,33 @@ def recognize_card(card_img):
     sw_px, sh_px = int(sw*w), int(sh*h)
     suit_img = cv2.cvtColor(card_img[sy:sy+sh_px, sx:sx+sw_px], cv2.COLOR_BGR2GRAY)
     # Match
-    rank = match_template(rank_img, RANK_TEMPLATES)
-    suit = match_template(suit_img, SUIT_TEMPLATES)
+    rank = match_template(rank_img, CLASSIFIERS['rank'])
+    suit = match_template(suit_img, CLASSIFIERS['suit'])
     if not rank or not suit:
         raise ValueError('Rank or suit not recognized')
     return rank + suit
 
 
-def get_cards(region, num_cards):
+def get_cards(region, num_cards, img=None, allow_missing=False):
+    """
+    Recognize num_cards cards laid out side by side in region.
+    img: BGR capture of the region (e.g. FrameSource.bgr); grabbed here if omitted.
+    allow_missing: return None for unrecognized cards instead of raising.
+    """
     x, y, w, h = region
-    shot = pyautogui.screenshot(region=(x, y, w, h))
-    img = cv2.cvtColor(np.array(shot), cv2.COLOR_RGB2BGR)
+    if img is None:
+        img = capture_region(region)
     card_width = w // num_cards
     cards = []
     for i in range(num_cards):
         cx = i * card_width
         card_img = img[0:h, cx:cx + card_width]
-        name = recognize_card(card_img)
+        try:
+            name = recognize_card(card_img)
+        except ValueError:
+            if not allow_missing:
+                raise
+            name = None
         cards.append(name)
     return cards
 
@@ -96,62 +120,81 @@ def capture_region(region):
     return cv2.cvtColor(np.array(shot), cv2.COLOR_RGB2BGR)
 
 
-def wait_for_new_deal(prev_img, region, threshold=100000, timeout=10, poll=0.5):
-    start = time.time()
-    while time.time() - start < timeout:
-        curr = capture_region(region)
-        diff = cv2.absdiff(prev_img, curr)
-        non_zero = np.sum(cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY))
-        if non_zero > threshold:
-            return curr
-        time.sleep(poll)
-    raise TimeoutError('No new deal detected within timeout')
-
-
 def card_names_to_treys(names):
     return [Card.new(n.lower()) for n in names]
 
 
 def main():
     load_templates()
-    evaluator = Evaluator()
     time.sleep(2)  # switch to game window
-
-    # Initial capture
-    prev_flop = capture_region(FLOP_REGION)
-    prev_hand1 = capture_region(HAND1_REGION)
-    prev_hand2 = capture_region(HAND2_REGION)
-
-    for round_idx in range(11):
+    source = MssFrameSource(REGIONS)
+    regions = {name: source.local(rect) for name, rect in REGIONS.items()}
+    # Stage timings: summary line every 10 s, full histograms at http://127.0.0.1:8765/metrics
+    metrics = get_metrics()
+    metrics.serve()
+    metrics.start_reporter()
+
+    @metrics.timed('read')
+    def read(gray):
+        # Board cards still flipping are left out; equity covers the missing runout
+        flop = [c for c in get_cards(FLOP_REGION, 5, source.bgr('flop'), allow_missing=True) if c]
+        try:
+            hand1 = get_cards(HAND1_REGION, 2, source.bgr('hand1'))
+            hand2 = get_cards(HAND2_REGION, 2, source.bgr('hand2'))
+        except ValueError:
+            # Uncertain hand card: the state machine waits for the next change of the table
+            return None
+        return flop, hand1, hand2
+
+    @metrics.timed('decide')
+    def decide_deal(deal):
+        # A misread that repeats a card (equity raises ValueError) counts as an unreadable table
         try:
-            new_flop = wait_for_new_deal(prev_flop, FLOP_REGION)
-            new_hand1 = wait_for_new_deal(prev_hand1, HAND1_REGION)
-            new_hand2 = wait_for_new_deal(prev_hand2, HAND2_REGION)
-        except TimeoutError as e:
-            print(e)
+            return decide(*deal)
+        except ValueError:
+            return None
+
+    @metrics.timed('click')
+    def click(decision):
+        choice, _ = decision
+        region = HAND1_REGION if choice == 'hand1' else HAND2_REGION
+        pyautogui.click(region[0] + region[2]//2, region[1] + region[3]//2)
+
+    # One cheap thumbnail check per frame; cards are read only once the table stops changing,
+    # the same hands (e.g. board still being dealt) are never clicked twice
+    machine = DealStateMachine(regions, read, decide_deal, click,
+                               key=lambda deal: (tuple(deal[1]), tuple(deal[2])))
+    # Every click and timeout goes to logs/events.ndjson (written by a background thread)
+    log = EventLog()
+    rounds = 0
+    last = time.perf_counter()
+    while rounds < 11:
+        t0 = time.perf_counter()
+        if t0 - last > DEAL_TIMEOUT:
+            print('No new deal detected within timeout')
+            log.event('timeout', 'pokerbot3')
             break
-        prev_flop, prev_hand1, prev_hand2 = new_flop, new_hand1, new_hand2
-
-        flop = get_cards(FLOP_REGION, 5)
-        hand1 = get_cards(HAND1_REGION, 2)
-        hand2 = get_cards(HAND2_REGION, 2)
-
-        board = card_names_to_treys(flop)
-        h1 = card_names_to_treys(hand1)
-        h2 = card_names_to_treys(hand2)
-        score1 = evaluator.evaluate(board, h1)
-        score2 = evaluator.evaluate(board, h2)
-
-        if score1 < score2:
-            region = HAND1_REGION
-        else:
-            region = HAND2_REGION
-        cx = region[0] + region[2]//2
-        cy = region[1] + region[3]//2
-        pyautogui.click(cx, cy)
-
-        print(f"Round {round_idx+1}: Flop={flop}, Hand1={hand1}, Hand2={hand2}, clicked at ({cx},{cy})")
-
+        with metrics.timer('grab'):
+            source.grab()
+        with metrics.timer('feed'):
+            decided = machine.feed(source.gray_frame(), t0)
+        metrics.observe('tick', (time.perf_counter() - t0) * 1000)
+        if decided is not None:
+            rounds += 1
+            last = t0
+            flop, hand1, hand2 = machine.clicks[-1]['deal']
+            choice, res = machine.decision
+            print(f"Round {rounds}: Flop={flop}, Hand1={hand1}, Hand2={hand2}, "
+                  f"equity {res.equity1:.3f}/{res.equity2:.3f}, clicked {choice}")
+            log.event('decision', 'pokerbot3', hands=[hand1, hand2], decision=choice, flop=flop,
+                      equity=[round(res.equity1, 4), round(res.equity2, 4)],
+                      stages={'latency': machine.clicks[-1]['latency_s'] * 1000})
+        time.sleep(max(0.0, POLL_INTERVAL - (time.perf_counter() - t0)))
+
+    source.close()
+    log.close()
+    print(metrics.summary_line(interval=False))
+    metrics.close()
     print("Finished or stopped.")
 
 if __name__ == '__main__':
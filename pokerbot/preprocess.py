@@ -0,0 +1,172 @@
+import time
+import cv2
+import numpy as np
+
+# Operacje (parametry po dwukropku):
+#   equalize                      – wyrównanie histogramu (cv2.equalizeHist)
+#   blur:K[:K2]                   – rozmycie Gaussa KxK (sigma 0, jak w pokerbot2)
+#   otsu, otsu_inv                – progowanie Otsu (jak komórka Blitz / test.load_templates)
+#   fixed:T, fixed_inv:T          – próg stały (test.recognize_card: fixed120)
+#   adaptive_mean[_inv]:B:C       – progowanie adaptacyjne, średnia w oknie BxB
+#   adaptive_gauss[_inv]:B:C      – jw., średnia ważona Gaussem (pokerbot2)
+#   canny:LO:HI                   – krawędzie Canny'ego
+OPS = ('equalize', 'blur', 'otsu', 'otsu_inv', 'fixed', 'fixed_inv', 'adaptive_mean', 'adaptive_mean_inv',
+       'adaptive_gauss', 'adaptive_gauss_inv', 'canny')
+# Operacje punktowe (bez histogramu wycinka): jedno wywołanie na całej kanwie klatki
+POINTWISE = ('fixed', 'fixed_inv')
+# Rozkłady kanwy dla zestawów rozmiarów wycinków, najdawniej użyte usuwane – zestaw zależy od tego,
+# które regiony klatki idą do dopasowania (cache rozpoznań, bramka zmian), więc bez limitu rośnie
+MAX_PLANS = 32
+
+
+def parse(spec):
+    """'equalize,blur:5,otsu_inv' lub lista -> [(nazwa, (parametry...)), ...]."""
+    if isinstance(spec, str):
+        spec = [s for s in spec.split(',') if s.strip()]
+    ops = []
+    for item in spec:
+        name, *params = item.strip().split(':')
+        if name not in OPS:
+            raise ValueError(f"Nieznana operacja przetwarzania: {name}")
+        ops.append((name, tuple(int(p) for p in params)))
+    return ops
+
+
+class Preprocess:
+    """
+    Jedna konfiguracja przetwarzania – ta sama dla szablonów (raz przy wczytaniu banku)
+    i wycinków z klatki. Wycinki klatki są kopiowane do jednej kanwy (jeden pod drugim);
+    operacje punktowe idą jednym wywołaniem na kanwie, pozostałe w miejscu na widokach
+    wycinków, z brzegiem liczonym jak dla osobnego obrazu – wynik jest identyczny z OpenCV
+    wołanym na każdym wycinku. Wspólna kanwa z ramkami dla rozmycia/progów adaptacyjnych
+    i histogramy z bincount po całej kanwie mierzyły się wolniej niż 18 wywołań OpenCV.
+    self.costs: {operacja: [sekundy, wywołania]} – koszt do wyboru taniej konfiguracji.
+    """
+
+    def __init__(self, spec):
+        self.ops = parse(spec)
+        self.spec = ','.join(name + ''.join(f':{p}' for p in params) for name, params in self.ops)
+        self.costs = {}
+        self._plans = {}
+
+    def __repr__(self):
+        return f"Preprocess({self.spec!r})"
+
+    def __bool__(self):
+        return bool(self.ops)
+
+    def plan(self, shapes):
+        """Rozkład kanwy (rozmiar, początki wierszy) dla listy rozmiarów wycinków."""
+        plan = self._plans.pop(shapes, None)
+        if plan is None:
+            rows = np.concatenate(([0], np.cumsum([h for h, _ in shapes])))
+            plan = ((int(rows[-1]), max(w for _, w in shapes)), rows[:-1].tolist())
+            if len(self._plans) >= MAX_PLANS:
+                del self._plans[next(iter(self._plans))]
+        self._plans[shapes] = plan
+        return plan
+
+    def _timed(self, name, t0):
+        cost = self.costs.setdefault(name, [0.0, 0])
+        cost[0] += time.perf_counter() - t0
+        cost[1] += 1
+
+    def apply_many(self, crops):
+        """Lista wycinków uint8 (różne rozmiary) -> lista przetworzonych (widoki jednej kanwy)."""
+        if not self.ops or not crops:
+            return list(crops)
+        shapes = tuple(c.shape[:2] for c in crops)
+        size, rows = self.plan(shapes)
+        t0 = time.perf_counter()
+        canvas = np.zeros(size, dtype=np.uint8)
+        views = []
+        for y, crop in zip(rows, crops):
+            h, w = crop.shape
+            view = canvas[y:y+h, :w]
+            view[...] = crop
+            views.append(view)
+        self._timed('gather', t0)
+
+        for name, params in self.ops:
+            t0 = time.perf_counter()
+            if name in POINTWISE:
+                kind = cv2.THRESH_BINARY_INV if name.endswith('_inv') else cv2.THRESH_BINARY
+                cv2.threshold(canvas, params[0], 255, kind, dst=canvas)
+            elif name == 'canny':
+                # Canny na widoku z krokiem kanwy był ~1.5x wolniejszy niż na ciągłej kopii
+                for view in views:
+                    view[...] = apply_op(np.ascontiguousarray(view), name, params)
+            else:
+                for view in views:
+                    apply_op(view, name, params, dst=view)
+            self._timed(name, t0)
+        return views
+
+    def apply(self, img):
+        """Jeden obraz (np. szablon przy wczytaniu) – ta sama ścieżka co wycinki klatki."""
+        if not self.ops:
+            return img
+        return self.apply_many([img])[0].copy()
+
+    def report(self, frames=None):
+        """Średni koszt operacji w ms (na wywołanie albo na klatkę, gdy podano liczbę klatek)."""
+        lines = []
+        for name, (total, calls) in self.costs.items():
+            per = frames or calls
+            lines.append(f"{name:18s} {total / per * 1000:8.3f} ms")
+        return '\n'.join(lines)
+
+
+def apply_op(img, name, params, dst=None):
+    """Jedna operacja OpenCV na jednym obrazie (dst=img: w miejscu)."""
+    if name == 'equalize':
+        return cv2.equalizeHist(img, dst=dst)
+    if name == 'blur':
+        return cv2.GaussianBlur(img, (params[0], params[-1]), 0, dst=dst)
+    kind = cv2.THRESH_BINARY_INV if name.endswith('_inv') else cv2.THRESH_BINARY
+    if name.startswith('otsu'):
+        return cv2.threshold(img, 0, 255, kind + cv2.THRESH_OTSU, dst=dst)[1]
+    if name.startswith('fixed'):
+        return cv2.threshold(img, params[0], 255, kind, dst=dst)[1]
+    if name.startswith('adaptive'):
+        method = cv2.ADAPTIVE_THRESH_GAUSSIAN_C if 'gauss' in name else cv2.ADAPTIVE_THRESH_MEAN_C
+        return cv2.adaptiveThreshold(img, 255, method, kind, params[0], params[1], dst=dst)
+    return cv2.Canny(img, params[0], params[1], edges=dst)
+
+
+def reference(img, spec):
+    """Te same operacje wołane na osobnym wycinku, każda z nową tablicą – do sprawdzania apply_many."""
+    for name, params in parse(spec):
+        img = apply_op(img, name, params)
+    return img
+
+
+if __name__ == '__main__':
+    # Wycinki regionów layout.json z shots/: zgodność z OpenCV wołanym na każdym wycinku
+    # i koszt operacji na klatkę (kanwa vs pętla po wycinkach)
+    from glob import glob
+    from frame_source import SHOTS_DIR
+    from layout import get_layout
+
+    regions = get_layout().regions()
+    frames = []
+    for path in sorted(glob(SHOTS_DIR + '/*.png')):
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        frames.append([gray[y:y+h, x:x+w] for (x, y, w, h), _ in regions.values()])
+
+    configs = ['otsu', 'otsu_inv', 'fixed_inv:120', 'adaptive_mean_inv:21:10', 'equalize,blur:5',
+               'equalize,blur:5,otsu_inv', 'equalize,blur:5,adaptive_gauss:11:2', 'blur:5,canny:50:150']
+    for spec in configs:
+        prep = Preprocess(spec)
+        prep.apply_many(frames[0])
+        prep.costs.clear()
+        t0 = time.perf_counter()
+        batched = [prep.apply_many(crops) for crops in frames]
+        t_batch = (time.perf_counter() - t0) / len(frames)
+        t0 = time.perf_counter()
+        looped = [[reference(c, spec) for c in crops] for crops in frames]
+        t_loop = (time.perf_counter() - t0) / len(frames)
+        diff = sum(int(np.count_nonzero(a != b)) for fa, fb in zip(batched, looped) for a, b in zip(fa, fb))
+        costs = ', '.join(f"{name} {total / len(frames) * 1000:.3f}" for name, (total, _) in prep.costs.items())
+        print(f"{spec:38s} kanwa {t_batch * 1000:6.3f} ms/klatkę, pętla {t_loop * 1000:6.3f} ms, "
+              f"różne piksele {diff}  [{costs}]")
@@ -0,0 +1,72 @@
+import time
+
+
+class Recognition:
+    """
+    Wynik rozpoznania jednego regionu: etykieta, najlepszy wynik, wynik najlepszej innej
+    etykiety, skala i kąt najlepszego dopasowania, czas w ms.
+    Rozpakowuje się jak dawna krotka z classify_regions: (etykieta, wynik, margines).
+    """
+
+    __slots__ = ('label', 'score', 'second', 'scale', 'angle', 'ms', 'rejected')
+
+    def __init__(self, label=None, score=-1.0, second=-1.0, scale=1.0, angle=0, ms=0.0):
+        self.label = label
+        self.score = float(score)
+        self.second = float(second)
+        self.scale = scale
+        self.angle = angle
+        self.ms = ms
+        self.rejected = False
+
+    @property
+    def margin(self):
+        return self.score - self.second
+
+    @property
+    def ok(self):
+        """Jest etykieta i przeszła progi."""
+        return self.label is not None and not self.rejected
+
+    def check(self, min_score=-1.0, min_margin=0.0):
+        """Odrzuca wynik poniżej progów (wynik lub przewaga nad drugą etykietą); zwraca self.ok."""
+        self.rejected = self.label is None or self.score < min_score or self.margin < min_margin
+        return not self.rejected
+
+    def __iter__(self):
+        return iter((self.label, self.score, self.margin))
+
+    def __repr__(self):
+        flag = ' odrzucone' if self.rejected else ''
+        return (f"Recognition({self.label!r}, {self.score:.3f}, margines {self.margin:.3f}, "
+                f"skala {self.scale}, kąt {self.angle}, {self.ms:.2f} ms{flag})")
+
+    @classmethod
+    def from_scores(cls, scores, t0=None):
+        """
+        {etykieta: (wynik, skala, kąt)} z pętli dopasowań -> Recognition.
+        Pierwsza etykieta z najwyższym wynikiem wygrywa (jak pętle z porównaniem '>'),
+        wynik -1 (żadna skala się nie zmieściła) nie liczy się jako dopasowanie;
+        t0: time.perf_counter() z początku dopasowania.
+        """
+        ms = (time.perf_counter() - t0) * 1000 if t0 is not None else 0.0
+        scores = {k: v for k, v in scores.items() if v[0] > -1}
+        if not scores:
+            return cls(ms=ms)
+        label = max(scores, key=lambda k: scores[k][0])
+        score, scale, angle = scores[label]
+        second = max((v[0] for k, v in scores.items() if k != label), default=-1.0)
+        return cls(label, score, second, scale, angle, ms)
+
+
+def reject(matches, thresholds):
+    """
+    Progi per region: thresholds {nazwa: (min_score, min_margin)}, regiony bez progu przechodzą.
+    Zaznacza odrzucone wyniki w matches {nazwa: Recognition} i zwraca ich nazwy.
+    """
+    rejected = []
+    for name, rec in matches.items():
+        min_score, min_margin = thresholds.get(name, (-1.0, 0.0))
+        if not rec.check(min_score, min_margin):
+            rejected.append(name)
+    return rejected
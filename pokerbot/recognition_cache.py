@@ -0,0 +1,179 @@
+import os
+import atexit
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+from template_bank import BASE_DIR, get_bank
+from recognition import Recognition
+
+CACHE_PATH = os.path.join(BASE_DIR, '.recognition_cache.npz')
+MAX_ENTRIES = 4096
+# Wyniki z mniejszym marginesem nad drugim szablonem nie trafiają do cache –
+# na shots/ kolizje odcisków zdarzały się tylko dla takich niejednoznacznych wycinków
+MIN_MARGIN = 0.02
+HASH_SIZE = 32
+HASH_BITS = 8
+
+
+def phash(crop):
+    """
+    Odcisk percepcyjny wycinka (64 bity): miniatura 32x32, DCT, znak względem
+    mediany współczynników 8x8 o najniższych częstotliwościach.
+    Nie zależy od jasności ani kontrastu, drobne przesunięcia go nie zmieniają.
+    """
+    thumb = cv2.resize(crop, (HASH_SIZE, HASH_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(thumb)[:HASH_BITS, :HASH_BITS].ravel()
+    # Mediana 63 współczynników bez składowej stałej (partition jest kilka razy szybsze od np.median)
+    ac = low[1:]
+    bits = low > np.partition(ac, len(ac) // 2)[len(ac) // 2]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class RecognitionCache:
+    """
+    LRU: (zestaw, rozmiar wycinka, odcisk) -> (etykieta, wynik, margines) z classify_regions;
+    zestaw z silnikiem i przetwarzaniem banku, np. 'rank@nn', 'rank#otsu'.
+    Jeden obiekt dla wszystkich zestawów szablonów; zapisywany do .npz razem
+    z odciskiem banku szablonów (zmiana szablonów unieważnia cache).
+    """
+
+    def __init__(self, path=CACHE_PATH, bank=None, max_entries=MAX_ENTRIES, min_margin=MIN_MARGIN):
+        self.path = path
+        self.max_entries = max_entries
+        self.min_margin = min_margin
+        self.bank_fingerprint = (bank or get_bank()).fingerprint()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dirty = False
+        # get/put z wątków puli dopasowania (pipeline)
+        self.lock = threading.Lock()
+        if path:
+            self.load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, set_name, crop):
+        return set_name, crop.shape[0], crop.shape[1], phash(crop)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        # Nowy obiekt przy każdym trafieniu – progi odrzucenia zaznaczają wynik w miejscu
+        label, score, margin = entry
+        return Recognition(label, score, score - margin)
+
+    def put(self, key, result):
+        """Zapamiętuje wynik, jeśli jest jednoznaczny (margines >= min_margin)."""
+        label, score, margin = result
+        if label is None or margin < self.min_margin:
+            return
+        with self.lock:
+            self.entries[key] = (label, float(score), float(margin))
+            self.entries.move_to_end(key)
+            self.dirty = True
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {'entries': len(self), 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': round(self.hit_rate, 4)}
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path, allow_pickle=False) as npz:
+                if str(npz['fingerprint']) != self.bank_fingerprint:
+                    return False
+                rows = zip(npz['sets'], npz['shapes'], npz['hashes'], npz['labels'], npz['scores'], npz['margins'])
+                for set_name, (h, w), hsh, label, score, margin in rows:
+                    key = (str(set_name), int(h), int(w), int.from_bytes(hsh.tobytes(), 'big'))
+                    self.entries[key] = (str(label), float(score), float(margin))
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Nie udało się wczytać cache rozpoznań: {e}")
+            self.entries.clear()
+            return False
+        return True
+
+    def save(self):
+        """Zapis atomowy (plik .tmp + os.replace); tylko gdy coś się zmieniło."""
+        if not self.path or not self.dirty:
+            return
+        with self.lock:
+            keys = list(self.entries)
+            values = list(self.entries.values())
+        arrays = {
+            'fingerprint': np.array(self.bank_fingerprint),
+            'sets': np.array([k[0] for k in keys], dtype=str),
+            'shapes': np.array([k[1:3] for k in keys], dtype=np.int32).reshape(-1, 2),
+            'hashes': np.array([k[3].to_bytes(HASH_BITS, 'big') for k in keys], dtype='S8'),
+            'labels': np.array([v[0] for v in values], dtype=str),
+            'scores': np.array([v[1] for v in values], dtype=np.float64),
+            'margins': np.array([v[2] for v in values], dtype=np.float64),
+        }
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            print(f"Nie udało się zapisać cache rozpoznań: {e}")
+
+
+_CACHE = None
+
+
+def get_cache():
+    """Współdzielony cache rozpoznań – wczytywany z dysku raz, zapisywany przy wyjściu."""
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = RecognitionCache()
+        atexit.register(_CACHE.save)
+    return _CACHE
+
+
+if __name__ == '__main__':
+    # Dwa przebiegi po shots/ z regionami bot3: zimny cache i ten sam cache ponownie
+    import time
+    from glob import glob
+    from frame_source import SHOTS_DIR
+    from classifier import classify_regions
+    from bot3 import REGIONS
+
+    jobs = {}
+    for name, cfg in REGIONS.items():
+        jobs[name + '-rank'] = (cfg['r'], cfg['rank_dir'])
+        jobs[name + '-suit'] = (cfg['s'], cfg['suit_dir'])
+    frames = [cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in sorted(glob(SHOTS_DIR + '/*.png'))]
+    cache = RecognitionCache(path=None)
+    classify_regions(frames[0], jobs)
+
+    t0 = time.perf_counter()
+    full = [classify_regions(g, jobs) for g in frames]
+    t_full = time.perf_counter() - t0
+    n = len(frames)
+    print(f"Bez cache: {t_full / n * 1000:.2f} ms/klatkę")
+    for run in ('zimny', 'ciepły'):
+        cache.hits = cache.misses = 0
+        t0 = time.perf_counter()
+        got = [classify_regions(g, jobs, cache=cache) for g in frames]
+        dt = time.perf_counter() - t0
+        diff = sum(f[name].label != g[name].label for f, g in zip(full, got) for name in jobs)
+        print(f"Cache {run}: {dt / n * 1000:.2f} ms/klatkę, {cache.stats()}, różnice etykiet: {diff}")
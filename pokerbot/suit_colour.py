@@ -0,0 +1,194 @@
+import time
+import cv2
+import numpy as np
+
+from recognition import Recognition
+from mine_templates import glyph_ink
+
+# Kolory czerwone (kier, karo); pozostałe etykiety zestawu kolorów to czarne
+RED_SUITS = ('h', 'd')
+# Średnia nadwyżka R nad max(G, B) w pikselach znaku: czerwone znaki ≥ 40, czarne ≤ 10 (ground_truth.json)
+RED_INK = 25
+# Kształt rozstrzyga bez dopasowania szablonów, gdy odległość Hu (matchShapes I1) do najbliższego
+# szablonu koloru jest mała i wyraźnie mniejsza niż do drugiego
+MOMENT_MAX = 0.05
+MOMENT_RATIO = 0.3
+# Dopasowanie dwóch szablonów tylko wokół znaku: szablon przyłożony tak, by jego znak pokrył się
+# ze znakiem wycinka, ± SLACK px zamiast przesuwania po całym wycinku
+SLACK = 8
+
+
+def redness(bgr, box, mask):
+    """
+    Średnia nadwyżka kanału R nad max(G, B) w pikselach tuszu (maska Otsu z glyph_ink)
+    w ramce znaku; odejmowanie z nasyceniem do 0.
+    """
+    x0, y0, x1, y1 = box
+    b, g, r = cv2.split(bgr[y0:y1, x0:x1, :3])
+    return cv2.mean(cv2.subtract(r, cv2.max(b, g)), mask=mask[y0:y1, x0:x1])[0]
+
+
+def template_glyph(tpl):
+    """
+    (kontur znaku, (x0, y0) ramki znaku w szablonie) albo None. Szablony są wycięte ciasno,
+    więc znak szukany z ramką 4 px w kolorze tła.
+    """
+    background = int(np.median(np.concatenate((tpl[0], tpl[-1], tpl[:, 0], tpl[:, -1]))))
+    found = glyph_ink(cv2.copyMakeBorder(tpl, 4, 4, 4, 4, cv2.BORDER_CONSTANT, value=background))
+    if found is None:
+        return None
+    (x0, y0, _, _), _, contour = found
+    return contour, (x0 - 4, y0 - 4)
+
+
+class ColourSuitClassifier:
+    """
+    Kolor karty w dwóch krokach: czerwony / czarny z kanałów BGR w pikselach znaku, potem
+    jeden z dwóch kolorów tej barwy – z momentów Hu konturu, gdy rozstrzygają, inaczej
+    dopasowaniem tylko dwóch szablonów wokół znaku (albo na całym wycinku, gdy szablon nie ma
+    wykrywalnego znaku lub okno nie mieści się w wycinku).
+    Wycinki bez znaku i wywołania bez BGR liczy fallback (klasyfikator całego zestawu).
+    """
+
+    def __init__(self, templates, fallback, moment_max=MOMENT_MAX, moment_ratio=MOMENT_RATIO, slack=SLACK):
+        from classifier import BatchClassifier
+        # templates: TemplateSet z banku albo słownik {etykieta: szablon w skali szarości}
+        self.labels = list(templates.keys())
+        self.templates = {lbl: templates[lbl] for lbl in self.labels}
+        self.glyphs = {lbl: template_glyph(tpl) for lbl, tpl in self.templates.items()}
+        self.fallback = fallback
+        self.moment_max = moment_max
+        self.moment_ratio = moment_ratio
+        self.slack = slack
+        self.groups = {}
+        for red in (True, False):
+            labels = [lbl for lbl in self.labels if (lbl.lower() in RED_SUITS) == red]
+            if labels:
+                self.groups[red] = (labels, BatchClassifier({lbl: self.templates[lbl] for lbl in labels}))
+        self.counts = {'shape': 0, 'near': 0, 'two_templates': 0, 'fallback': 0}
+
+    def by_shape(self, contour, labels):
+        """Recognition z momentów Hu albo None, gdy nie rozstrzygają (lub szablon bez znaku)."""
+        if len(labels) != 2 or any(self.glyphs[lbl] is None for lbl in labels):
+            return None
+        (d1, l1), (d2, _) = sorted((cv2.matchShapes(contour, self.glyphs[lbl][0], cv2.CONTOURS_MATCH_I1, 0), lbl)
+                                   for lbl in labels)
+        if d1 > self.moment_max or d1 > self.moment_ratio * d2:
+            return None
+        return Recognition(l1, 1.0 - d1, 1.0 - d2)
+
+    def near(self, gray, box, labels):
+        """Recognition z dopasowania szablonów w oknie wokół znaku albo None (brak znaku szablonu, okno za małe)."""
+        scores = {}
+        h, w = gray.shape
+        for lbl in labels:
+            if self.glyphs[lbl] is None:
+                return None
+            tpl = self.templates[lbl]
+            th, tw = tpl.shape
+            gx, gy = self.glyphs[lbl][1]
+            x0, y0 = max(0, box[0] - gx - self.slack), max(0, box[1] - gy - self.slack)
+            x1, y1 = min(w, box[0] - gx + tw + self.slack), min(h, box[1] - gy + th + self.slack)
+            if x1 - x0 < tw or y1 - y0 < th:
+                return None
+            res = cv2.matchTemplate(gray[y0:y1, x0:x1], tpl, cv2.TM_CCOEFF_NORMED)
+            scores[lbl] = (cv2.minMaxLoc(res)[1], 1.0, 0)
+        return Recognition.from_scores(scores)
+
+    def classify(self, crops, bgr_crops=None):
+        if bgr_crops is None:
+            self.counts['fallback'] += len(crops)
+            return self.fallback.classify(crops)
+        t0 = time.perf_counter()
+        results = [None] * len(crops)
+        pending = {True: [], False: []}
+        for i, (gray, bgr) in enumerate(zip(crops, bgr_crops)):
+            found = glyph_ink(gray)
+            if found is None:
+                continue
+            box, mask, contour = found
+            red = redness(bgr, box, mask) > RED_INK
+            if red not in self.groups:
+                continue
+            labels = self.groups[red][0]
+            rec = self.by_shape(contour, labels)
+            kind = 'shape'
+            if rec is None:
+                rec, kind = self.near(gray, box, labels), 'near'
+            if rec is None:
+                pending[red].append(i)
+            else:
+                results[i] = rec
+                self.counts[kind] += 1
+        for red, idx in pending.items():
+            if idx:
+                self.counts['two_templates'] += len(idx)
+                for i, rec in zip(idx, self.groups[red][1].classify(np.stack([crops[i] for i in idx]))):
+                    results[i] = rec
+        rest = [i for i, rec in enumerate(results) if rec is None]
+        if rest:
+            self.counts['fallback'] += len(rest)
+            for i, rec in zip(rest, self.fallback.classify(np.stack([crops[i] for i in rest]))):
+                results[i] = rec
+        ms = (time.perf_counter() - t0) * 1000 / max(1, len(results))
+        for rec in results:
+            rec.ms = ms
+        return results
+
+
+if __name__ == '__main__':
+    # Same regiony kolorów z klatek ground_truth.json: trafność i czas na klatkę dla silników
+    # template / nn / colour oraz którą ścieżką szły wycinki silnika colour
+    import os
+    import json
+    from layout import get_layout, Calibrator
+    from template_bank import get_bank
+    from classifier import classify_regions, get_classifier
+    from nn_classifier import BASE_DIR, MANIFEST_PATH
+
+    bank = get_bank()
+    layout = get_layout()
+    calibrator = Calibrator(layout, cache_path=None)
+    with open(MANIFEST_PATH, encoding='utf-8') as f:
+        manifest = json.load(f)['frames']
+    frames = []
+    for path, truth in manifest.items():
+        img = cv2.imread(os.path.join(BASE_DIR, path))
+        if img is None or not truth:
+            continue
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        try:
+            transform, _ = calibrator.ensure(gray)
+        except ValueError:
+            transform = None
+        jobs = {name: job for name, job in layout.regions(transform).items() if name.endswith('-suit')}
+        frames.append((truth, img, gray, jobs))
+    sets = sorted({job[1] for _, _, _, jobs in frames for job in jobs.values()})
+    for engine in ('template', 'nn', 'colour'):
+        engines = {name: engine for name in sets}
+        for _, img, gray, jobs in frames[:2]:
+            classify_regions(gray, jobs, bank, engines=engines, bgr=img)
+        for name in sets:
+            clf = get_classifier(name, bank, engine)
+            if engine == 'colour':
+                clf.counts = dict.fromkeys(clf.counts, 0)
+        best, correct, cards = None, 0, 0
+        for rnd in range(3):
+            t0 = time.perf_counter()
+            for truth, img, gray, jobs in frames:
+                matches = classify_regions(gray, jobs, bank, engines=engines, bgr=img)
+                if rnd == 0:
+                    for name, rec in matches.items():
+                        card = truth.get(name.rsplit('-', 1)[0])
+                        if card:
+                            cards += 1
+                            correct += (rec.label or '').lower() == card[-1]
+            dt = (time.perf_counter() - t0) / len(frames) * 1000
+            best = dt if best is None else min(best, dt)
+        print(f"{engine:9s} trafne {correct}/{cards}, {best:.2f} ms/klatkę ({len(jobs)} wycinków kolorów)")
+    counts = {}
+    for name in sets:
+        for kind, n in get_classifier(name, bank, 'colour').counts.items():
+            counts[kind] = counts.get(kind, 0) + n
+    total = sum(counts.values())
+    print("Ścieżki colour: " + ', '.join(f"{kind} {n / total:.0%}" for kind, n in counts.items()))
@@ -0,0 +1,254 @@
+import time
+import cv2
+
+from frame_source import FrameSource, MssFrameSource
+from change_detector import GatedClassifier
+
+WINDOW_TITLE = "World Series of Poker - Google Chrome"
+# Ile stołów z oczekującą zmianą rozpoznawać w jednym kroku (None = wszystkie)
+MAX_TABLES_PER_STEP = None
+
+
+class Window:
+    """Geometria okna gry (jak w pygetwindow) i numer monitora, na którym leży."""
+
+    def __init__(self, title, left, top, width, height, monitor=0, handle=None):
+        self.title = title
+        self.left, self.top, self.width, self.height = left, top, width, height
+        self.monitor = monitor
+        self.handle = handle
+
+    def to_screen(self, rect):
+        x, y, w, h = rect
+        return self.left + x, self.top + y, w, h
+
+    def __repr__(self):
+        return f"Window({self.title!r}, {self.left}, {self.top}, {self.width}x{self.height}, monitor={self.monitor})"
+
+
+def discover_windows(title=WINDOW_TITLE, backend=None):
+    """Wszystkie widoczne okna gry; monitor = monitor mss zawierający środek okna."""
+    import mss
+    from window_tracker import PyGetWindowBackend
+    backend = backend if backend is not None else PyGetWindowBackend()
+    with mss.mss() as sct:
+        monitors = sct.monitors[1:]
+    windows = []
+    for handle in backend.windows(title):
+        geometry = backend.geometry(handle)
+        if geometry is None:
+            continue
+        left, top, width, height = geometry
+        cx, cy = left + width // 2, top + height // 2
+        monitor = next((i for i, m in enumerate(monitors)
+                        if m['left'] <= cx < m['left'] + m['width'] and m['top'] <= cy < m['top'] + m['height']), 0)
+        windows.append(Window(backend.title(handle), left, top, width, height, monitor, handle))
+    return windows
+
+
+def card_layout(regions):
+    """REGIONS w formacie bot3 ({karta: {'r', 's', 'rank_dir', 'suit_dir'}}) -> {region: (prostokąt, zestaw)}."""
+    layout = {}
+    for name, cfg in regions.items():
+        layout[name + '-rank'] = (cfg['r'], cfg['rank_dir'])
+        layout[name + '-suit'] = (cfg['s'], cfg['suit_dir'])
+    return layout
+
+
+class Table:
+    """Jeden stół: okno, regiony we współrzędnych wspólnego bufora i własne odciski/etykiety."""
+
+    def __init__(self, index, window, source, jobs, bank=None, cache=None):
+        self.index = index
+        self.window = window
+        self.source = source
+        self.gated = GatedClassifier(jobs, bank, cache=cache)
+        self.decision = None
+        self.served = 0
+        self.waiting = 0
+        self.max_wait = 0
+
+    def pending(self, gray):
+        """Czy któryś region zmienił się od ostatniego rozpoznania (bez aktualizacji odcisków)."""
+        for name, ((x, y, w, h), _) in self.gated.jobs.items():
+            if self.gated.detector.changed(name, gray[y:y+h, x:x+w], update=False):
+                return True
+        return False
+
+
+class TableManager:
+    """
+    Kilka stołów w jednym procesie.
+    Okna na tym samym monitorze dzielą jedno przechwycenie (prostokąt obejmujący regiony
+    wszystkich stołów). Rozpoznanie w kroku dostają stoły ze zmianą, w kolejności
+    round-robin od stołu po ostatnio obsłużonym – co najwyżej max_tables_per_step,
+    więc stół zmieniający się w każdej klatce nie zagłodzi pozostałych.
+
+    layout: {region: ((x, y, w, h), zestaw)} we współrzędnych okna.
+    decide(matches) -> decyzja; on_decision(table, decyzja) wołane po każdej nowej decyzji.
+    make_source(regions, windows) -> FrameSource dla jednego monitora (domyślnie mss).
+    """
+
+    def __init__(self, windows, layout, decide, on_decision=None, make_source=None,
+                 bank=None, cache=None, max_tables_per_step=MAX_TABLES_PER_STEP):
+        self.layout = dict(layout)
+        self.decide = decide
+        self.on_decision = on_decision
+        self.max_tables_per_step = max_tables_per_step
+        make_source = make_source or (lambda regions, wins: MssFrameSource(regions))
+        by_monitor = {}
+        for window in windows:
+            by_monitor.setdefault(window.monitor, []).append(window)
+
+        self.sources = []
+        self.tables = []
+        for monitor, wins in sorted(by_monitor.items()):
+            regions = {}
+            for window in wins:
+                for name, (rect, _) in self.layout.items():
+                    regions[(len(self.tables) + wins.index(window), name)] = window.to_screen(rect)
+            source = make_source(regions, wins)
+            self.sources.append(source)
+            for window in wins:
+                index = len(self.tables)
+                jobs = {name: (source.local(regions[(index, name)]), set_name)
+                        for name, (_, set_name) in self.layout.items()}
+                self.tables.append(Table(index, window, source, jobs, bank, cache))
+        self._next = 0
+        self.steps = 0
+
+    def step(self):
+        """Jedno przechwycenie na monitor i rozpoznanie stołów ze zmianą. Zwraca obsłużone stoły."""
+        grays = {}
+        for source in self.sources:
+            if not source.grab():
+                return None
+            grays[id(source)] = source.gray_frame()
+        self.steps += 1
+
+        n = len(self.tables)
+        order = [self.tables[(self._next + i) % n] for i in range(n)]
+        pending = [t for t in order if t.pending(grays[id(t.source)])]
+        limit = self.max_tables_per_step or n
+        served = pending[:limit]
+        for table in pending[limit:]:
+            table.waiting += 1
+            table.max_wait = max(table.max_wait, table.waiting)
+        for table in served:
+            matches = table.gated.classify(grays[id(table.source)])
+            table.decision = self.decide(matches)
+            table.served += 1
+            table.waiting = 0
+            if self.on_decision:
+                self.on_decision(table, table.decision)
+        if served:
+            self._next = (served[-1].index + 1) % n
+        return served
+
+    def run(self, steps=None, interval=0.0):
+        """Kroki do wyczerpania źródeł (lub steps); interval – przerwa między krokami w s."""
+        done = 0
+        while steps is None or done < steps:
+            t0 = time.perf_counter()
+            if self.step() is None:
+                break
+            done += 1
+            rest = interval - (time.perf_counter() - t0)
+            if rest > 0:
+                time.sleep(rest)
+        return done
+
+    def close(self):
+        for source in self.sources:
+            source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Okna z plików: testy i benchmark bez ekranu ---
+
+class FakeWindow(Window):
+    """Okno odtwarzające klatki (pełne zrzuty okna BGR); nowa klatka co period przechwyceń."""
+
+    def __init__(self, title, left, top, frames, period=1, monitor=0, loop=True):
+        h, w = frames[0].shape[:2]
+        super().__init__(title, left, top, w, h, monitor)
+        self.frames = list(frames)
+        self.period = period
+        self.loop = loop
+        self.ticks = 0
+
+    def frame(self):
+        """Bieżąca klatka okna (None, gdy się skończyły i loop=False)."""
+        i = self.ticks // self.period
+        self.ticks += 1
+        if i >= len(self.frames):
+            if not self.loop:
+                return None
+            i %= len(self.frames)
+        return self.frames[i]
+
+
+class FakeScreenSource(FrameSource):
+    """Jedno 'przechwycenie' monitora z oknami FakeWindow: każde okno wkleja swoją część prostokąta regionów."""
+
+    def __init__(self, regions, windows):
+        super().__init__(regions)
+        self.windows = list(windows)
+
+    def _fill(self, buffer):
+        bx, by, bw, bh = self.bbox
+        for window in self.windows:
+            img = window.frame()
+            if img is None:
+                return False
+            # Część okna wspólna z prostokątem regionów
+            x0, y0 = max(bx, window.left), max(by, window.top)
+            x1, y1 = min(bx + bw, window.left + window.width), min(by + bh, window.top + window.height)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            part = img[y0 - window.top:y1 - window.top, x0 - window.left:x1 - window.left]
+            cv2.cvtColor(part, cv2.COLOR_BGR2BGRA, dst=buffer[y0 - by:y1 - by, x0 - bx:x1 - bx])
+        return True
+
+
+def fake_windows(frames, n, per_monitor=2, busy_period=1, period=3, loop=True):
+    """
+    n okien obok siebie, po per_monitor na monitor; okno 0 zmienia się co busy_period
+    przechwyceń, pozostałe co period (każde od innej klatki).
+    """
+    windows = []
+    h, w = frames[0].shape[:2]
+    for i in range(n):
+        shifted = frames[i % len(frames):] + frames[:i % len(frames)]
+        windows.append(FakeWindow(f'table {i}', i * w, 0, shifted, busy_period if i == 0 else period,
+                                  monitor=i // per_monitor, loop=loop))
+    return windows
+
+
+def fake_source(regions, windows):
+    return FakeScreenSource(regions, windows)
+
+
+if __name__ == '__main__':
+    # Cztery stoły z shots/ (2 monitory); stół 0 zmienia się w każdej klatce, max 2 stoły na krok
+    from glob import glob
+    from frame_source import SHOTS_DIR
+    from bot3 import REGIONS
+
+    frames = [cv2.imread(p) for p in sorted(glob(SHOTS_DIR + '/*.png'))]
+    windows = fake_windows(frames, 4)
+    manager = TableManager(windows, card_layout(REGIONS), decide=lambda matches: len(matches),
+                           make_source=fake_source, max_tables_per_step=2)
+    t0, c0 = time.perf_counter(), time.process_time()
+    steps = manager.run(steps=90)
+    dt, cpu = time.perf_counter() - t0, time.process_time() - c0
+    served = sum(t.served for t in manager.tables)
+    print(f"Kroki: {steps}, rozpoznania stołów: {served}, {served / dt:.1f} stołów/s, "
+          f"{steps * len(manager.tables) / cpu:.1f} stołów/s na rdzeń (sprawdzonych)")
+    for t in manager.tables:
+        print(f"  {t.window}: obsłużony {t.served} razy, najdłuższe czekanie {t.max_wait} kroków")
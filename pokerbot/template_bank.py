@@ -0,0 +1,199 @@
+import os
+import json
+from glob import glob
+import cv2
+import numpy as np
+
+from preprocess import Preprocess
+
+# Katalog bazowy – wszystkie zestawy szablonów leżą obok skryptów
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(BASE_DIR, '.template_cache.npz')
+
+# Zestawy ładowane domyślnie (klucz = ścieżka względna katalogu, tak jak w REGIONS)
+TEMPLATE_DIRS = ['rank', 'suit', 'rank-h1', 'suit-h1', 'rank-h2', 'suit-h2']
+TEMPLATE_GLOBS = ['templates/card*']
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg')
+
+
+def discover_sets(base_dir=BASE_DIR, dirs=TEMPLATE_DIRS, globs=TEMPLATE_GLOBS):
+    """Zwraca posortowaną listę katalogów (względnych) z szablonami."""
+    names = [d for d in dirs if os.path.isdir(os.path.join(base_dir, d))]
+    for pattern in globs:
+        for path in sorted(glob(os.path.join(base_dir, pattern))):
+            if os.path.isdir(path):
+                names.append(os.path.relpath(path, base_dir).replace(os.sep, '/'))
+    return names
+
+
+def list_files(base_dir, set_name):
+    """Pliki obrazów zestawu wraz z mtime i rozmiarem – podstawa unieważniania cache."""
+    dir_path = os.path.join(base_dir, set_name)
+    files = []
+    for entry in sorted(os.scandir(dir_path), key=lambda e: e.name):
+        if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTS):
+            st = entry.stat()
+            files.append((entry.name, st.st_mtime_ns, st.st_size))
+    return files
+
+
+class TemplateSet:
+    """
+    Jeden zestaw szablonów trzymany w jednym ciągłym buforze uint8.
+    Każdy szablon to widok (bez kopii) data[offset:offset+h*w] o kształcie (h, w).
+    """
+
+    def __init__(self, name, labels, shapes, data):
+        self.name = name
+        self.labels = list(labels)
+        self.shapes = np.asarray(shapes, dtype=np.int32).reshape(-1, 2)
+        sizes = self.shapes[:, 0] * self.shapes[:, 1]
+        self.offsets = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+        self.data = np.ascontiguousarray(data, dtype=np.uint8)
+        self.images = [
+            self.data[off:off + h * w].reshape(h, w)
+            for off, (h, w) in zip(self.offsets, self.shapes)
+        ]
+        self._index = {label: i for i, label in enumerate(self.labels)}
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __iter__(self):
+        return iter(zip(self.labels, self.images))
+
+    def __getitem__(self, label):
+        return self.images[self._index[label]]
+
+    def __contains__(self, label):
+        return label in self._index
+
+    def keys(self):
+        return list(self.labels)
+
+    def items(self):
+        return list(zip(self.labels, self.images))
+
+    def max_shape(self):
+        return tuple(int(v) for v in self.shapes.max(axis=0))
+
+    @classmethod
+    def from_images(cls, name, labels, images):
+        shapes = [img.shape[:2] for img in images]
+        data = np.concatenate([img.ravel() for img in images]) if images else np.zeros(0, np.uint8)
+        return cls(name, labels, shapes, data)
+
+
+class TemplateBank:
+    """
+    Wszystkie zestawy szablonów wczytane raz na proces.
+    Wynik jest zapisywany do jednego pliku .npz, unieważnianego przez mtime/rozmiar plików.
+    preprocess: specyfikacja Preprocess (np. 'otsu', 'equalize,blur:5,otsu_inv') – szablony
+    przetwarzane raz przy wczytaniu; classify_regions stosuje te same operacje do wycinków.
+    """
+
+    def __init__(self, base_dir=BASE_DIR, sets=None, preprocess=None, cache_path=CACHE_PATH):
+        self.base_dir = base_dir
+        self.set_names = list(sets) if sets is not None else discover_sets(base_dir)
+        self.preprocess = Preprocess(preprocess or '')
+        if cache_path and self.preprocess:
+            root, ext = os.path.splitext(cache_path)
+            cache_path = f'{root}-{self.preprocess.spec.replace(",", "+").replace(":", "_")}{ext}'
+        self.cache_path = cache_path
+        self.from_cache = False
+        self.sets = {}
+        self.load()
+
+    def fingerprint(self):
+        return json.dumps({
+            'preprocess': self.preprocess.spec,
+            'sets': {name: list_files(self.base_dir, name) for name in self.set_names},
+        }, sort_keys=True)
+
+    def load(self):
+        fingerprint = self.fingerprint()
+        if self.cache_path and self._load_cache(fingerprint):
+            self.from_cache = True
+            return
+        for name in self.set_names:
+            self.sets[name] = self._load_dir(name)
+        if self.cache_path:
+            self._save_cache(fingerprint)
+
+    def _load_dir(self, name):
+        labels, images = [], []
+        dir_path = os.path.join(self.base_dir, name)
+        for fname, _, _ in list_files(self.base_dir, name):
+            img = cv2.imread(os.path.join(dir_path, fname), cv2.IMREAD_GRAYSCALE)
+            if img is None:
+                continue
+            labels.append(os.path.splitext(fname)[0])
+            images.append(self.preprocess.apply(img))
+        return TemplateSet.from_images(name, labels, images)
+
+    def _load_cache(self, fingerprint):
+        if not os.path.exists(self.cache_path):
+            return False
+        try:
+            with np.load(self.cache_path, allow_pickle=False) as npz:
+                if str(npz['fingerprint']) != fingerprint:
+                    return False
+                sets = {}
+                for name in self.set_names:
+                    sets[name] = TemplateSet(
+                        name,
+                        [str(label) for label in npz[f'{name}/labels']],
+                        npz[f'{name}/shapes'],
+                        npz[f'{name}/data'],
+                    )
+        except (OSError, KeyError, ValueError):
+            return False
+        self.sets = sets
+        return True
+
+    def _save_cache(self, fingerprint):
+        arrays = {'fingerprint': np.array(fingerprint)}
+        for name, tset in self.sets.items():
+            arrays[f'{name}/labels'] = np.array(tset.labels, dtype=str)
+            arrays[f'{name}/shapes'] = tset.shapes
+            arrays[f'{name}/data'] = tset.data
+        tmp_path = self.cache_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Nie udało się zapisać cache szablonów: {e}")
+
+    def __getitem__(self, name):
+        return self.sets[name]
+
+    def __contains__(self, name):
+        return name in self.sets
+
+    def keys(self):
+        return list(self.sets)
+
+
+_BANKS = {}
+
+
+def get_bank(preprocess=None):
+    """Współdzielony bank szablonów (osobny dla każdej konfiguracji przetwarzania) – wczytywany raz na proces."""
+    key = Preprocess(preprocess or '').spec
+    bank = _BANKS.get(key)
+    if bank is None:
+        bank = _BANKS[key] = TemplateBank(preprocess=preprocess)
+    return bank
+
+
+if __name__ == '__main__':
+    import time
+    t0 = time.perf_counter()
+    bank = TemplateBank()
+    dt = (time.perf_counter() - t0) * 1000
+    source = 'cache' if bank.from_cache else 'pliki PNG'
+    print(f"Wczytano {len(bank.keys())} zestawów z: {source} w {dt:.1f} ms")
+    for name in bank.keys():
+        tset = bank[name]
+        print(f"  {name:16s} {len(tset):3d} szablonów, {tset.data.nbytes} B")
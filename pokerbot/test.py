@@ -2,6 +2,8 @@ import cv2
 import os
 import numpy as np
 
+from preprocess import Preprocess
+
 # Ścieżki do szablonów (tak jak w głównym kodzie)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 RANK_PATHS = [os.path.join(BASE_DIR, "ranks", f) for f in [
@@ -10,14 +12,21 @@ RANK_PATHS = [os.path.join(BASE_DIR, "ranks", f) for f in [
 ]]
 SUIT_PATHS = [os.path.join(BASE_DIR, "suits", f) for f in ["h.png", "d.png", "c.png", "s.png"]]
 
+# Szablony: Otsu odwrócone raz przy wczytaniu; wycinek karty – każdy tryb progowania osobno
+TEMPLATE_PREPROCESS = Preprocess('otsu_inv')
+THRESH_MODES = {
+    'otsu': Preprocess('otsu_inv'),
+    'adaptive': Preprocess('adaptive_mean_inv:21:10'),
+    'fixed120': Preprocess('fixed_inv:120'),
+}
+
 def load_templates(paths):
     templates = {}
     for path in paths:
         key = os.path.splitext(os.path.basename(path))[0]
         img = cv2.imread(path, 0)
         if img is not None:
-            _, img_bin = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-            templates[key] = img_bin
+            templates[key] = TEMPLATE_PREPROCESS.apply(img)
     return templates
 
 rank_templates = load_templates(RANK_PATHS)
@@ -49,16 +58,8 @@ def recognize_card(card_img_bgr, rank_templates, suit_templates):
     card_gray = cv2.cvtColor(card_img_bgr, cv2.COLOR_BGR2GRAY)
     corner = preprocess_for_template(card_gray)
     results = []
-    for thresh_mode in ['otsu', 'adaptive', 'fixed120']:
-        if thresh_mode == 'otsu':
-            _, corner_bin = cv2.threshold(corner, 0, 255, cv2.THRESH_BINARY_INV+cv2.THRESH_OTSU)
-        elif thresh_mode == 'adaptive':
-            corner_bin = cv2.adaptiveThreshold(corner, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
-                                               cv2.THRESH_BINARY_INV, 21, 10)
-        elif thresh_mode == 'fixed120':
-            _, corner_bin = cv2.threshold(corner, 120, 255, cv2.THRESH_BINARY_INV)
-        else:
-            continue
+    for thresh_mode, prep in THRESH_MODES.items():
+        corner_bin = prep.apply(corner)
 
         rank_roi = corner_bin[0:int(corner_bin.shape[0]*0.55), 0:int(corner_bin.shape[1]*0.55)]
         rank, r_val = best_template_match(rank_roi, rank_templates)
@@ -0,0 +1,132 @@
+import time
+import cv2
+import numpy as np
+
+from recognition import Recognition
+
+# Najmniejszy bok szablonu po przeskalowaniu – jak w multi_scale_template_match
+MIN_SIDE = 5
+
+
+def rotate_template(tpl, angle):
+    """
+    Obrót szablonu o -angle wokół środka (ten sam rozmiar, BORDER_REPLICATE).
+    Dopasowanie obróconego szablonu do wycinka odpowiada dopasowaniu
+    szablonu do wycinka obróconego o +angle w match_with_rotation.
+    """
+    if angle == 0:
+        return tpl
+    h, w = tpl.shape[:2]
+    M = cv2.getRotationMatrix2D((w/2, h/2), -angle, 1.0)
+    return cv2.warpAffine(tpl, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+
+class TransformCache:
+    """
+    Wszystkie przeskalowane (i opcjonalnie obrócone) szablony policzone raz przy starcie.
+    Warianty leżą w jednym buforze uint8 (widoki data[offset:offset+h*w]),
+    a bufory obróconych wycinków i wyników matchTemplate są alokowane raz na rozmiar.
+
+    rotate_templates=False: obracany jest wycinek (wyniki identyczne z match_with_rotation),
+    rotate_templates=True: obracane są szablony, wycinek nie jest w ogóle przetwarzany.
+    """
+
+    def __init__(self, templates, angles=(0,), scale_range=(0.5, 1.5), steps=20, rotate_templates=False):
+        t0 = time.perf_counter()
+        self.angles = list(angles)
+        self.scales = np.linspace(scale_range[0], scale_range[1], steps)
+        self.rotate_templates = rotate_templates
+        template_angles = self.angles if rotate_templates else [0]
+        self.crop_angles = [0] if rotate_templates else self.angles
+        keys, images, meta = [], [], []
+        # Kolejność jak w pętlach bot1/bot2: kąt -> szablon -> skala (te same remisy przy '>')
+        for ai, angle in enumerate(template_angles):
+            for key, tpl in templates.items():
+                h_orig, w_orig = tpl.shape[:2]
+                for si, scale in enumerate(self.scales):
+                    h, w = int(h_orig * scale), int(w_orig * scale)
+                    if h < MIN_SIDE or w < MIN_SIDE:
+                        continue
+                    resized = cv2.resize(tpl, (w, h), interpolation=cv2.INTER_AREA)
+                    images.append(np.ascontiguousarray(rotate_template(resized, angle)))
+                    keys.append(key)
+                    meta.append((ai, si))
+
+        self.keys = keys
+        self.meta = np.array(meta, dtype=np.int32).reshape(-1, 2)
+        self.shapes = np.array([img.shape[:2] for img in images], dtype=np.int32).reshape(-1, 2)
+        sizes = self.shapes[:, 0] * self.shapes[:, 1]
+        self.offsets = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+        self.data = np.concatenate([img.ravel() for img in images]) if images else np.zeros(0, np.uint8)
+        self.variants = [
+            self.data[off:off + h * w].reshape(h, w)
+            for off, (h, w) in zip(self.offsets, self.shapes)
+        ]
+        self._valid = {}
+        self._results = {}
+        self._rotations = {}
+        self.build_ms = (time.perf_counter() - t0) * 1000
+
+    def __len__(self):
+        return len(self.variants)
+
+    @property
+    def nbytes(self):
+        """Pamięć wariantów i buforów wyników."""
+        buffers = list(self._results.values()) + [dst for _, dst in self._rotations.values()]
+        return self.data.nbytes + sum(buf.nbytes for buf in buffers)
+
+    def valid_for(self, shape):
+        """Indeksy wariantów mieszczących się w wycinku – liczone raz na rozmiar wycinka."""
+        idx = self._valid.get(shape)
+        if idx is None:
+            H, W = shape
+            fits = (self.shapes[:, 0] <= H) & (self.shapes[:, 1] <= W)
+            idx = self._valid[shape] = np.flatnonzero(fits).tolist()
+        return idx
+
+    def result_buffer(self, shape, tpl_shape):
+        key = (shape, tpl_shape)
+        buf = self._results.get(key)
+        if buf is None:
+            buf = self._results[key] = np.empty(
+                (shape[0] - tpl_shape[0] + 1, shape[1] - tpl_shape[1] + 1), dtype=np.float32)
+        return buf
+
+    def rotated(self, img, angle):
+        """Wycinek obrócony o angle – macierz i bufor wyjściowy liczone raz na rozmiar."""
+        if angle == 0:
+            return img
+        shape = img.shape[:2]
+        entry = self._rotations.get((shape, angle))
+        if entry is None:
+            h, w = shape
+            M = cv2.getRotationMatrix2D((w/2, h/2), angle, 1.0)
+            entry = self._rotations[(shape, angle)] = (M, np.empty((h, w), dtype=img.dtype))
+        M, dst = entry
+        return cv2.warpAffine(img, M, (shape[1], shape[0]), dst=dst,
+                              flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+    def match(self, img):
+        """Zwraca Recognition (szablon, skala, kąt, wynik drugiego szablonu) jak match_with_rotation / match_template."""
+        t0 = time.perf_counter()
+        shape = img.shape[:2]
+        valid = self.valid_for(shape)
+        scores = {}
+        for angle in self.crop_angles:
+            rot = self.rotated(img, angle)
+            for i in valid:
+                tpl = self.variants[i]
+                res = cv2.matchTemplate(rot, tpl, cv2.TM_CCOEFF_NORMED,
+                                        result=self.result_buffer(shape, tpl.shape))
+                _, max_val, _, _ = cv2.minMaxLoc(res)
+                key = self.keys[i]
+                if max_val > scores.get(key, (-1,))[0]:
+                    ai, si = self.meta[i]
+                    scores[key] = (max_val, float(self.scales[si]), self.angles[ai] if self.rotate_templates else angle)
+        return Recognition.from_scores(scores, t0)
+
+    def report(self, name=''):
+        return (f"{name or 'cache'}: {len(self)} wariantów "
+                f"({len(self.angles)} kątów x {len(self.scales)} skal), "
+                f"{self.nbytes / 1024:.1f} KiB, zbudowano w {self.build_ms:.1f} ms")
@@ -0,0 +1,252 @@
+import time
+import threading
+from collections import Counter
+
+from tables import Window, WINDOW_TITLE
+
+# Co ile sekund wątek śledzący odświeża geometrię i fokus zapamiętanego okna
+REFRESH_INTERVAL = 0.25
+
+
+class WindowBackend:
+    """
+    Interfejs menedżera okien. Uchwyt (handle) to obiekt backendu zapamiętywany przez
+    WindowTracker; windows(title) jest drogie (wyliczenie wszystkich okien), geometry
+    i is_active dotyczą jednego uchwytu.
+    """
+
+    def windows(self, title):
+        """Uchwyty okien o tytule zawierającym title."""
+        raise NotImplementedError
+
+    def geometry(self, handle):
+        """(left, top, width, height) lub None, gdy okno zamknięte albo zminimalizowane."""
+        raise NotImplementedError
+
+    def is_active(self, handle):
+        raise NotImplementedError
+
+    def title(self, handle):
+        raise NotImplementedError
+
+
+class PyGetWindowBackend(WindowBackend):
+    """pygetwindow (Windows): uchwyt to obiekt okna pygetwindow."""
+
+    def __init__(self):
+        import pygetwindow as gw
+        self.gw = gw
+
+    def windows(self, title):
+        return self.gw.getWindowsWithTitle(title)
+
+    def geometry(self, handle):
+        try:
+            if handle.isMinimized:
+                return None
+            # box: jedno GetWindowRect zamiast osobnego dla left/top/width/height
+            box = handle.box
+        except Exception:
+            return None
+        if box.width <= 0 or box.height <= 0:
+            return None
+        return box.left, box.top, box.width, box.height
+
+    def is_active(self, handle):
+        try:
+            return handle.isActive
+        except Exception:
+            return False
+
+    def title(self, handle):
+        return handle.title
+
+
+class FakeWindowBackend(WindowBackend):
+    """
+    Okna w pamięci (Linux, testy bez ekranu): otwierane, przesuwane i aktywowane z kodu.
+    calls liczy wywołania tak, jak liczyłoby się wywołania menedżera okien.
+    """
+
+    def __init__(self):
+        self._windows = {}
+        self.active = None
+        self.calls = Counter()
+        self._next = 0
+
+    def open(self, title, left, top, width, height, active=True):
+        handle = self._next
+        self._next += 1
+        self._windows[handle] = {'title': title, 'rect': (left, top, width, height), 'minimized': False}
+        if active:
+            self.active = handle
+        return handle
+
+    def move(self, handle, left, top):
+        _, _, w, h = self._windows[handle]['rect']
+        self._windows[handle]['rect'] = (left, top, w, h)
+
+    def resize(self, handle, width, height):
+        x, y, _, _ = self._windows[handle]['rect']
+        self._windows[handle]['rect'] = (x, y, width, height)
+
+    def minimize(self, handle, minimized=True):
+        self._windows[handle]['minimized'] = minimized
+
+    def focus(self, handle):
+        self.active = handle
+
+    def close(self, handle):
+        del self._windows[handle]
+        if self.active == handle:
+            self.active = None
+
+    def windows(self, title):
+        self.calls['windows'] += 1
+        return [h for h, w in self._windows.items() if title in w['title']]
+
+    def geometry(self, handle):
+        self.calls['geometry'] += 1
+        w = self._windows.get(handle)
+        if w is None or w['minimized']:
+            return None
+        return w['rect']
+
+    def is_active(self, handle):
+        self.calls['is_active'] += 1
+        return handle == self.active
+
+    def title(self, handle):
+        return self._windows[handle]['title']
+
+
+class WindowTracker:
+    """
+    Okno gry śledzone w tle: uchwyt i geometria zapamiętane, odświeżane co interval
+    sekund (albo od razu po invalidate – np. po błędzie przechwycenia lub kalibracji).
+    Pełne wyliczenie okien tylko, gdy zapamiętany uchwyt przestał być ważny.
+
+    Pętla klatek czyta tylko atrybuty: window (tables.Window lub None), focused i version
+    (rośnie przy każdej zmianie geometrii). subscribe(callback) – callback(window) wołany
+    z wątku śledzącego po każdej zmianie geometrii (window = None: okno zniknęło).
+    """
+
+    def __init__(self, title=WINDOW_TITLE, backend=None, interval=REFRESH_INTERVAL):
+        self.title = title
+        self.backend = backend if backend is not None else PyGetWindowBackend()
+        self.interval = interval
+        self.handle = None
+        self.window = None
+        self.focused = False
+        self.version = 0
+        self.refreshes = 0
+        self.scans = 0
+        self.changes = 0
+        self._listeners = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._listeners.remove(callback)
+
+    def refresh(self):
+        """Jedno odświeżenie (wywoływane przez wątek; bez start() – ręcznie). Zwraca window."""
+        self.refreshes += 1
+        geometry = self.backend.geometry(self.handle) if self.handle is not None else None
+        if geometry is None:
+            self.handle = None
+            self.scans += 1
+            for handle in self.backend.windows(self.title):
+                geometry = self.backend.geometry(handle)
+                if geometry is not None:
+                    self.handle = handle
+                    break
+        focused = self.handle is not None and self.backend.is_active(self.handle)
+        old = self.window
+        if geometry != (old and (old.left, old.top, old.width, old.height)):
+            self.window = Window(self.backend.title(self.handle), *geometry, handle=self.handle) if geometry else None
+            self.version += 1
+            self.changes += 1
+            for callback in self._listeners:
+                callback(self.window)
+        self.focused = focused
+        return self.window
+
+    def invalidate(self):
+        """Anomalia przechwycenia: odświeżenie od razu, bez czekania na interval."""
+        self._wake.set()
+
+    def start(self):
+        """Pierwsze odświeżenie synchronicznie (window dostępne od razu), dalsze w wątku."""
+        self.refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='window-tracker', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.refresh()
+            except Exception:
+                # Błąd menedżera okien: traktujemy jak brak okna, następna próba za interval
+                self.handle = None
+
+    def stats(self):
+        return {'refreshes': self.refreshes, 'scans': self.scans, 'changes': self.changes}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    # Pętla 30 kl/s przez 3 s na oknach z pamięci: wywołania menedżera okien na klatkę
+    # (dotąd find_window_rect + is_window_focused w każdej klatce), koszt odczytu w pętli
+    # i czas od przesunięcia okna do nowej geometrii – z odświeżaniem co interval i z invalidate
+    FPS, SECONDS = 30, 3.0
+    backend = FakeWindowBackend()
+    backend.open('Other window', 0, 0, 800, 600, active=False)
+    handle = backend.open(WINDOW_TITLE, 100, 50, 1600, 1000)
+    for label, kick in (('co interval', False), ('invalidate', True)):
+        backend.calls.clear()
+        backend.move(handle, 100, 50)
+        moved = {}
+        with WindowTracker(WINDOW_TITLE, backend) as tracker:
+            tracker.subscribe(lambda window: moved.setdefault('seen', time.perf_counter()))
+            frames, read_s = 0, 0.0
+            t_end = time.perf_counter() + SECONDS
+            while time.perf_counter() < t_end:
+                t0 = time.perf_counter()
+                window, focused = tracker.window, tracker.focused
+                read_s += time.perf_counter() - t0
+                frames += 1
+                if frames == FPS and 'at' not in moved:
+                    backend.move(handle, 300, 80)
+                    moved['at'] = time.perf_counter()
+                    if kick:
+                        tracker.invalidate()
+                time.sleep(1 / FPS)
+        calls = sum(backend.calls.values())
+        print(f"{label}: klatek {frames}, wywołań menedżera okien {calls} ({dict(backend.calls)}) "
+              f"= {calls / frames:.2f}/klatkę (wcześniej 2/klatkę, w tym pełne wyliczenie okien), "
+              f"odczyt w pętli {read_s / frames * 1e6:.2f} µs, "
+              f"przesunięcie widoczne po {(moved['seen'] - moved['at']) * 1000:.1f} ms, {tracker.stats()}")